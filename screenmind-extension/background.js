@@ -5,9 +5,182 @@ console.log('🚀 ScreenMind 扩展已启动');
 const DEFAULT_SETTINGS = {
   serverUrl: 'http://localhost:8000',
   autoAnalyze: true,
-  showNotifications: true
+  showNotifications: true,
+  analysisTimeout: 30
 };
 
+// ==================== WebSocket 长连接 ====================
+// 与服务器保持一条长连接：截图以二进制帧提交，分析结果和服务状态由服务器推送，
+// 省去每次截图的HTTP/multipart开销和健康检查轮询；连接不可用时回退到HTTP上传
+
+const WS_PING_INTERVAL = 20000; // 小于MV3 service worker的30秒空闲挂起时间，保持连接和worker存活
+const WS_MAX_RECONNECT_DELAY = 30000;
+
+let socket = null;
+let socketUrl = null;
+let pingTimer = null;
+let reconnectTimer = null;
+let reconnectDelay = 1000;
+let nextRequestId = 0;
+const pendingAnalyses = new Map();
+
+function toWebSocketUrl(serverUrl) {
+  return serverUrl.replace(/\/+$/, '').replace(/^http/, 'ws') + '/api/v1/ws';
+}
+
+// 建立（或复用）到当前服务器的连接
+async function connectSocket() {
+  const settings = await chrome.storage.sync.get(DEFAULT_SETTINGS);
+  const url = toWebSocketUrl(settings.serverUrl);
+
+  if (socket && socketUrl === url && socket.readyState <= WebSocket.OPEN) {
+    return;
+  }
+  closeSocket();
+  clearTimeout(reconnectTimer);
+  socketUrl = url;
+
+  try {
+    socket = new WebSocket(url);
+  } catch (error) {
+    console.warn('⚠️ WebSocket连接失败:', error);
+    scheduleReconnect();
+    return;
+  }
+
+  socket.onopen = () => {
+    console.log('🔌 WebSocket已连接:', url);
+    reconnectDelay = 1000;
+    pingTimer = setInterval(() => sendSocketMessage({ type: 'ping' }), WS_PING_INTERVAL);
+  };
+  socket.onmessage = (event) => handleSocketMessage(JSON.parse(event.data));
+  socket.onclose = () => {
+    console.log('🔌 WebSocket已断开');
+    clearInterval(pingTimer);
+    socket = null;
+    failPendingAnalyses(new Error('WebSocket连接已断开'));
+    chrome.storage.local.set({ serverStatus: { online: false, updatedAt: Date.now() } });
+    scheduleReconnect();
+  };
+}
+
+// 主动关闭连接（切换服务器地址时），不触发自动重连
+function closeSocket() {
+  if (!socket) {
+    return;
+  }
+  socket.onclose = null;
+  socket.close();
+  socket = null;
+  clearInterval(pingTimer);
+  failPendingAnalyses(new Error('WebSocket连接已关闭'));
+}
+
+function scheduleReconnect() {
+  clearTimeout(reconnectTimer);
+  reconnectTimer = setTimeout(connectSocket, reconnectDelay);
+  reconnectDelay = Math.min(reconnectDelay * 2, WS_MAX_RECONNECT_DELAY);
+}
+
+function sendSocketMessage(message) {
+  if (socket && socket.readyState === WebSocket.OPEN) {
+    socket.send(JSON.stringify(message));
+  }
+}
+
+function failPendingAnalyses(error) {
+  for (const pending of pendingAnalyses.values()) {
+    clearTimeout(pending.timer);
+    pending.reject(error);
+  }
+  pendingAnalyses.clear();
+}
+
+// 处理服务器推送的消息
+function handleSocketMessage(message) {
+  if (message.type === 'status') {
+    // 服务状态保存到本地存储，弹窗和设置页监听存储变化即可，无需轮询
+    chrome.storage.local.set({
+      serverStatus: { online: true, ...message.data, updatedAt: Date.now() }
+    });
+    return;
+  }
+
+  const pending = pendingAnalyses.get(message.request_id);
+  if (!pending) {
+    return;
+  }
+
+  if (message.type === 'progress') {
+    console.log('⏳ 分析进度:', message.stage);
+  } else if (message.type === 'result') {
+    clearTimeout(pending.timer);
+    pendingAnalyses.delete(message.request_id);
+    pending.resolve({ success: true, data: message.data });
+  } else if (message.type === 'error') {
+    clearTimeout(pending.timer);
+    pendingAnalyses.delete(message.request_id);
+    const error = new Error(message.message);
+    error.fromServer = true; // 服务器已处理过，不再回退到HTTP重复分析
+    pending.reject(error);
+  }
+}
+
+// 通过WebSocket提交截图，返回与HTTP接口相同结构的结果
+async function analyzeViaSocket(blob, settings) {
+  if (!socket || socket.readyState !== WebSocket.OPEN) {
+    throw new Error('WebSocket未连接');
+  }
+
+  const buffer = await blob.arrayBuffer();
+  const requestId = `req-${Date.now()}-${++nextRequestId}`;
+  const timeoutMs = (settings.analysisTimeout || 90) * 1000;
+
+  return new Promise((resolve, reject) => {
+    const timer = setTimeout(() => {
+      pendingAnalyses.delete(requestId);
+      const error = new Error('分析超时');
+      error.fromServer = true;
+      reject(error);
+    }, timeoutMs);
+    pendingAnalyses.set(requestId, { resolve, reject, timer });
+
+    // 请求ID和图片帧连续发送，保证服务器按顺序关联
+    socket.send(JSON.stringify({ type: 'analyze', request_id: requestId }));
+    socket.send(buffer);
+  });
+}
+
+// 通过HTTP上传截图（WebSocket不可用时的回退方式）
+async function analyzeViaHttp(blob, settings) {
+  // 创建FormData
+  const formData = new FormData();
+  formData.append('image', blob, 'screenshot.png');
+
+  // 调用ScreenMind API
+  const apiResponse = await fetch(`${settings.serverUrl}/api/v1/analyze`, {
+    method: 'POST',
+    body: formData
+  });
+
+  if (!apiResponse.ok) {
+    const errorData = await apiResponse.json();
+    throw new Error(errorData.detail || `API错误: ${apiResponse.status}`);
+  }
+
+  return apiResponse.json();
+}
+
+// service worker每次启动时连接服务器
+connectSocket();
+
+// 服务器地址变化时重新连接
+chrome.storage.onChanged.addListener((changes, namespace) => {
+  if (namespace === 'sync' && changes.serverUrl) {
+    connectSocket();
+  }
+});
+
 // 初始化扩展
 chrome.runtime.onInstalled.addListener(async () => {
   console.log('📦 ScreenMind 扩展已安装');
@@ -113,23 +286,18 @@ async function analyzeScreenshot(dataUrl, settings) {
     const response = await fetch(dataUrl);
     const blob = await response.blob();
     
-    // 创建FormData
-    const formData = new FormData();
-    formData.append('image', blob, 'screenshot.png');
-    
-    // 调用ScreenMind API
-    const apiResponse = await fetch(`${settings.serverUrl}/api/v1/analyze`, {
-      method: 'POST',
-      body: formData
-    });
-    
-    if (!apiResponse.ok) {
-      const errorData = await apiResponse.json();
-      throw new Error(errorData.detail || `API错误: ${apiResponse.status}`);
+    // 优先走WebSocket长连接，连接不可用时回退到HTTP上传
+    let result;
+    try {
+      result = await analyzeViaSocket(blob, settings);
+    } catch (socketError) {
+      if (socketError.fromServer) {
+        throw socketError;
+      }
+      console.warn('⚠️ WebSocket不可用，改用HTTP:', socketError.message);
+      result = await analyzeViaHttp(blob, settings);
     }
     
-    const result = await apiResponse.json();
-    
     console.log('✅ 分析完成:', result);
     
     // 存储分析结果
@@ -189,6 +357,11 @@ chrome.runtime.onMessage.addListener((request, sender, sendResponse) => {
     return true; // 保持消息通道开放
   }
   
+  if (request.type === 'CONNECT_SERVER') {
+    connectSocket().then(() => sendResponse({ success: true }));
+    return true;
+  }
+  
   if (request.type === 'GET_LAST_RESULT') {
     chrome.storage.local.get(['lastScreenshot', 'lastAnalysis', 'lastError']).then((data) => {
       sendResponse(data);
@@ -107,10 +107,16 @@ async function resetSettings() {
     }
 }
 
-// 检查服务器状态
+// 检查服务器状态：已保存的地址直接使用背景脚本WebSocket推送的状态，新输入的地址请求一次健康检查
 async function checkServerStatus() {
     try {
         const serverUrl = serverUrlInput.value.trim() || defaultSettings.serverUrl;
+        const { serverUrl: savedUrl } = await chrome.storage.sync.get({ serverUrl: defaultSettings.serverUrl });
+        const { serverStatus: pushedStatus } = await chrome.storage.local.get('serverStatus');
+        if (serverUrl === savedUrl && pushedStatus && pushedStatus.online) {
+            renderPushedStatus(pushedStatus);
+            return;
+        }
         
         serverStatus.textContent = '🔄 检查中...';
         serverStatus.className = 'status-indicator';
@@ -144,6 +150,27 @@ async function checkServerStatus() {
     }
 }
 
+// 显示背景脚本推送的服务器状态
+function renderPushedStatus(status) {
+    if (status.online) {
+        serverStatus.textContent = status.ai_service === 'unavailable' ? '🟡 AI服务不可用' : '🟢 在线';
+        serverStatus.className = 'status-indicator status-online';
+    } else {
+        serverStatus.textContent = '🔴 离线';
+        serverStatus.className = 'status-indicator status-offline';
+    }
+}
+
+// 服务器状态变化时更新（仅当输入框是已保存的地址）
+chrome.storage.onChanged.addListener(async (changes, namespace) => {
+    if (namespace === 'local' && changes.serverStatus && changes.serverStatus.newValue) {
+        const { serverUrl: savedUrl } = await chrome.storage.sync.get({ serverUrl: defaultSettings.serverUrl });
+        if ((serverUrlInput.value.trim() || defaultSettings.serverUrl) === savedUrl) {
+            renderPushedStatus(changes.serverStatus.newValue);
+        }
+    }
+});
+
 // 更新开关状态
 function updateToggle(toggle, active) {
     toggle.classList.toggle('active', active);
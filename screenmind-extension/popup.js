@@ -35,8 +35,19 @@ async function loadSettings() {
     }
 }
 
-// 检查服务器状态
+// 检查服务器状态（优先使用背景脚本WebSocket推送的状态，没有时才请求一次健康检查）
 async function checkServerStatus() {
+    // 唤醒背景脚本并确保连接存在，之后的状态变化通过存储推送
+    chrome.runtime.sendMessage({ type: 'CONNECT_SERVER' }).catch(() => {});
+
+    const { serverStatus: status } = await chrome.storage.local.get('serverStatus');
+    if (status) {
+        renderServerStatus(status);
+        if (status.online) {
+            return;
+        }
+    }
+
     try {
         const settings = await chrome.storage.sync.get({ serverUrl: 'http://localhost:8000' });
         
@@ -46,13 +57,25 @@ async function checkServerStatus() {
         });
         
         if (response.ok) {
-            serverStatus.textContent = '🟢 在线';
-            serverStatus.style.background = 'rgba(34, 197, 94, 0.3)';
+            renderServerStatus({ online: true });
         } else {
             throw new Error('服务器响应异常');
         }
     } catch (error) {
         console.error('服务器检查失败:', error);
+        renderServerStatus({ online: false });
+    }
+}
+
+// 显示服务器状态
+function renderServerStatus(status) {
+    if (status.online && status.ai_service === 'unavailable') {
+        serverStatus.textContent = '🟡 AI服务不可用';
+        serverStatus.style.background = 'rgba(234, 179, 8, 0.3)';
+    } else if (status.online) {
+        serverStatus.textContent = status.degraded ? '🟢 在线（繁忙）' : '🟢 在线';
+        serverStatus.style.background = 'rgba(34, 197, 94, 0.3)';
+    } else {
         serverStatus.textContent = '🔴 离线';
         serverStatus.style.background = 'rgba(239, 68, 68, 0.3)';
     }
@@ -173,7 +196,6 @@ async function captureScreen() {
             // 1秒后刷新结果
             setTimeout(async () => {
                 await loadLastResult();
-                await checkServerStatus();
             }, 1000);
         } else {
             throw new Error(response.error || '截屏失败');
@@ -199,6 +221,9 @@ chrome.storage.onChanged.addListener((changes, namespace) => {
         if (changes.lastAnalysis || changes.lastError) {
             loadLastResult();
         }
+        if (changes.serverStatus && changes.serverStatus.newValue) {
+            renderServerStatus(changes.serverStatus.newValue);
+        }
     }
 });
 
@@ -206,6 +231,5 @@ chrome.storage.onChanged.addListener((changes, namespace) => {
 chrome.runtime.onMessage.addListener((request, sender, sendResponse) => {
     if (request.type === 'UPDATE_POPUP') {
         loadLastResult();
-        checkServerStatus();
     }
 });
\ No newline at end of file
@@ -145,6 +145,7 @@ App({
         url: this.globalData.serverUrl + options.url,
         method: options.method || 'GET',
         data: options.data || {},
+        timeout: options.timeout || 60000,
         header: {
           'Content-Type': 'application/json',
           'Device-Id': this.globalData.deviceId,
@@ -154,7 +155,9 @@ App({
           if (res.statusCode === 200) {
             resolve(res.data)
           } else {
-            reject(new Error(`请求失败: ${res.statusCode}`))
+            const error = new Error(`请求失败: ${res.statusCode}`)
+            error.statusCode = res.statusCode
+            reject(error)
           }
         },
         fail: (error) => {
@@ -1,6 +1,13 @@
 // pages/index/index.js
 const app = getApp()
 
+// 长轮询单次等待秒数（服务端最长30秒）
+const LONG_POLL_TIMEOUT = 25
+// 长轮询失败后的最长重试间隔（毫秒）
+const MAX_RETRY_DELAY = 30000
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms))
+
 Page({
   data: {
     userInfo: null,
@@ -19,7 +26,15 @@ Page({
 
   onShow() {
     this.checkConnectionStatus()
-    this.loadLatestNotification()
+    this.startNotificationLoop()
+  },
+
+  onHide() {
+    this.stopNotificationLoop()
+  },
+
+  onUnload() {
+    this.stopNotificationLoop()
   },
 
   // 初始化页面
@@ -69,19 +84,69 @@ Page({
         data: { deviceId: this.data.deviceId }
       })
       
-      if (res.data.notification) {
-        this.setData({
-          latestNotification: {
-            ...res.data.notification,
-            time: this.formatTime(res.data.notification.created_at)
-          }
-        })
-      }
+      this.showNotification(res.data.notification)
     } catch (error) {
       console.error('加载最新通知失败:', error)
     }
   },
 
+  showNotification(notification) {
+    if (!notification) return
+    this.setData({
+      latestNotification: {
+        ...notification,
+        time: this.formatTime(notification.created_at)
+      }
+    })
+  },
+
+  // 长轮询接收通知：服务端有新通知时立即返回，否则挂起到超时，代替定时轮询
+  // 第一次请求不带游标，立即返回最新通知和当前游标；之后按游标补发断线期间的通知
+  async startNotificationLoop() {
+    if (!this.data.isLoggedIn || this.polling) return
+
+    this.polling = true
+    const loopId = this.loopId = (this.loopId || 0) + 1
+    let failures = 0
+
+    while (this.polling && loopId === this.loopId) {
+      try {
+        const data = { deviceId: this.data.deviceId }
+        if (this.cursor !== undefined) {
+          data.cursor = this.cursor
+          data.timeout = LONG_POLL_TIMEOUT
+        }
+
+        const res = await app.request({
+          url: '/api/v1/miniprogram/notifications/latest',
+          method: 'GET',
+          data,
+          timeout: (LONG_POLL_TIMEOUT + 10) * 1000
+        })
+        if (loopId !== this.loopId) return
+
+        failures = 0
+        this.cursor = res.data.cursor
+        this.showNotification(res.data.notification)
+      } catch (error) {
+        if (error.statusCode === 404) {
+          // 设备已在服务端解绑，停止接收通知
+          this.stopNotificationLoop()
+          this.setData({ isConnected: false })
+          return
+        }
+        console.error('接收通知失败:', error)
+        failures++
+        await sleep(Math.min(MAX_RETRY_DELAY, 1000 * Math.pow(2, failures)))
+      }
+    }
+  },
+
+  stopNotificationLoop() {
+    this.polling = false
+    this.loopId = (this.loopId || 0) + 1
+  },
+
   // 处理绑定设备
   async handleBind() {
     if (this.data.loading) return
@@ -111,7 +176,7 @@ Page({
         }
       })
 
-      if (bindRes.data.success) {
+      if (bindRes.success) {
         // 保存用户信息
         wx.setStorageSync('userInfo', userProfile.userInfo)
         wx.setStorageSync('openid', bindRes.data.openid)
@@ -121,13 +186,15 @@ Page({
           isLoggedIn: true,
           isConnected: true
         })
+        this.cursor = bindRes.data.cursor
+        this.startNotificationLoop()
 
         wx.showToast({
           title: '绑定成功！',
           icon: 'success'
         })
       } else {
-        throw new Error(bindRes.data.message || '绑定失败')
+        throw new Error(bindRes.message || '绑定失败')
       }
     } catch (error) {
       console.error('绑定失败:', error)
@@ -162,6 +229,8 @@ Page({
       })
 
       // 清除本地数据
+      this.stopNotificationLoop()
+      this.cursor = undefined
       wx.removeStorageSync('userInfo')
       wx.removeStorageSync('openid')
 
@@ -203,15 +272,11 @@ Page({
         }
       })
 
+      // 通知通过长轮询送达，无需再手动刷新
       wx.showToast({
         title: '测试通知已发送',
         icon: 'success'
       })
-
-      // 延迟刷新最新通知
-      setTimeout(() => {
-        this.loadLatestNotification()
-      }, 2000)
     } catch (error) {
       console.error('发送测试通知失败:', error)
       wx.showToast({
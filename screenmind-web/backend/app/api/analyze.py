@@ -1,24 +1,49 @@
 """
 图片分析API
 """
-from fastapi import APIRouter, File, UploadFile, HTTPException
-from typing import Optional
+from fastapi import APIRouter, File, UploadFile, HTTPException, Request, Header, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+from typing import Optional, List
 import base64
+import asyncio
 import io
 import time
 from PIL import Image
+from ..core.ai_service import WebConfig
+from ..core.overload import downscale_image
+from ..core.image_budget import plan_image_budget, check_aspect_ratio, MAX_ASPECT_RATIO
+from ..core.screen_capture import encode_png
+from ..core.screen_watch import FrameDiffer, format_sse
+from ..core.scheduler import INTERACTIVE, BACKGROUND
+from ..core.stage_timing import StageTimings
+from .screenshot import capture_screen_image, resolve_capture_bbox
+from .miniprogram import publish_analysis
 from ..core.logger import api_logger
 
 router = APIRouter()
 
 # 全局变量，将从main.py中设置
 question_analyzer = None
+overload_controller = None
+blob_store = None
+history_store = None
+analysis_scheduler = None
+
+# 上传图片大小上限
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+
+# 屏幕监视模式空闲时的心跳间隔（秒）
+WATCH_HEARTBEAT_SECONDS = 15
 
 @router.post("/analyze")
 async def analyze_image(
+    response: Response,
     image: UploadFile = File(...),
     model_provider: Optional[str] = None,
-    model_name: Optional[str] = None
+    model_name: Optional[str] = None,
+    device_id: Optional[str] = Header(None, alias="Device-Id")
 ):
     """
     分析上传的图片
@@ -27,11 +52,13 @@ async def analyze_image(
         image: 上传的图片文件
         model_provider: AI模型提供商 (optional)
         model_name: 模型名称 (optional)
+        device_id: 请求头 Device-Id（可选），记录在分析历史中
 
     Returns:
-        分析结果JSON
+        分析结果JSON，各阶段耗时见 Server-Timing 响应头
     """
     start_time = time.time()
+    timings = StageTimings()
     api_logger.info(f"开始分析图片: {image.filename}, 大小: {image.size if hasattr(image, 'size') else 'unknown'} bytes")
 
     try:
@@ -41,60 +68,23 @@ async def analyze_image(
             raise HTTPException(status_code=400, detail="文件必须是图片格式")
 
         # 读取图片数据
-        image_data = await image.read()
+        with timings.measure("read"):
+            image_data = await image.read()
         api_logger.info(f"成功读取图片数据: {len(image_data)} bytes")
 
-        # 验证图片大小 (限制10MB)
-        if len(image_data) > 10 * 1024 * 1024:
-            raise HTTPException(status_code=400, detail="图片文件过大，请上传小于10MB的图片")
-
-        # 验证是否为有效图片
-        try:
-            pil_image = Image.open(io.BytesIO(image_data))
-            pil_image.verify()
-        except Exception:
-            raise HTTPException(status_code=400, detail="无效的图片文件")
-
-        # 转换为base64用于AI分析
-        image_base64 = base64.b64encode(image_data).decode('utf-8')
-
-        # 使用真实的AI分析服务
-        if not question_analyzer:
-            api_logger.error("AI分析服务未初始化")
-            raise HTTPException(status_code=500, detail="AI分析服务未初始化")
-
-        api_logger.info("开始调用AI分析服务...")
-        analysis_result = question_analyzer.analyze_question_image(image_base64)
-        if not analysis_result['success']:
-            # 直接返回错误，不使用模拟数据
-            error_msg = analysis_result.get('error', '分析失败')
-            api_logger.error(f"AI分析失败: {error_msg}")
-            raise HTTPException(status_code=500, detail=error_msg)
-
-        # 成功获得AI分析结果
-        analysis_data = {
-            'question_type': analysis_result['question_type'],
-            'question_content': analysis_result['question_content'],
-            'answer': analysis_result['answer'],
-            'explanation': analysis_result['explanation']
-        }
+        with timings.measure("decode"):
+            pil_image = open_image_bytes(image_data)
+        analysis_data = await run_analysis_pipeline(pil_image, image_data, device_id=device_id, timings=timings)
+        response.headers["Server-Timing"] = timings.header()
 
         analysis_time = round(time.time() - start_time, 2)
-        
-        # 记录详细的分析结果到日志
         api_logger.info(f"图片分析完成，耗时: {analysis_time}秒")
-        api_logger.info(f"分析结果详情:")
-        api_logger.info(f"  - 题目类型: {analysis_data['question_type']}")
-        api_logger.info(f"  - 题目内容: {analysis_data['question_content'][:100]}{'...' if len(analysis_data['question_content']) > 100 else ''}")
-        api_logger.info(f"  - 答案: {analysis_data['answer']}")
-        api_logger.info(f"  - 解析: {analysis_data['explanation'][:200]}{'...' if len(analysis_data['explanation']) > 200 else ''}")
 
         return {
             "success": True,
             "data": {
                 **analysis_data,
                 "analysis_time": analysis_time,
-                "model_used": model_name or "qwen-vl-plus",
                 "image_size": len(image_data),
                 "image_format": image.content_type
             }
@@ -107,6 +97,448 @@ async def analyze_image(
         raise HTTPException(status_code=500, detail=f"分析失败: {str(e)}")
 
 
+# 批量分析一次最多上传的图片数
+MAX_BATCH_IMAGES = 50
+
+@router.post("/analyze/batch")
+async def analyze_batch(
+    response: Response,
+    images: List[UploadFile] = File(...),
+    device_id: Optional[str] = Header(None, alias="Device-Id")
+):
+    """
+    批量分析图片（后台优先级）
+
+    所有图片以后台优先级排队，不占用截图即时分析的名额；同一设备的批量任务与其他设备公平轮流
+
+    Args:
+        images: 多个图片文件
+        device_id: 请求头 Device-Id（可选）
+
+    Returns:
+        与上传顺序一致的结果列表，单张失败不影响其他图片；Server-Timing 响应头为各阶段的单张平均耗时
+    """
+    if len(images) > MAX_BATCH_IMAGES:
+        raise HTTPException(status_code=400, detail=f"一次最多上传 {MAX_BATCH_IMAGES} 张图片")
+
+    start_time = time.time()
+    api_logger.info(f"开始批量分析 {len(images)} 张图片，设备: {device_id or '未知'}")
+    batch_timings = []
+
+    async def analyze_one(upload: UploadFile) -> dict:
+        timings = StageTimings()
+        try:
+            if not (upload.content_type or "").startswith('image/'):
+                raise HTTPException(status_code=400, detail="文件必须是图片格式")
+            with timings.measure("read"):
+                image_data = await upload.read()
+            with timings.measure("decode"):
+                pil_image = open_image_bytes(image_data)
+            data = await run_analysis_pipeline(
+                pil_image, image_data, priority=BACKGROUND, device_id=device_id, timings=timings
+            )
+            batch_timings.append(timings)
+            return {"filename": upload.filename, "success": True, "data": data}
+        except HTTPException as e:
+            return {"filename": upload.filename, "success": False, "error": e.detail}
+        except Exception as e:
+            api_logger.error(f"批量分析 {upload.filename} 出现异常: {str(e)}", exc_info=True)
+            return {"filename": upload.filename, "success": False, "error": f"分析失败: {str(e)}"}
+
+    results = await asyncio.gather(*(analyze_one(upload) for upload in images))
+    succeeded = sum(1 for result in results if result["success"])
+    analysis_time = round(time.time() - start_time, 2)
+    api_logger.info(f"批量分析完成: {succeeded}/{len(images)} 成功，耗时: {analysis_time}秒")
+    response.headers["Server-Timing"] = StageTimings.mean_header(batch_timings, time.time() - start_time)
+
+    return {
+        "success": True,
+        "data": {
+            "results": results,
+            "total": len(images),
+            "succeeded": succeeded,
+            "analysis_time": analysis_time
+        }
+    }
+
+
+@router.post("/screenshot/analyze")
+async def capture_and_analyze(
+    response: Response,
+    left: Optional[int] = None,
+    top: Optional[int] = None,
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+    monitor: Optional[int] = None,
+    window: Optional[str] = None,
+    thumbnail: bool = False,
+    thumbnail_size: int = 320,
+    device_id: Optional[str] = Header(None, alias="Device-Id")
+):
+    """
+    截屏并直接分析（一体化接口）
+
+    截屏得到的内存图片直接进入分析流程，不再把base64图片返回给浏览器再上传一次
+
+    Args:
+        left/top/width/height: 截取区域（可选，四个参数都给出时生效）
+        monitor: 截取指定显示器（从1开始，可选）
+        window: 为 "active" 时截取当前活动窗口（可选）
+        thumbnail: 是否在结果中附带缩略图
+        thumbnail_size: 缩略图最长边（像素）
+        device_id: 请求头 Device-Id（可选），记录在分析历史中
+
+    Returns:
+        分析结果JSON
+    """
+    start_time = time.time()
+    timings = StageTimings()
+
+    try:
+        with timings.measure("capture"):
+            bbox = await run_in_threadpool(resolve_capture_bbox, left, top, width, height, monitor, window)
+            api_logger.info(f"开始截屏并分析，区域: {bbox or '全屏'}")
+            pil_image = await run_in_threadpool(capture_screen_image, bbox)
+        capture_time = round(time.time() - start_time, 2)
+
+        analysis_data = await run_analysis_pipeline(pil_image, device_id=device_id, timings=timings)
+        analysis_time = round(time.time() - start_time, 2)
+        api_logger.info(f"截屏分析完成，截屏耗时: {capture_time}秒，总耗时: {analysis_time}秒")
+
+        data = {
+            **analysis_data,
+            "analysis_time": analysis_time,
+            "capture_time": capture_time,
+            "image_width": pil_image.width,
+            "image_height": pil_image.height
+        }
+        if thumbnail:
+            with timings.measure("thumbnail"):
+                data["thumbnail"] = await run_in_threadpool(_make_thumbnail, pil_image, thumbnail_size)
+        response.headers["Server-Timing"] = timings.header()
+
+        return {
+            "success": True,
+            "data": data
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        api_logger.error(f"截屏分析出现异常: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"截屏分析失败: {str(e)}")
+
+
+@router.get("/screenshot/watch")
+async def watch_screen(
+    request: Request,
+    interval: float = 1.0,
+    threshold: float = 0.02,
+    left: Optional[int] = None,
+    top: Optional[int] = None,
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+    monitor: Optional[int] = None,
+    window: Optional[str] = None
+):
+    """
+    屏幕监视模式 (Server-Sent Events)
+
+    按间隔截屏并与上一帧做分块哈希比较，变化面积超过阈值且画面稳定后才分析，
+    分析结果通过 result 事件推送；画面不变时只有廉价的截屏和比较
+
+    Args:
+        interval: 截屏间隔（秒，最小0.2）
+        threshold: 触发分析的变化分块占比 (0-1)
+        left/top/width/height/monitor/window: 截取范围，同 /screenshot
+    """
+    interval = max(0.2, interval)
+    bbox = await run_in_threadpool(resolve_capture_bbox, left, top, width, height, monitor, window)
+    api_logger.info(f"开始屏幕监视，间隔: {interval}秒，阈值: {threshold}，区域: {bbox or '全屏'}")
+
+    async def event_stream():
+        differ = FrameDiffer()
+        # 检测到变化后等画面稳定（下一帧不再变化）再分析，避免分析翻页动画的中间帧
+        pending = False
+        frames = 0
+        analyses = 0
+        last_sent = time.time()
+        yield format_sse("status", {"state": "watching", "interval": interval, "threshold": threshold})
+
+        while not await request.is_disconnected():
+            loop_start = time.time()
+            try:
+                image = await run_in_threadpool(capture_screen_image, bbox)
+                changed = await run_in_threadpool(differ.update, image)
+                frames += 1
+
+                if changed >= threshold:
+                    pending = True
+                    last_sent = time.time()
+                    yield format_sse("change", {"changed": round(changed, 4), "frame": frames})
+                elif pending:
+                    pending = False
+                    analyses += 1
+                    data = await run_analysis_pipeline(image)
+                    last_sent = time.time()
+                    yield format_sse("result", {**data, "frame": frames, "analyses": analyses})
+                elif time.time() - last_sent >= WATCH_HEARTBEAT_SECONDS:
+                    # SSE注释行作为心跳，空闲时保持连接
+                    last_sent = time.time()
+                    yield ": idle\n\n"
+            except HTTPException as e:
+                yield format_sse("error", {"message": e.detail})
+            except Exception as e:
+                api_logger.error(f"屏幕监视出错: {str(e)}")
+                yield format_sse("error", {"message": str(e)})
+
+            await asyncio.sleep(max(0.0, interval - (time.time() - loop_start)))
+
+        api_logger.info(f"屏幕监视结束，共截取 {frames} 帧，分析 {analyses} 次")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def open_image_bytes(image_data: bytes) -> Image.Image:
+    """
+    校验并打开上传的图片字节
+
+    Raises:
+        HTTPException: 图片过大、长宽比过于极端或不是有效图片
+    """
+    # 验证图片大小 (限制10MB)
+    if len(image_data) > MAX_IMAGE_BYTES:
+        raise HTTPException(status_code=400, detail="图片文件过大，请上传小于10MB的图片")
+
+    # 验证是否为有效图片
+    try:
+        pil_image = Image.open(io.BytesIO(image_data))
+        pil_image.verify()
+    except Exception:
+        raise HTTPException(status_code=400, detail="无效的图片文件")
+
+    # 长条形的极端图片不是题目截图，统计和编码都可能很慢，直接拒绝
+    if not check_aspect_ratio(*pil_image.size):
+        raise HTTPException(status_code=400, detail=f"图片长宽比超过 {MAX_ASPECT_RATIO}:1，请裁剪后重新上传")
+
+    # 重新打开图片（verify之后图片对象不可再用）
+    return Image.open(io.BytesIO(image_data))
+
+
+def _make_thumbnail(image: Image.Image, max_side: int) -> str:
+    """生成JPEG缩略图并返回data URL"""
+    thumb = image.convert('RGB')
+    thumb.thumbnail((max_side, max_side))
+    buffer = io.BytesIO()
+    thumb.save(buffer, format='JPEG', quality=70)
+    return "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+
+async def run_analysis_pipeline(
+    pil_image: Image.Image,
+    image_data: Optional[bytes] = None,
+    image_id: Optional[str] = None,
+    priority: str = INTERACTIVE,
+    device_id: Optional[str] = None,
+    timings: Optional[StageTimings] = None
+) -> dict:
+    """
+    图片分析流程：保存原图 -> 过载降级 -> detail/token预算 -> AI分析 -> 结果整理 -> 记录历史 -> 发布通知
+
+    Args:
+        pil_image: 已打开的图片
+        image_data: 图片原始编码字节（上传的文件）；为None或图片被缩放时重新编码为PNG
+        image_id: 图片已在图片存储中时传入其ID（重新分析），不再重复保存
+        priority: 调度优先级，interactive（截图即时分析）或 background（批量/重新分析）
+        device_id: 发起请求的设备ID，用于同一优先级内的公平排队，并记录在分析历史中
+        timings: 记录各阶段耗时（prepare/queue/model/store/history），None时不记录
+
+    Returns:
+        分析结果字典（题目类型、内容、答案、解析、图片ID、历史记录ID以及模型、流程、降级信息）
+    """
+    if not question_analyzer:
+        api_logger.error("AI分析服务未初始化")
+        raise HTTPException(status_code=500, detail="AI分析服务未初始化")
+
+    timings = timings or StageTimings()
+    prepare_start = time.perf_counter()
+
+    # 原图与AI调用并行写入图片存储（按内容哈希去重），供重新分析和详情页引用
+    store_task = None
+    if blob_store and image_id is None:
+        if image_data is None:
+            image_data = await run_in_threadpool(encode_png, pil_image)
+        store_task = asyncio.create_task(run_in_threadpool(blob_store.put, image_data))
+
+    # 过载保护：负载过高时换用更便宜的模型并降低token数和分辨率
+    degrade_plan = None
+    if overload_controller:
+        degrade_plan = overload_controller.plan(
+            question_analyzer.ai_service.current_provider,
+            WebConfig.get_available_models()
+        )
+    if degrade_plan:
+        api_logger.warning(f"请求降级处理: {degrade_plan['reason']}")
+        resized = await run_in_threadpool(downscale_image, pil_image, degrade_plan['max_image_side'])
+        if resized is not pil_image:
+            pil_image, image_data = resized, None
+
+    # 根据图片统计量选择detail级别和token预算，降级时取两者中更小的token数
+    budget = await run_in_threadpool(plan_image_budget, pil_image)
+    max_tokens = budget['max_tokens']
+    if degrade_plan:
+        max_tokens = min(max_tokens, degrade_plan['max_tokens'])
+    api_logger.info(
+        f"图片预算: detail={budget['detail']}, max_tokens={max_tokens}, 统计: {budget['stats']}"
+    )
+
+    # 转换为base64用于AI分析
+    if image_data is None:
+        image_data = await run_in_threadpool(encode_png, pil_image)
+    image_base64 = base64.b64encode(image_data).decode('utf-8')
+    timings.add("prepare", time.perf_counter() - prepare_start)
+
+    api_logger.info("开始调用AI分析服务...")
+    analysis_result = await _run_analysis(
+        image_base64,
+        model=degrade_plan['model'] if degrade_plan else None,
+        max_tokens=max_tokens,
+        detail=budget['detail'],
+        priority=priority,
+        device_id=device_id,
+        timings=timings
+    )
+    if not analysis_result['success']:
+        # 直接返回错误，不使用模拟数据
+        error_msg = analysis_result.get('error', '分析失败')
+        api_logger.error(f"AI分析失败: {error_msg}")
+        raise HTTPException(status_code=500, detail=error_msg)
+
+    # 成功获得AI分析结果
+    analysis_data = {
+        'question_type': analysis_result['question_type'],
+        'question_content': analysis_result['question_content'],
+        'answer': analysis_result['answer'],
+        'explanation': analysis_result['explanation']
+    }
+
+    # 记录详细的分析结果到日志
+    api_logger.info(f"分析结果详情:")
+    api_logger.info(f"  - 题目类型: {analysis_data['question_type']}")
+    api_logger.info(f"  - 题目内容: {analysis_data['question_content'][:100]}{'...' if len(analysis_data['question_content']) > 100 else ''}")
+    api_logger.info(f"  - 答案: {analysis_data['answer']}")
+    api_logger.info(f"  - 解析: {analysis_data['explanation'][:200]}{'...' if len(analysis_data['explanation']) > 200 else ''}")
+
+    if store_task is not None:
+        try:
+            # 只计入AI调用结束后仍需等待的时间
+            with timings.measure("store"):
+                image_id = await store_task
+        except Exception as e:
+            api_logger.error(f"保存原图失败: {str(e)}")
+
+    # 报告实际处理请求的模型：纯文本路径是提供商的文本模型；缓存和题库命中没有调用模型，也不算降级
+    pipeline = analysis_result.get('pipeline', 'vision')
+    degraded = degrade_plan is not None and pipeline not in ('cache', 'question_bank')
+
+    result = {
+        **analysis_data,
+        "model_used": analysis_result.get('model_used'),
+        "pipeline": pipeline,
+        "degraded": degraded,
+        "degrade_reason": degrade_plan['reason'] if degraded else None,
+        "image_id": image_id,
+        "history_id": None
+    }
+
+    # 写入分析历史（全文检索）
+    if history_store:
+        try:
+            with timings.measure("history"):
+                result["history_id"] = await run_in_threadpool(history_store.add, result, None, device_id)
+        except Exception as e:
+            api_logger.error(f"记录分析历史失败: {str(e)}")
+
+    # 通知已绑定的小程序设备
+    publish_analysis(result)
+    return result
+
+
+@asynccontextmanager
+async def _schedule(priority: str, device_id: Optional[str]):
+    """获取调度器名额，未启用调度器时不等待"""
+    if analysis_scheduler is None:
+        yield 0.0
+        return
+    async with analysis_scheduler.slot(priority, device_id) as wait:
+        yield wait
+
+
+async def _run_analysis(
+    image_base64: str,
+    model: Optional[str] = None,
+    max_tokens: Optional[int] = None,
+    detail: Optional[str] = None,
+    priority: str = INTERACTIVE,
+    device_id: Optional[str] = None,
+    timings: Optional[StageTimings] = None
+) -> dict:
+    """
+    经调度器排队后在线程池中执行AI分析，避免阻塞事件循环，并向过载控制器汇报排队与延迟
+
+    Args:
+        image_base64: base64编码的图片
+        model: 覆盖使用的模型（降级时）
+        max_tokens: 最大输出token数
+        detail: 图片detail级别
+        priority: 调度优先级
+        device_id: 公平排队的设备ID
+        timings: 记录排队（调度器+线程池）和模型调用耗时
+
+    Returns:
+        QuestionAnalyzer的分析结果
+    """
+    # 交互请求从进入调度队列起就计入在途数，调度器中积压的请求也会触发降级；
+    # 后台任务排队是预期行为，开始执行时才计入
+    counted = False
+    if overload_controller and priority == INTERACTIVE:
+        overload_controller.enter()
+        counted = True
+    latency = None
+    try:
+        async with _schedule(priority, device_id) as scheduler_wait:
+            queued_at = time.time()
+            if overload_controller and not counted:
+                overload_controller.enter()
+                counted = True
+
+            def _analyze():
+                nonlocal latency
+                started_at = time.time()
+                # 只有交互请求的排队计入过载判断：后台批量任务排队是预期行为，不应让截图分析降级
+                if overload_controller and priority == INTERACTIVE:
+                    overload_controller.observe_queue_wait(scheduler_wait + started_at - queued_at)
+                if timings:
+                    timings.add("queue", scheduler_wait + started_at - queued_at)
+                try:
+                    return question_analyzer.analyze_question_image(
+                        image_base64, model=model, max_tokens=max_tokens, detail=detail
+                    )
+                finally:
+                    latency = time.time() - started_at
+                    if timings:
+                        timings.add("model", latency)
+
+            return await run_in_threadpool(_analyze)
+    finally:
+        if counted:
+            overload_controller.leave(latency)
+
+
 @router.get("/models")
 async def get_available_models():
     """获取可用的AI模型列表"""
@@ -128,6 +560,11 @@ async def get_available_models():
                 "name": "OpenAI GPT",
                 "models": ["gpt-4o", "gpt-4o-mini"],
                 "requires_api_key": True
+            },
+            "mock": {
+                "name": "本地模拟 (离线压测)",
+                "models": ["mock-vl", "mock-vl-fast"],
+                "requires_api_key": False
             }
         }
     }
\ No newline at end of file
@@ -1,13 +1,21 @@
 """
 配置管理API
+配置保存在共享配置存储中，所有worker通过版本号感知变更
 """
+import os
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 from typing import Optional, Dict, Any
-import os
 
 router = APIRouter()
 
+# 共享配置存储和AI服务实例（从main.py注入）
+config_store = None
+ai_service = None
+
+VALID_PROVIDERS = ["gemini", "qwen", "openai", "mock"]
+
 class APIKeyRequest(BaseModel):
     provider: str
     api_key: str
@@ -16,16 +24,25 @@ class ModelConfigRequest(BaseModel):
     provider: str
     model: str
 
-# 模拟配置存储 (实际应用中应该使用数据库或加密存储)
-_config_store = {
-    "current_provider": "qwen",
-    "current_model": "qwen-vl-plus",
-    "api_keys": {}  # 实际应用中应该加密存储
-}
+def apply_config_snapshot(snapshot: Dict[str, Any]) -> bool:
+    """
+    把配置快照应用到本进程的AI服务（新客户端创建完成后才替换）
+
+    Returns:
+        新客户端是否可用
+    """
+    if ai_service is None:
+        return False
+    return ai_service.apply_config(
+        snapshot["current_provider"],
+        snapshot["current_model"],
+        snapshot["api_keys"]
+    )
 
 @router.get("/models")
 async def get_available_models():
     """获取可用的AI模型配置"""
+    snapshot = await run_in_threadpool(config_store.snapshot)
     return {
         "success": True,
         "data": {
@@ -48,11 +65,18 @@ async def get_available_models():
                     "models": ["gpt-4o", "gpt-4o-mini"],
                     "api_key_env": "OPENAI_API_KEY",
                     "requires_base_url": False
+                },
+                "mock": {
+                    "name": "本地模拟 (离线压测)",
+                    "models": ["mock-vl", "mock-vl-fast"],
+                    "api_key_env": "MOCK_API_KEY",
+                    "requires_base_url": True,
+                    "base_url": os.getenv("MOCK_BASE_URL", "http://127.0.0.1:8001/v1")
                 }
             },
             "current_config": {
-                "provider": _config_store["current_provider"],
-                "model": _config_store["current_model"]
+                "provider": snapshot["current_provider"],
+                "model": snapshot["current_model"]
             }
         }
     }
@@ -62,21 +86,13 @@ async def set_api_key(request: APIKeyRequest):
     """设置API密钥"""
     try:
         # 验证提供商是否有效
-        valid_providers = ["gemini", "qwen", "openai"]
-        if request.provider not in valid_providers:
+        if request.provider not in VALID_PROVIDERS:
             raise HTTPException(status_code=400, detail="无效的AI提供商")
 
-        # 存储API密钥 (实际应用中应该加密)
-        _config_store["api_keys"][request.provider] = request.api_key
-
-        # 设置环境变量 (临时方案)
-        env_key = {
-            "gemini": "GEMINI_API_KEY",
-            "qwen": "QWEN_API_KEY",
-            "openai": "OPENAI_API_KEY"
-        }[request.provider]
-
-        os.environ[env_key] = request.api_key
+        # 写入共享配置 (实际应用中应该加密)，其他worker会在下一次版本检查时生效
+        snapshot = await run_in_threadpool(config_store.set_api_key, request.provider, request.api_key)
+        if request.provider == snapshot["current_provider"]:
+            await run_in_threadpool(apply_config_snapshot, snapshot)
 
         return {
             "success": True,
@@ -96,7 +112,8 @@ async def set_model(request: ModelConfigRequest):
         available_models = {
             "gemini": ["gemini-1.5-flash", "gemini-1.5-pro"],
             "qwen": ["qwen-vl-plus", "qwen-vl-max"],
-            "openai": ["gpt-4o", "gpt-4o-mini"]
+            "openai": ["gpt-4o", "gpt-4o-mini"],
+            "mock": ["mock-vl", "mock-vl-fast"]
         }
 
         # 验证提供商和模型
@@ -106,16 +123,18 @@ async def set_model(request: ModelConfigRequest):
         if request.model not in available_models[request.provider]:
             raise HTTPException(status_code=400, detail="该提供商不支持指定的模型")
 
-        # 更新配置
-        _config_store["current_provider"] = request.provider
-        _config_store["current_model"] = request.model
+        # 更新共享配置，并在本进程立即切换（新客户端就绪后再替换）
+        snapshot = await run_in_threadpool(config_store.set_model, request.provider, request.model)
+        client_ready = await run_in_threadpool(apply_config_snapshot, snapshot)
 
         return {
             "success": True,
             "message": f"模型已切换到 {request.provider}:{request.model}",
             "data": {
                 "provider": request.provider,
-                "model": request.model
+                "model": request.model,
+                "client_ready": client_ready,
+                "config_version": snapshot["version"]
             }
         }
 
@@ -127,14 +146,16 @@ async def set_model(request: ModelConfigRequest):
 @router.get("/settings")
 async def get_settings():
     """获取当前设置"""
+    snapshot = await run_in_threadpool(config_store.snapshot)
     return {
         "success": True,
         "data": {
-            "current_provider": _config_store["current_provider"],
-            "current_model": _config_store["current_model"],
+            "current_provider": snapshot["current_provider"],
+            "current_model": snapshot["current_model"],
+            "config_version": snapshot["version"],
             "api_keys_configured": {
                 provider: bool(api_key)
-                for provider, api_key in _config_store["api_keys"].items()
+                for provider, api_key in snapshot["api_keys"].items()
             },
             "app_info": {
                 "name": "ScreenMind",
@@ -148,22 +169,13 @@ async def get_settings():
 async def remove_api_key(provider: str):
     """删除指定提供商的API密钥"""
     try:
-        if provider not in ["gemini", "qwen", "openai"]:
+        if provider not in VALID_PROVIDERS:
             raise HTTPException(status_code=400, detail="无效的AI提供商")
 
-        # 删除存储的API密钥
-        if provider in _config_store["api_keys"]:
-            del _config_store["api_keys"][provider]
-
-        # 清除环境变量
-        env_key = {
-            "gemini": "GEMINI_API_KEY",
-            "qwen": "QWEN_API_KEY",
-            "openai": "OPENAI_API_KEY"
-        }[provider]
-
-        if env_key in os.environ:
-            del os.environ[env_key]
+        # 删除共享配置中的API密钥（回退到环境变量中的密钥）
+        snapshot = await run_in_threadpool(config_store.set_api_key, provider, None)
+        if provider == snapshot["current_provider"]:
+            await run_in_threadpool(apply_config_snapshot, snapshot)
 
         return {
             "success": True,
@@ -173,4 +185,4 @@ async def remove_api_key(provider: str):
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"删除API密钥失败: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"删除API密钥失败: {str(e)}")
@@ -3,9 +3,22 @@
 """
 from fastapi import APIRouter
 from datetime import datetime
+import time
+from ..core.provider_health import READY_STATES
+from ..core.responses import FastJSONResponse
 
 router = APIRouter()
 
+# 全局变量，将从main.py中设置
+overload_controller = None
+connection_warmer = None
+provider_health = None
+analysis_scheduler = None
+provider_cassette = None
+
+# 进程启动时间
+STARTED_AT = time.time()
+
 @router.get("/health")
 async def health_check():
     """健康检查接口"""
@@ -16,11 +29,36 @@ async def health_check():
         "version": "1.0.0"
     }
 
+@router.get("/live")
+async def liveness():
+    """存活检查：进程能处理请求即返回200"""
+    return {"status": "alive"}
+
+@router.get("/ready")
+async def readiness():
+    """就绪检查：AI客户端已创建（或处于录制回放模式）且提供商没有被判定为不可用，否则返回503（只读内存中的健康状态）"""
+    if provider_health is None:
+        return {"ready": True, "ai_service": None}
+    status = provider_health.get_status()
+    ready = status["status"] in READY_STATES
+    return FastJSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "ai_service": status["status"], "provider": status["provider"]}
+    )
+
 @router.get("/status")
 async def service_status():
     """服务状态检查"""
+    return get_service_status()
+
+def get_service_status() -> dict:
+    """汇总服务状态（只读内存，也用于WebSocket状态推送）"""
     return {
         "api": "running",
-        "ai_service": "available",  # 可以添加AI服务连接检查
-        "uptime": "unknown"  # 可以添加启动时间计算
+        "ai_service": provider_health.get_status() if provider_health else None,
+        "uptime": round(time.time() - STARTED_AT),
+        "load": overload_controller.get_status() if overload_controller else None,
+        "scheduler": analysis_scheduler.get_stats() if analysis_scheduler else None,
+        "cassette": provider_cassette.get_stats() if provider_cassette else None,
+        "connections": connection_warmer.get_status() if connection_warmer else None
     }
\ No newline at end of file
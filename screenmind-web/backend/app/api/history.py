@@ -0,0 +1,155 @@
+"""
+分析历史API
+"""
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Header
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from ..core.history_export import ExportEncoder, EXPORT_FORMATS, EXPORT_BATCH_SIZE
+from ..core.logger import api_logger
+
+router = APIRouter()
+
+# 全局变量，将从main.py中设置
+history_store = None
+
+
+def _require_store():
+    if not history_store:
+        raise HTTPException(status_code=503, detail="分析历史未启用")
+    return history_store
+
+
+@router.get("/history")
+async def list_history(
+    page: int = 1,
+    page_size: int = 20,
+    question_type: Optional[str] = None,
+    device_id: Optional[str] = None
+):
+    """
+    按时间倒序列出分析历史
+
+    Args:
+        page: 页码，从1开始
+        page_size: 每页条数（最大100）
+        question_type: 只列出指定题目类型（可选）
+        device_id: 只列出指定设备的记录（可选）
+    """
+    store = _require_store()
+    return {
+        "success": True,
+        "data": await run_in_threadpool(store.list_recent, page, page_size, question_type, device_id)
+    }
+
+
+@router.get("/history/search")
+async def search_history(q: str, page: int = 1, page_size: int = 20):
+    """
+    全文检索分析历史（题目内容、答案、解析），按相关度排序
+
+    Args:
+        q: 检索词，中文按相邻字匹配，英文按词前缀匹配，多个词之间为AND
+        page: 页码，从1开始
+        page_size: 每页条数（最大100）
+    """
+    store = _require_store()
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="检索词不能为空")
+    return {
+        "success": True,
+        "data": await run_in_threadpool(store.search, q, page, page_size)
+    }
+
+
+@router.get("/history/stats")
+async def get_history_stats():
+    """获取历史记录统计（总数、今天、最近7天）"""
+    store = _require_store()
+    return {
+        "success": True,
+        "data": await run_in_threadpool(store.get_stats)
+    }
+
+
+def _parse_time(value: Optional[str], name: str) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} 必须是ISO格式的日期或时间，如 2024-01-31")
+
+
+@router.get("/history/export")
+async def export_history(
+    format: str = "csv",
+    gzip: bool = False,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    question_type: Optional[str] = None,
+    device_id: Optional[str] = None,
+    header_device_id: Optional[str] = Header(None, alias="Device-Id")
+):
+    """
+    流式导出一台设备（或全部）的分析历史
+
+    按ID分批读取（每批一次短查询，在线程池中执行）并逐批编码发送，内存占用与历史总量无关；
+    客户端读取慢时只有本次导出在等待，不影响其他请求
+
+    Args:
+        format: csv 或 jsonl
+        gzip: 是否导出为gzip压缩文件 (.gz)
+        since / until: 时间范围（ISO格式，可选）
+        question_type: 只导出指定题目类型（可选）
+        device_id: 只导出该设备的记录，未提供时使用请求头 Device-Id；两者都没有时导出全部记录
+    """
+    store = _require_store()
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format 必须是 {' / '.join(EXPORT_FORMATS)}")
+    filters = {
+        "since": _parse_time(since, "since"),
+        "until": _parse_time(until, "until"),
+        "question_type": question_type,
+        "device_id": device_id or header_device_id
+    }
+    encoder = ExportEncoder(format, gzip)
+
+    def next_chunk(after_id: int):
+        rows = store.fetch_batch(after_id, EXPORT_BATCH_SIZE, **filters)
+        if not rows:
+            return None, b"", 0
+        return rows[-1]["id"], encoder.encode(rows), len(rows)
+
+    async def stream():
+        after_id, exported = 0, 0
+        while True:
+            last_id, chunk, count = await run_in_threadpool(next_chunk, after_id)
+            if last_id is None:
+                break
+            after_id, exported = last_id, exported + count
+            if chunk:
+                yield chunk
+        tail = encoder.finish()
+        if tail:
+            yield tail
+        api_logger.info(f"分析历史导出完成: {exported} 条，格式: {encoder.filename}")
+
+    return StreamingResponse(
+        stream(),
+        media_type=encoder.media_type,
+        headers={"Content-Disposition": f'attachment; filename="{encoder.filename}"'}
+    )
+
+
+@router.get("/history/{record_id}")
+async def get_history_record(record_id: int):
+    """获取一条历史记录"""
+    record = await run_in_threadpool(_require_store().get, record_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="历史记录不存在")
+    return {
+        "success": True,
+        "data": record
+    }
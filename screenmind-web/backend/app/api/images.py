@@ -0,0 +1,100 @@
+"""
+图片存储API
+按图片ID读取分析过的原图，或直接用图片ID重新分析而无需重新上传
+"""
+import time
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Header, Response
+from starlette.concurrency import run_in_threadpool
+from .analyze import open_image_bytes, run_analysis_pipeline
+from ..core.scheduler import BACKGROUND
+from ..core.stage_timing import StageTimings
+from ..core.logger import api_logger
+
+router = APIRouter()
+
+# 全局变量，将从main.py中设置
+blob_store = None
+
+
+def _require_store():
+    if not blob_store:
+        raise HTTPException(status_code=503, detail="图片存储未启用")
+    return blob_store
+
+
+@router.get("/images/stats")
+async def get_image_stats():
+    """获取图片存储统计信息"""
+    return {
+        "success": True,
+        "data": _require_store().get_stats()
+    }
+
+
+@router.get("/images/{image_id}")
+async def get_image(image_id: str):
+    """读取原图（内容按ID寻址，不会变化，可以长期缓存）"""
+    store = _require_store()
+    path = store.get_path(image_id)
+    try:
+        # 读入内存后再发送：文件可能在查找之后、发送之前被淘汰
+        image_data = await run_in_threadpool(store.read, image_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="图片不存在或已被清理")
+    return Response(
+        image_data,
+        media_type=store.content_type(path),
+        headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
+
+
+@router.post("/images/{image_id}/analyze")
+async def reanalyze_image(
+    image_id: str,
+    response: Response,
+    device_id: Optional[str] = Header(None, alias="Device-Id")
+):
+    """
+    用已保存的原图重新分析（后台优先级，不占用截图即时分析的名额）
+
+    Args:
+        image_id: 分析结果中返回的图片ID
+        device_id: 请求头 Device-Id（可选）
+
+    Returns:
+        分析结果JSON（字段同 /analyze）
+    """
+    store = _require_store()
+    start_time = time.time()
+    timings = StageTimings()
+    try:
+        with timings.measure("read"):
+            image_data = await run_in_threadpool(store.read, image_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="图片不存在或已被清理")
+
+    image_size = len(image_data)
+    try:
+        with timings.measure("decode"):
+            pil_image = open_image_bytes(image_data)
+        analysis_data = await run_analysis_pipeline(
+            pil_image, image_data, image_id=image_id, priority=BACKGROUND, device_id=device_id, timings=timings
+        )
+        response.headers["Server-Timing"] = timings.header()
+    except HTTPException:
+        raise
+    except Exception as e:
+        api_logger.error(f"重新分析出现异常: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"分析失败: {str(e)}")
+
+    analysis_time = round(time.time() - start_time, 2)
+    api_logger.info(f"重新分析完成: {image_id[:12]}，耗时: {analysis_time}秒")
+    return {
+        "success": True,
+        "data": {
+            **analysis_data,
+            "analysis_time": analysis_time,
+            "image_size": image_size
+        }
+    }
@@ -0,0 +1,245 @@
+"""
+小程序API
+设备绑定和通知推送：分析完成的通知通过长轮询或SSE送达，客户端用游标补发断线期间的通知
+"""
+from typing import Optional, Dict, Any
+from fastapi import APIRouter, HTTPException, Request, Header
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from ..core.screen_watch import format_sse
+from ..core.logger import api_logger
+
+router = APIRouter()
+
+# 全局变量，将从main.py中设置
+notification_hub = None
+
+# 长轮询最长等待时间（秒），需要小于小程序wx.request的超时时间
+LONG_POLL_MAX_SECONDS = 30
+
+# SSE空闲时的心跳间隔（秒）
+STREAM_HEARTBEAT_SECONDS = 15
+
+# 通知中题目内容的最大长度（完整内容在历史记录中查看）
+NOTIFICATION_TEXT_LIMIT = 200
+
+
+class BindRequest(BaseModel):
+    deviceId: str
+    code: Optional[str] = None
+    userInfo: Optional[Dict[str, Any]] = None
+
+
+class DeviceRequest(BaseModel):
+    deviceId: Optional[str] = None
+    openid: Optional[str] = None
+
+
+def _require_hub():
+    if not notification_hub:
+        raise HTTPException(status_code=503, detail="通知服务未启用")
+    return notification_hub
+
+
+def _resolve_device(hub, device_id: Optional[str], openid: Optional[str]) -> str:
+    """已绑定的订阅者，未绑定的设备不能订阅或接收通知"""
+    if not device_id and not openid:
+        raise HTTPException(status_code=400, detail="缺少deviceId或openid")
+    subscriber = hub.resolve(device_id, openid)
+    if not subscriber:
+        raise HTTPException(status_code=404, detail="设备未绑定，请先绑定")
+    return subscriber
+
+
+def build_analysis_notification(analysis_data: Dict[str, Any]) -> Dict[str, Any]:
+    """由分析结果生成通知内容"""
+    question = analysis_data.get("question_content") or ""
+    if len(question) > NOTIFICATION_TEXT_LIMIT:
+        question = question[:NOTIFICATION_TEXT_LIMIT] + "..."
+    return {
+        "kind": "analysis",
+        "type": analysis_data.get("question_type"),
+        "question": question,
+        "answer": analysis_data.get("answer"),
+        "model_used": analysis_data.get("model_used"),
+        "history_id": analysis_data.get("history_id")
+    }
+
+
+def publish_analysis(analysis_data: Dict[str, Any], device_id: Optional[str] = None):
+    """发布一次完成的分析（未启用通知中心时忽略）"""
+    if notification_hub is None:
+        return
+    try:
+        notification_hub.publish(build_analysis_notification(analysis_data), device_id)
+    except Exception as e:
+        api_logger.error(f"发布分析通知失败: {str(e)}")
+
+
+@router.post("/miniprogram/bind")
+async def bind_device(request: BindRequest):
+    """
+    绑定小程序设备
+
+    未配置微信登录时openid由设备ID生成（userInfo中带openId时直接使用）
+    """
+    hub = _require_hub()
+    openid = hub.bind(request.deviceId, (request.userInfo or {}).get("openId") or None, request.userInfo)
+    api_logger.info(f"小程序设备已绑定: {request.deviceId}")
+    return {
+        "success": True,
+        "message": "绑定成功",
+        "data": {"openid": openid, "cursor": hub.latest_cursor()}
+    }
+
+
+@router.post("/miniprogram/unbind")
+async def unbind_device(request: DeviceRequest):
+    """解除设备绑定"""
+    hub = _require_hub()
+    if not request.deviceId and not request.openid:
+        raise HTTPException(status_code=400, detail="缺少deviceId或openid")
+    device_id = request.deviceId or hub.resolve(openid=request.openid)
+    removed = bool(device_id) and hub.unbind(device_id)
+    if removed:
+        api_logger.info(f"小程序设备已解绑: {device_id}")
+    return {
+        "success": True,
+        "message": "解绑成功" if removed else "设备未绑定"
+    }
+
+
+@router.get("/miniprogram/status")
+async def device_status(deviceId: Optional[str] = None, openid: Optional[str] = None):
+    """设备绑定状态"""
+    hub = _require_hub()
+    if not deviceId and not openid:
+        raise HTTPException(status_code=400, detail="缺少deviceId或openid")
+    return {
+        "success": True,
+        "data": {"connected": hub.resolve(deviceId, openid) is not None}
+    }
+
+
+@router.get("/miniprogram/notifications/latest")
+async def latest_notifications(
+    deviceId: Optional[str] = None,
+    openid: Optional[str] = None,
+    cursor: Optional[int] = None,
+    timeout: float = 0
+):
+    """
+    获取通知（长轮询）
+
+    不带cursor时立即返回最新一条通知和当前游标；带cursor时返回之后的通知，
+    没有新通知则最多挂起timeout秒，期间有通知发布立即返回
+
+    Args:
+        deviceId / openid: 订阅者
+        cursor: 已收到的最后一条通知序号
+        timeout: 长轮询等待秒数（最大30）
+    """
+    hub = _require_hub()
+    device_id = _resolve_device(hub, deviceId, openid)
+
+    if cursor is None:
+        return {
+            "success": True,
+            "data": {
+                "notification": hub.latest(device_id),
+                "notifications": [],
+                "cursor": hub.latest_cursor(),
+                "missed": False
+            }
+        }
+
+    timeout = max(0.0, min(timeout, LONG_POLL_MAX_SECONDS))
+    notifications, missed = await hub.wait(device_id, cursor, timeout)
+    return {
+        "success": True,
+        "data": {
+            "notification": notifications[-1] if notifications else None,
+            "notifications": notifications,
+            "cursor": notifications[-1]["id"] if notifications else cursor,
+            "missed": missed
+        }
+    }
+
+
+@router.get("/miniprogram/notifications/stream")
+async def stream_notifications(
+    request: Request,
+    deviceId: Optional[str] = None,
+    openid: Optional[str] = None,
+    cursor: Optional[int] = None,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """
+    通知推送 (Server-Sent Events)
+
+    每条通知以通知序号作为SSE事件id，断线重连时浏览器自动带上Last-Event-ID补发期间的通知
+
+    Args:
+        deviceId / openid: 订阅者
+        cursor: 起始游标，默认只推送之后发布的通知
+    """
+    hub = _require_hub()
+    device_id = _resolve_device(hub, deviceId, openid)
+    if last_event_id and last_event_id.isdigit():
+        cursor = int(last_event_id)
+    if cursor is None:
+        cursor = hub.latest_cursor()
+
+    async def event_stream():
+        position = cursor
+        yield format_sse("status", {"cursor": position, "connected": True})
+        while not await request.is_disconnected():
+            if not hub.is_bound(device_id):
+                # 设备已解绑，不再推送
+                yield format_sse("status", {"cursor": position, "connected": False})
+                break
+            notifications, missed = await hub.wait(device_id, position, STREAM_HEARTBEAT_SECONDS)
+            if not notifications:
+                # SSE注释行作为心跳，空闲时保持连接
+                yield ": idle\n\n"
+                continue
+            if missed:
+                yield format_sse("missed", {"cursor": position})
+            for notification in notifications:
+                position = notification["id"]
+                yield f"id: {position}\n" + format_sse("notification", notification)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/miniprogram/test-notification")
+async def send_test_notification(request: DeviceRequest):
+    """向指定设备发送一条测试通知"""
+    hub = _require_hub()
+    device_id = _resolve_device(hub, request.deviceId, request.openid)
+    notification = hub.publish({
+        "kind": "test",
+        "type": "测试",
+        "question": "这是一条测试通知",
+        "answer": "通知推送正常"
+    }, device_id)
+    if notification is None:
+        raise HTTPException(status_code=404, detail="设备未绑定，请先绑定")
+    return {
+        "success": True,
+        "message": "测试通知已发送",
+        "data": {"id": notification["id"]}
+    }
+
+
+@router.get("/miniprogram/notifications/stats")
+async def notification_stats():
+    """通知中心统计信息"""
+    return {
+        "success": True,
+        "data": _require_hub().get_stats()
+    }
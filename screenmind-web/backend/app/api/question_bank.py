@@ -0,0 +1,61 @@
+"""
+本地题库API
+"""
+from fastapi import APIRouter, File, UploadFile, HTTPException
+from ..core.logger import api_logger
+
+router = APIRouter()
+
+# 全局变量，将从main.py中设置
+question_bank = None
+
+
+def _require_bank():
+    if not question_bank:
+        raise HTTPException(status_code=503, detail="本地题库未启用")
+    return question_bank
+
+
+@router.get("/question-bank/stats")
+async def get_question_bank_stats():
+    """获取题库统计信息"""
+    return {
+        "success": True,
+        "data": _require_bank().get_stats()
+    }
+
+
+@router.get("/question-bank/lookup")
+async def lookup_question(q: str):
+    """
+    按题目文本查找已知题目
+
+    Args:
+        q: 题目文本
+    """
+    match = _require_bank().lookup(q)
+    return {
+        "success": True,
+        "data": match
+    }
+
+
+@router.post("/question-bank/import")
+async def import_question_bank(file: UploadFile = File(...)):
+    """
+    导入题库文件 (.jsonl/.json/.csv)，字段为
+    question_type、question_content、answer、explanation
+    """
+    bank = _require_bank()
+    content = await file.read()
+    try:
+        imported = bank.import_file(content, file.filename or "")
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"题库文件解析失败: {str(e)}")
+
+    api_logger.info(f"导入题库文件 {file.filename}: {imported} 道题目")
+    return {
+        "success": True,
+        "message": f"成功导入 {imported} 道题目",
+        "data": bank.get_stats()
+    }
@@ -2,19 +2,29 @@
 系统截屏API
 """
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 import subprocess
 import tempfile
 import os
 import base64
 import platform
+import shutil
 import time
+import io
+from typing import Optional
+from PIL import Image
 from ..core.logger import api_logger
+from ..core.responses import FastJSONResponse
+from ..core.capture_registry import CaptureBackend, CaptureRegistry
+from ..core.screen_capture import (
+    BBox, in_process_capture_available, capture_png_in_process, grab_screen, encode_png,
+    list_monitors, get_monitor_bbox, get_active_window_bbox
+)
 
 router = APIRouter()
 
-def take_screenshot_mac():
-    """在Mac系统上截屏"""
+def take_screenshot_mac(bbox: Optional[BBox] = None):
+    """在Mac系统上截屏，bbox为截取区域 (left, top, right, bottom)"""
     try:
         # 创建临时文件
         with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_file:
@@ -23,9 +33,12 @@ def take_screenshot_mac():
         # 使用screencapture命令截屏整个屏幕
         # -x: 不播放截屏声音
         # -t png: 指定输出格式为PNG
-        result = subprocess.run([
-            'screencapture', '-x', '-t', 'png', temp_path
-        ], capture_output=True, text=True, timeout=10)
+        # -R x,y,w,h: 只截取指定区域
+        command = ['screencapture', '-x', '-t', 'png']
+        if bbox:
+            left, top, right, bottom = bbox
+            command.append(f"-R{left},{top},{right - left},{bottom - top}")
+        result = subprocess.run(command + [temp_path], capture_output=True, text=True, timeout=10)
         
         if result.returncode != 0:
             api_logger.error(f"Mac截屏失败: {result.stderr}")
@@ -47,18 +60,23 @@ def take_screenshot_mac():
         api_logger.error(f"Mac截屏异常: {str(e)}")
         raise Exception(f"截屏失败: {str(e)}")
 
-def take_screenshot_windows():
-    """在Windows系统上截屏"""
+def take_screenshot_windows(bbox: Optional[BBox] = None):
+    """在Windows系统上截屏，bbox为截取区域 (left, top, right, bottom)"""
     try:
         # 创建临时文件
         with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_file:
             temp_path = tmp_file.name
         
         # 使用PowerShell截屏
+        if bbox:
+            left, top, right, bottom = bbox
+            bounds_script = f"$bounds = New-Object System.Drawing.Rectangle {left}, {top}, {right - left}, {bottom - top}"
+        else:
+            bounds_script = "$bounds = [System.Windows.Forms.Screen]::PrimaryScreen.Bounds"
         powershell_script = f"""
         Add-Type -AssemblyName System.Windows.Forms
         Add-Type -AssemblyName System.Drawing
-        $bounds = [System.Windows.Forms.Screen]::PrimaryScreen.Bounds
+        {bounds_script}
         $bitmap = New-Object System.Drawing.Bitmap $bounds.Width, $bounds.Height
         $graphics = [System.Drawing.Graphics]::FromImage($bitmap)
         $graphics.CopyFromScreen($bounds.Location, [System.Drawing.Point]::Empty, $bounds.Size)
@@ -91,57 +109,64 @@ def take_screenshot_windows():
         api_logger.error(f"Windows截屏异常: {str(e)}")
         raise Exception(f"截屏失败: {str(e)}")
 
-def take_screenshot_linux():
-    """在Linux系统上截屏"""
+LINUX_TOOLS = ['gnome-screenshot', 'scrot', 'import']
+
+def _linux_tool_command(tool: str, bbox: Optional[BBox], temp_path: str) -> list:
+    """构造Linux截屏工具的命令行"""
+    if tool == 'gnome-screenshot':
+        # gnome-screenshot不支持非交互区域截取，截全屏后裁剪
+        return ['gnome-screenshot', '-f', temp_path]
+    if tool == 'scrot':
+        # -o 覆盖已存在的临时文件，-a x,y,w,h 截取区域
+        command = ['scrot', '-o']
+        if bbox:
+            left, top, right, bottom = bbox
+            command += ['-a', f"{left},{top},{right - left},{bottom - top}"]
+        return command + [temp_path]
+    # import (ImageMagick)
+    command = ['import', '-window', 'root']
+    if bbox:
+        left, top, right, bottom = bbox
+        command += ['-crop', f"{right - left}x{bottom - top}+{left}+{top}"]
+    return command + [temp_path]
+
+def take_screenshot_linux(bbox: Optional[BBox] = None, tools: Optional[list] = None):
+    """
+    在Linux系统上截屏
+
+    Args:
+        bbox: 截取区域 (left, top, right, bottom)
+        tools: 按顺序尝试的截屏工具，None时使用能力注册表探测出的顺序
+    """
+    if tools is None:
+        tools = [b.name for b in capture_registry.ordered_backends() if b.name in LINUX_TOOLS]
+    if not tools:
+        raise Exception("截屏失败: 未找到可用的截屏工具，请安装 gnome-screenshot、scrot 或 ImageMagick")
+
     try:
         # 创建临时文件
         with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_file:
             temp_path = tmp_file.name
-        
-        # 尝试使用gnome-screenshot
-        try:
-            result = subprocess.run([
-                'gnome-screenshot', '-f', temp_path
-            ], capture_output=True, text=True, timeout=10)
-            
-            if result.returncode == 0:
-                with open(temp_path, 'rb') as f:
-                    image_data = f.read()
-                os.unlink(temp_path)
-                return image_data
-        except FileNotFoundError:
-            pass
-        
-        # 尝试使用scrot
-        try:
-            result = subprocess.run([
-                'scrot', temp_path
-            ], capture_output=True, text=True, timeout=10)
-            
-            if result.returncode == 0:
-                with open(temp_path, 'rb') as f:
-                    image_data = f.read()
-                os.unlink(temp_path)
-                return image_data
-        except FileNotFoundError:
-            pass
-        
-        # 尝试使用import (ImageMagick)
+
         try:
-            result = subprocess.run([
-                'import', '-window', 'root', temp_path
-            ], capture_output=True, text=True, timeout=10)
-            
-            if result.returncode == 0:
-                with open(temp_path, 'rb') as f:
-                    image_data = f.read()
+            errors = []
+            for tool in tools:
+                result = subprocess.run(
+                    _linux_tool_command(tool, bbox, temp_path),
+                    capture_output=True, text=True, timeout=10
+                )
+                if result.returncode == 0:
+                    with open(temp_path, 'rb') as f:
+                        image_data = f.read()
+                    if bbox and tool == 'gnome-screenshot':
+                        image_data = encode_png(Image.open(io.BytesIO(image_data)).crop(bbox))
+                    return image_data
+                errors.append(f"{tool}: {result.stderr.strip()}")
+            raise Exception(f"截屏命令执行失败: {'; '.join(errors)}")
+        finally:
+            if os.path.exists(temp_path):
                 os.unlink(temp_path)
-                return image_data
-        except FileNotFoundError:
-            pass
-        
-        raise Exception("未找到可用的截屏工具，请安装 gnome-screenshot、scrot 或 ImageMagick")
-        
+
     except subprocess.TimeoutExpired:
         api_logger.error("Linux截屏超时")
         raise Exception("截屏操作超时")
@@ -149,10 +174,126 @@ def take_screenshot_linux():
         api_logger.error(f"Linux截屏异常: {str(e)}")
         raise Exception(f"截屏失败: {str(e)}")
 
+def _capture_backends() -> list:
+    """当前平台的候选截屏后端（按默认优先级排列）"""
+    backends = [CaptureBackend("in-process", capture_png_in_process, in_process_capture_available)]
+    system = platform.system().lower()
+    if system == 'darwin':  # macOS
+        backends.append(CaptureBackend(
+            "screencapture", take_screenshot_mac, lambda: shutil.which('screencapture') is not None
+        ))
+    elif system == 'windows':
+        backends.append(CaptureBackend(
+            "powershell", take_screenshot_windows, lambda: shutil.which('powershell') is not None
+        ))
+    elif system == 'linux':
+        for tool in LINUX_TOOLS:
+            backends.append(CaptureBackend(
+                tool,
+                lambda bbox, tool=tool: take_screenshot_linux(bbox, tools=[tool]),
+                lambda tool=tool: shutil.which(tool) is not None
+            ))
+    return backends
+
+# 截屏能力注册表，应用启动时探测一次可用性（见main.py），/screenshot/test?refresh=true 时测速
+capture_registry = CaptureRegistry(_capture_backends)
+
+def resolve_capture_bbox(
+    left: Optional[int] = None,
+    top: Optional[int] = None,
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+    monitor: Optional[int] = None,
+    window: Optional[str] = None
+) -> Optional[BBox]:
+    """
+    把截屏选项解析为截取区域
+
+    Args:
+        left/top/width/height: 矩形区域（四个参数都给出时生效）
+        monitor: 显示器编号（从1开始）
+        window: 为 "active" 时截取当前活动窗口
+
+    Returns:
+        截取区域 (left, top, right, bottom)，None表示整个屏幕
+    """
+    try:
+        if window:
+            if window != "active":
+                raise ValueError("window参数只支持 active")
+            return get_active_window_bbox()
+        if monitor is not None:
+            return get_monitor_bbox(monitor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if None not in (left, top, width, height):
+        if width <= 0 or height <= 0:
+            raise HTTPException(status_code=400, detail="截取区域的宽高必须大于0")
+        return (left, top, left + width, top + height)
+    return None
+
+def capture_screen(bbox: Optional[BBox] = None) -> bytes:
+    """
+    截屏并返回PNG字节
+
+    按能力注册表探测出的速度顺序使用截屏后端（通常进程内截屏最快，不产生子进程和临时文件），
+    失败时依次回退；指定区域时先裁剪再编码
+
+    Args:
+        bbox: 截取区域 (left, top, right, bottom)，None表示整个屏幕
+    """
+    system = platform.system().lower()
+    if system not in ('darwin', 'windows', 'linux'):
+        raise HTTPException(
+            status_code=400,
+            detail=f"不支持的操作系统: {system}"
+        )
+
+    errors = []
+    for backend in capture_registry.ordered_backends():
+        try:
+            return backend.capture(bbox)
+        except Exception as e:
+            api_logger.warning(f"截屏后端 {backend.name} 失败: {str(e)}")
+            errors.append(f"{backend.name}: {str(e)}")
+
+    if not errors:
+        raise Exception("未找到可用的截屏工具，请安装 gnome-screenshot、scrot 或 ImageMagick")
+    raise Exception("; ".join(errors))
+
+def capture_screen_image(bbox: Optional[BBox] = None) -> Image.Image:
+    """
+    截屏并直接返回内存中的PIL图片，供截屏+分析一体化接口使用
+
+    Args:
+        bbox: 截取区域 (left, top, right, bottom)，None表示整个屏幕
+    """
+    backends = capture_registry.ordered_backends()
+    if backends and backends[0].name == "in-process":
+        try:
+            return grab_screen(bbox)
+        except Exception as e:
+            api_logger.warning(f"进程内截屏失败，回退到系统截屏工具: {str(e)}")
+
+    return Image.open(io.BytesIO(capture_screen(bbox)))
+
 @router.post("/screenshot")
-async def take_screenshot():
+async def take_screenshot(
+    left: Optional[int] = None,
+    top: Optional[int] = None,
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+    monitor: Optional[int] = None,
+    window: Optional[str] = None
+):
     """
     系统级截屏API
+
+    Args:
+        left/top/width/height: 截取矩形区域（可选）
+        monitor: 截取指定显示器（从1开始，可选）
+        window: 为 "active" 时截取当前活动窗口（可选）
     
     Returns:
         包含base64编码图片数据的JSON响应
@@ -161,22 +302,9 @@ async def take_screenshot():
     api_logger.info("开始系统截屏...")
     
     try:
-        # 检测操作系统
-        system = platform.system().lower()
-        api_logger.info(f"检测到操作系统: {system}")
-        
-        # 根据操作系统选择截屏方法
-        if system == 'darwin':  # macOS
-            image_data = take_screenshot_mac()
-        elif system == 'windows':
-            image_data = take_screenshot_windows()
-        elif system == 'linux':
-            image_data = take_screenshot_linux()
-        else:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"不支持的操作系统: {system}"
-            )
+        # 截屏是阻塞操作，放到线程池中执行，避免阻塞事件循环
+        bbox = await run_in_threadpool(resolve_capture_bbox, left, top, width, height, monitor, window)
+        image_data = await run_in_threadpool(capture_screen, bbox)
         
         # 将图片数据转换为base64
         image_base64 = base64.b64encode(image_data).decode('utf-8')
@@ -186,7 +314,7 @@ async def take_screenshot():
         
         api_logger.info(f"截屏完成，耗时: {duration}秒，图片大小: {len(image_data)} bytes")
         
-        return JSONResponse(content={
+        return FastJSONResponse(content={
             "success": True,
             "message": "截屏成功",
             "data": {
@@ -198,6 +326,8 @@ async def take_screenshot():
             }
         })
         
+    except HTTPException:
+        raise
     except Exception as e:
         api_logger.error(f"截屏失败: {str(e)}")
         raise HTTPException(
@@ -205,57 +335,42 @@ async def take_screenshot():
             detail=f"截屏失败: {str(e)}"
         )
 
+@router.get("/screenshot/monitors")
+async def get_monitors():
+    """列出可截取的显示器"""
+    monitors = await run_in_threadpool(list_monitors)
+    return {
+        "success": True,
+        "data": monitors
+    }
+
 @router.get("/screenshot/test")
-async def test_screenshot_capability():
+async def test_screenshot_capability(refresh: bool = False):
     """
     测试当前系统的截屏能力
-    
+
+    结果来自启动时的可用性探测缓存（不截屏），refresh=true 时重新探测并实际截屏测速
+
     Returns:
         系统截屏能力信息
     """
     system = platform.system().lower()
+    if refresh:
+        status = await run_in_threadpool(capture_registry.refresh)
+    else:
+        if capture_registry.get_status()["probed_at"] is None:
+            await run_in_threadpool(capture_registry.probe)
+        status = capture_registry.get_status()
+
+    tools = status["order"]
     capabilities = {
         "system": system,
-        "supported": False,
-        "tools": [],
-        "message": ""
+        "supported": bool(tools),
+        "tools": tools,
+        "fastest": status["fastest"],
+        "benchmarked": status["benchmarked"],
+        "backends": status["backends"],
+        "probed_at": status["probed_at"],
+        "message": f"找到截屏工具: {', '.join(tools)}" if tools else "未找到可用的截屏工具"
     }
-    
-    try:
-        if system == 'darwin':  # macOS
-            # 检查screencapture命令
-            result = subprocess.run(['which', 'screencapture'], 
-                                  capture_output=True, text=True)
-            if result.returncode == 0:
-                capabilities["supported"] = True
-                capabilities["tools"].append("screencapture")
-                capabilities["message"] = "macOS原生截屏支持"
-            else:
-                capabilities["message"] = "未找到screencapture命令"
-                
-        elif system == 'windows':
-            capabilities["supported"] = True
-            capabilities["tools"].append("powershell")
-            capabilities["message"] = "Windows PowerShell截屏支持"
-            
-        elif system == 'linux':
-            # 检查各种Linux截屏工具
-            tools_to_check = ['gnome-screenshot', 'scrot', 'import']
-            for tool in tools_to_check:
-                result = subprocess.run(['which', tool], 
-                                      capture_output=True, text=True)
-                if result.returncode == 0:
-                    capabilities["tools"].append(tool)
-            
-            if capabilities["tools"]:
-                capabilities["supported"] = True
-                capabilities["message"] = f"找到截屏工具: {', '.join(capabilities['tools'])}"
-            else:
-                capabilities["message"] = "未找到可用的截屏工具"
-        else:
-            capabilities["message"] = f"不支持的操作系统: {system}"
-            
-    except Exception as e:
-        capabilities["message"] = f"检测截屏能力时出错: {str(e)}"
-    
-    return JSONResponse(content=capabilities)
\ No newline at end of file
+    return FastJSONResponse(content=capabilities)
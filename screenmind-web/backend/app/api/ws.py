@@ -0,0 +1,185 @@
+"""
+WebSocket通道
+浏览器扩展保持一条长连接：以二进制帧提交图片，服务端推送分析进度、结果和服务状态，
+省去每次截图的HTTP/multipart开销和健康检查轮询
+
+消息协议（服务端 -> 客户端，均为JSON文本帧）:
+    {"type": "status", "data": {...}}                      连接建立时和服务状态变化时推送
+    {"type": "accepted", "id": 1, "request_id": ...}       收到图片
+    {"type": "progress", "id": 1, "stage": "analyzing"}    分析阶段
+    {"type": "result", "id": 1, "data": {...}}             分析结果（字段同 /analyze 的data）
+    {"type": "error", "id": 1, "message": "..."}           分析失败（或等待中的图片过多，该帧被丢弃）
+    {"type": "pong"}
+
+连接地址可以带 ?deviceId=...（浏览器WebSocket无法设置自定义请求头），用于公平排队和分析历史
+
+客户端 -> 服务端:
+    二进制帧                                                图片字节（PNG/JPEG等）
+    {"type": "analyze", "request_id": "..."}               可选，为下一张图片附带客户端请求ID
+    {"type": "ping"} / {"type": "status"}                  心跳 / 主动获取状态
+"""
+import asyncio
+import json
+import time
+from typing import Optional, Dict, Any
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException
+from starlette.concurrency import run_in_threadpool
+from . import health
+from .analyze import open_image_bytes, run_analysis_pipeline
+from ..core.logger import api_logger
+
+router = APIRouter()
+
+# 每条连接同时分析的图片数
+MAX_IN_FLIGHT_PER_CONNECTION = 2
+
+# 每条连接已接收但未完成的图片数上限（含正在分析的），超出时直接回复错误，不在内存中排队
+MAX_PENDING_PER_CONNECTION = 4
+
+# 服务状态检查间隔（秒），只在状态变化时推送
+STATUS_PUSH_INTERVAL = 2.0
+
+
+def _status_summary() -> Dict[str, Any]:
+    """推送给客户端的精简状态"""
+    status = health.get_service_status()
+    ai_status = status["ai_service"] or {}
+    load = status["load"] or {}
+    return {
+        "api": status["api"],
+        "ai_service": ai_status.get("status"),
+        "provider": ai_status.get("provider"),
+        "degraded": load.get("degraded", False),
+        "in_flight": load.get("in_flight", 0)
+    }
+
+
+class AnalysisChannel:
+    """一条WebSocket连接上的会话状态"""
+
+    def __init__(self, websocket: WebSocket, device_id: Optional[str] = None):
+        self.websocket = websocket
+        self.device_id = device_id
+        self._send_lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(MAX_IN_FLIGHT_PER_CONNECTION)
+        self._next_id = 0
+        self._pending_request_id: Optional[str] = None
+        self._tasks = set()
+        self._last_status: Optional[Dict[str, Any]] = None
+
+    async def send(self, message: Dict[str, Any]):
+        """发送一条JSON消息（多个分析任务共用连接，需要串行发送）"""
+        async with self._send_lock:
+            await self.websocket.send_text(json.dumps(message, ensure_ascii=False))
+
+    async def push_status(self, force: bool = False):
+        """服务状态变化时推送"""
+        summary = _status_summary()
+        if force or summary != self._last_status:
+            self._last_status = summary
+            await self.send({"type": "status", "data": summary})
+
+    async def status_loop(self):
+        """定期检查服务状态，变化时推送（替代客户端轮询健康检查）"""
+        while True:
+            await asyncio.sleep(STATUS_PUSH_INTERVAL)
+            try:
+                await self.push_status()
+            except Exception:
+                return  # 连接已关闭
+
+    async def submit(self, image_data: bytes):
+        """提交一张图片，分析在后台任务中进行，连接可以继续接收下一帧"""
+        self._next_id += 1
+        request_id, self._pending_request_id = self._pending_request_id, None
+        if len(self._tasks) >= MAX_PENDING_PER_CONNECTION:
+            await self._send_error(
+                {"id": self._next_id, "request_id": request_id},
+                f"等待分析的图片过多（上限 {MAX_PENDING_PER_CONNECTION} 张），请等待之前的结果返回后再提交"
+            )
+            return
+        task = asyncio.create_task(self._analyze(self._next_id, request_id, image_data))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _analyze(self, analysis_id: int, request_id: Optional[str], image_data: bytes):
+        ids = {"id": analysis_id, "request_id": request_id}
+        start_time = time.time()
+        try:
+            await self.send({"type": "accepted", **ids, "size": len(image_data)})
+            async with self._slots:
+                pil_image = await run_in_threadpool(open_image_bytes, image_data)
+                await self.send({"type": "progress", **ids, "stage": "analyzing"})
+                analysis_data = await run_analysis_pipeline(pil_image, image_data, device_id=self.device_id)
+            await self.send({
+                "type": "result",
+                **ids,
+                "data": {
+                    **analysis_data,
+                    "analysis_time": round(time.time() - start_time, 2),
+                    "image_size": len(image_data)
+                }
+            })
+        except HTTPException as e:
+            await self._send_error(ids, e.detail)
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            api_logger.error(f"WebSocket分析异常: {str(e)}", exc_info=True)
+            await self._send_error(ids, f"分析失败: {str(e)}")
+
+    async def _send_error(self, ids: Dict[str, Any], message: str):
+        try:
+            await self.send({"type": "error", **ids, "message": message})
+        except Exception:
+            pass  # 连接已关闭
+
+    async def handle_text(self, text: str):
+        """处理客户端的文本控制消息"""
+        try:
+            message = json.loads(text)
+        except ValueError:
+            message = None
+        if not isinstance(message, dict):
+            await self.send({"type": "error", "id": None, "message": "无效的JSON消息"})
+            return
+
+        message_type = message.get("type")
+        if message_type == "ping":
+            await self.send({"type": "pong"})
+        elif message_type == "status":
+            await self.push_status(force=True)
+        elif message_type == "analyze":
+            self._pending_request_id = message.get("request_id")
+        else:
+            await self.send({"type": "error", "id": None, "message": f"未知消息类型: {message_type}"})
+
+    def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+
+
+@router.websocket("/ws")
+async def analysis_websocket(websocket: WebSocket, deviceId: Optional[str] = None):
+    """图片分析WebSocket通道"""
+    await websocket.accept()
+    channel = AnalysisChannel(websocket, deviceId)
+    api_logger.info("WebSocket客户端已连接")
+    await channel.push_status(force=True)
+    status_task = asyncio.create_task(channel.status_loop())
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes") is not None:
+                await channel.submit(message["bytes"])
+            elif message.get("text") is not None:
+                await channel.handle_text(message["text"])
+    except WebSocketDisconnect:
+        pass
+    finally:
+        status_task.cancel()
+        channel.close()
+        api_logger.info("WebSocket客户端已断开")
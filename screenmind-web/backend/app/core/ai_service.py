@@ -2,16 +2,39 @@
 AI服务集成模块 - Web版本
 基于原有的AI服务模块适配
 """
-import google.generativeai as genai
-import openai
-import requests
 import json
 import os
-from typing import Optional, Dict, Any
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
 import base64
 import io
 from PIL import Image
 from .logger import ai_logger
+from . import ocr
+from .structured_output import get_response_format, get_generation_config, parse_structured_response
+from .connection_warmer import create_http_client, ping_client
+from .cassette import REPLAY
+
+def _import_genai():
+    """按需导入Gemini SDK（导入耗时较长，只有使用Gemini时才加载）"""
+    import google.generativeai as genai
+    return genai
+
+
+def _import_openai():
+    """按需导入OpenAI SDK（Qwen、OpenAI和本地模拟服务共用）"""
+    import openai
+    return openai
+
+
+# 使用OpenAI兼容接口的提供商
+OPENAI_COMPATIBLE_PROVIDERS = ("qwen", "openai", "mock")
+
+# 本地模拟服务（python -m app.mock_server）不校验密钥，未配置时使用这个占位密钥
+MOCK_PLACEHOLDER_KEY = "mock-local-key"
+
 
 class WebConfig:
     """Web版本的简化配置类"""
@@ -22,12 +45,30 @@ class WebConfig:
             "gemini": {
                 "name": "Google Gemini",
                 "models": ["gemini-1.5-flash", "gemini-1.5-pro"],
+                "degraded_model": "gemini-1.5-flash",
+                "structured_output": "response_schema",
+                "text_model": "gemini-1.5-flash",
+                "currency": "USD",
+                "pricing": {
+                    "gemini-1.5-flash": [0.075, 0.30],
+                    "gemini-1.5-pro": [1.25, 5.00]
+                },
                 "api_key_env": "GEMINI_API_KEY",
                 "requires_base_url": False
             },
             "qwen": {
                 "name": "Qwen (通义千问)",
                 "models": ["qwen-vl-plus", "qwen-vl-max"],
+                # qwen-vl-plus已是目录中最便宜的视觉模型：默认配置下降级只降低detail、max_tokens和分辨率，不换模型
+                "degraded_model": "qwen-vl-plus",
+                "structured_output": "json_object",
+                "text_model": "qwen-turbo",
+                "currency": "CNY",
+                "pricing": {
+                    "qwen-vl-plus": [1.5, 4.5],
+                    "qwen-vl-max": [3.0, 9.0],
+                    "qwen-turbo": [0.3, 0.6]
+                },
                 "api_key_env": "QWEN_API_KEY",
                 "requires_base_url": True,
                 "base_url": "https://dashscope.aliyuncs.com/compatible-mode/v1"
@@ -35,11 +76,49 @@ class WebConfig:
             "openai": {
                 "name": "OpenAI GPT",
                 "models": ["gpt-4o", "gpt-4o-mini"],
+                "degraded_model": "gpt-4o-mini",
+                "structured_output": "json_schema",
+                "text_model": "gpt-4o-mini",
+                "currency": "USD",
+                "pricing": {
+                    "gpt-4o": [2.50, 10.00],
+                    "gpt-4o-mini": [0.15, 0.60]
+                },
                 "api_key_env": "OPENAI_API_KEY",
                 "requires_base_url": False
+            },
+            "mock": {
+                "name": "本地模拟 (离线压测)",
+                "models": ["mock-vl", "mock-vl-fast"],
+                "degraded_model": "mock-vl-fast",
+                "structured_output": "json_object",
+                "text_model": "mock-vl-fast",
+                "currency": "USD",
+                "pricing": {},
+                "api_key_env": "MOCK_API_KEY",
+                "requires_base_url": True,
+                "base_url": os.getenv("MOCK_BASE_URL", "http://127.0.0.1:8001/v1")
             }
         }
 
+    @staticmethod
+    def estimate_cost(provider: str, model: str, usage: Optional[Dict[str, int]]) -> Tuple[float, str]:
+        """
+        按目录中的参考价格估算一次调用的费用
+
+        价格为每百万token的 [输入, 输出] 价格，币种见提供商的 currency；未列出价格的模型按0计
+
+        Returns:
+            (费用, 币种)
+        """
+        provider_config = WebConfig.get_available_models().get(provider, {})
+        currency = provider_config.get("currency", "USD")
+        price = provider_config.get("pricing", {}).get(model)
+        if not usage or not price:
+            return 0.0, currency
+        cost = usage.get("prompt_tokens", 0) * price[0] + usage.get("completion_tokens", 0) * price[1]
+        return cost / 1_000_000, currency
+
     @staticmethod
     def get_ai_prompt():
         """获取AI提示词"""
@@ -58,75 +137,272 @@ Please respond in Chinese with the following format:
 解析：[brief explanation]
 
 If the image is unclear or not a question, please indicate that it cannot be recognized.
+"""
+
+    @staticmethod
+    def get_json_prompt():
+        """获取结构化输出模式的AI提示词"""
+        return """
+Please carefully analyze the question in this image: identify the question type and content,
+analyze the requirements, provide the correct answer and a brief explanation.
+
+Respond with a single JSON object only, no markdown and no extra text, using Chinese for the values:
+{"question_type": "选择题|填空题|判断题|其他|无法识别", "question_content": "...", "answer": "...", "explanation": "..."}
+
+If the image is unclear or not a question, set "question_type" to "无法识别" and explain why in "explanation".
+"""
+
+    @staticmethod
+    def get_text_prompt(question_text: str, structured: bool = False) -> str:
+        """获取纯文本模式（OCR识别出题目文字后）的AI提示词"""
+        if structured:
+            instructions = WebConfig.get_json_prompt().replace("in this image", "below")
+        else:
+            instructions = WebConfig.get_ai_prompt().replace("in this image", "below").replace(
+                "If the image is unclear", "If the text is unclear"
+            )
+        return f"""{instructions}
+The question text was extracted by OCR from a screenshot and may contain minor recognition errors:
+<<<
+{question_text}
+>>>
 """
 
 class AIService:
     """AI服务类 - Web版本"""
 
-    def __init__(self, provider: str = "qwen", model: str = "qwen-vl-plus"):
-        self.current_provider = provider
-        self.current_model = model
-        self.client = None
+    def __init__(
+        self,
+        provider: str = "qwen",
+        model: str = "qwen-vl-plus",
+        api_keys: Optional[Dict[str, str]] = None,
+        lazy: bool = False
+    ):
+        """
+        Args:
+            provider: 提供商
+            model: 模型名
+            api_keys: 共享配置中的API密钥，优先于环境变量
+            lazy: 是否推迟到首次使用（或启动钩子中调用ensure_initialized）时再创建客户端
+        """
         self.config = WebConfig()
-        self._initialize_model()
+        # 共享配置存储中的API密钥，优先于环境变量
+        self.api_keys = dict(api_keys or {})
+        self._swap_lock = threading.Lock()
+        # (提供商, 模型, 客户端) 作为一个整体替换，请求只读取一次，切换模型时不会读到不一致的组合
+        self._state = (provider, model, None)
+        self._initialized = False
+        # 新客户端替换上线前的预热回调 (provider, client)，由main.py设置
+        self.client_warmer = None
+        # 最近一次模型请求的时间（time.monotonic），用于判断连接是否空闲
+        self.last_request_at = 0.0
+        # 每次实际调用提供商后的回调 (provider, success, latency)，由main.py设置，用于健康统计
+        self.call_observer = None
+        # 各线程最近一次调用的token用量（请求在线程池中执行，按线程区分互不干扰）
+        self._usage = threading.local()
+        # 提供商调用录制/回放 (ProviderCassette)，由main.py设置，None表示直接调用
+        self.cassette = None
+        if not lazy:
+            self.ensure_initialized()
+
+    @property
+    def current_provider(self) -> str:
+        return self._state[0]
+
+    @property
+    def current_model(self) -> str:
+        return self._state[1]
+
+    @property
+    def client(self):
+        return self._state[2]
+
+    @client.setter
+    def client(self, client):
+        provider, model, _ = self._state
+        self._state = (provider, model, client)
+        self._initialized = True
+
+    @property
+    def initialized(self) -> bool:
+        """客户端是否已经（尝试）创建"""
+        return self._initialized
+
+    def get_last_usage(self) -> Optional[Dict[str, int]]:
+        """当前线程最近一次 analyze_image/analyze_text 的token用量，提供商未返回用量时为None"""
+        return getattr(self._usage, "value", None)
+
+    def get_last_model(self) -> Optional[str]:
+        """当前线程最近一次 analyze_image/analyze_text 实际使用的模型"""
+        return getattr(self._usage, "model", None)
+
+    def _record_usage(self, response):
+        """从OpenAI兼容或Gemini的响应中读取token用量"""
+        metadata = getattr(response, "usage_metadata", None)
+        if metadata is not None:
+            self._usage.value = {
+                "prompt_tokens": getattr(metadata, "prompt_token_count", 0) or 0,
+                "completion_tokens": getattr(metadata, "candidates_token_count", 0) or 0
+            }
+            return
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            self._usage.value = {
+                "prompt_tokens": usage.prompt_tokens or 0,
+                "completion_tokens": usage.completion_tokens or 0
+            }
+
+    @property
+    def replaying(self) -> bool:
+        """是否处于录制回放模式（回答全部来自录制文件，不访问提供商）"""
+        return self.cassette is not None and self.cassette.mode == REPLAY
 
-    def _initialize_model(self):
-        """根据当前配置初始化模型"""
+    def _needs_client(self) -> bool:
+        """回放模式下不访问提供商，没有API密钥也可以分析"""
+        return not self.replaying
+
+    def _call_provider(self, request: Dict[str, Any], invoke) -> str:
+        """
+        经录制层调用提供商（未启用录制时直接调用）
+
+        Args:
+            request: 决定回答的全部请求字段，用于计算录制指纹
+            invoke: 实际调用提供商并返回回答文本（同时记录token用量）
+        """
+        if self.cassette is None:
+            return invoke()
+
+        def recorded():
+            return invoke(), self.get_last_usage()
+
+        text, usage = self.cassette.call(request, recorded)
+        self._usage.value = usage
+        return text
+
+    def get_active_client(self) -> Tuple[str, Any]:
+        """原子地读取当前 (提供商, 客户端)"""
+        provider, _, client = self._state
+        return provider, client
+
+    def ensure_initialized(self):
+        """根据当前配置创建客户端（只在首次调用时创建，之后直接返回）"""
+        if self._initialized:
+            return
+        with self._swap_lock:
+            if self._initialized:
+                return
+            provider, model, _ = self._state
+            self._state = (provider, model, self._build_client(provider, model, self._get_api_key(provider)))
+            self._initialized = True
+
+    def _build_client(self, provider: str, model: str, api_key: str):
+        """
+        创建指定提供商的客户端（不影响当前正在使用的客户端）
+
+        Returns:
+            客户端实例，缺少密钥或初始化失败时返回None
+        """
         try:
-            api_key = self._get_api_key()
-            print(f"尝试初始化模型: {self.current_provider}:{self.current_model}")
+            print(f"尝试初始化模型: {provider}:{model}")
 
             if not api_key:
-                print(f"警告: 未设置 {self.current_provider} 的API密钥")
-                return
+                print(f"警告: 未设置 {provider} 的API密钥")
+                return None
 
             # 隐藏API密钥的敏感部分
             masked_key = api_key[:8] + "..." + api_key[-4:] if len(api_key) > 12 else "***"
             print(f"使用API密钥: {masked_key}")
 
-            if self.current_provider == "gemini":
-                self._initialize_gemini(api_key)
-            elif self.current_provider == "qwen":
-                self._initialize_qwen(api_key)
-            elif self.current_provider == "openai":
-                self._initialize_openai(api_key)
+            if provider == "gemini":
+                client = self._initialize_gemini(api_key, model)
+            elif provider == "qwen":
+                client = self._initialize_qwen(api_key)
+            elif provider == "openai":
+                client = self._initialize_openai(api_key)
+            elif provider == "mock":
+                client = self._initialize_mock(api_key)
             else:
-                print(f"不支持的AI提供商: {self.current_provider}")
-                return
+                print(f"不支持的AI提供商: {provider}")
+                return None
 
-            print(f"{self.current_provider}:{self.current_model} 初始化成功")
+            print(f"{provider}:{model} 初始化成功")
+            if self.client_warmer:
+                self.client_warmer(provider, client)
+            return client
 
         except Exception as e:
             print(f"模型初始化失败: {e}")
-            self.client = None
+            return None
+
+    def _get_api_key(self, provider: Optional[str] = None, api_keys: Optional[Dict[str, str]] = None) -> str:
+        """获取指定（默认当前）提供商的API密钥，共享配置中的密钥优先于环境变量"""
+        provider = provider or self.current_provider
+        api_keys = self.api_keys if api_keys is None else api_keys
+        if api_keys.get(provider):
+            return api_keys[provider]
 
-    def _get_api_key(self) -> str:
-        """获取当前模型的API密钥"""
         env_key = {
             "gemini": "GEMINI_API_KEY",
             "qwen": "QWEN_API_KEY",
-            "openai": "OPENAI_API_KEY"
-        }.get(self.current_provider, "")
+            "openai": "OPENAI_API_KEY",
+            "mock": "MOCK_API_KEY"
+        }.get(provider, "")
 
+        if provider == "mock":
+            return os.getenv(env_key) or MOCK_PLACEHOLDER_KEY
         return os.getenv(env_key, "")
 
-    def _initialize_gemini(self, api_key: str):
+    def _initialize_gemini(self, api_key: str, model: str):
         """初始化Gemini模型"""
+        genai = _import_genai()
         genai.configure(api_key=api_key)
-        self.client = genai.GenerativeModel(self.current_model)
+        return genai.GenerativeModel(model)
 
     def _initialize_qwen(self, api_key: str):
         """初始化Qwen模型"""
         available_models = self.config.get_available_models()
         model_config = available_models["qwen"]
-        self.client = openai.OpenAI(
+        return _import_openai().OpenAI(
             api_key=api_key,
-            base_url=model_config.get("base_url")
+            base_url=model_config.get("base_url"),
+            http_client=create_http_client()
         )
 
     def _initialize_openai(self, api_key: str):
         """初始化OpenAI模型"""
-        self.client = openai.OpenAI(api_key=api_key)
+        return _import_openai().OpenAI(api_key=api_key, http_client=create_http_client())
+
+    def _initialize_mock(self, api_key: str):
+        """初始化本地模拟服务客户端（不重试，压测时错误率与模拟服务的配置一致）"""
+        model_config = self.config.get_available_models()["mock"]
+        return _import_openai().OpenAI(
+            api_key=api_key,
+            base_url=model_config.get("base_url"),
+            max_retries=0,
+            http_client=create_http_client()
+        )
+
+    def apply_config(self, provider: str, model: str, api_keys: Optional[Dict[str, str]] = None) -> bool:
+        """
+        应用新的模型配置：先在旁路创建好新客户端，再一次性替换
+
+        替换前已经开始的请求继续使用旧客户端完成，之后的请求直接使用新客户端
+
+        Args:
+            provider: 提供商
+            model: 模型名
+            api_keys: 共享配置中的API密钥，None表示沿用当前密钥
+
+        Returns:
+            新客户端是否可用
+        """
+        with self._swap_lock:
+            keys = dict(api_keys) if api_keys is not None else self.api_keys
+            client = self._build_client(provider, model, self._get_api_key(provider, keys))
+            self.api_keys = keys
+            self._state = (provider, model, client)
+            self._initialized = True
+        return client is not None
 
     def set_model(self, provider: str, model: str, api_key: str = None):
         """设置模型并重新初始化"""
@@ -138,63 +414,200 @@ class AIService:
         if model not in available_models[provider]["models"]:
             return False
 
-        self.current_provider = provider
-        self.current_model = model
-
-        # 更新环境变量中的API密钥
+        api_keys = dict(self.api_keys)
         if api_key:
-            env_key = available_models[provider]["api_key_env"]
-            os.environ[env_key] = api_key
+            api_keys[provider] = api_key
 
-        self._initialize_model()
+        self.apply_config(provider, model, api_keys)
         return True
 
-    def analyze_image(self, image_base64: str) -> Optional[str]:
+    def analyze_image(
+        self,
+        image_base64: str,
+        model: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+        detail: Optional[str] = None,
+        structured: bool = False
+    ) -> Optional[str]:
         """
         分析图片并返回AI回答
 
         Args:
             image_base64: base64编码的图片数据
+            model: 覆盖本次请求使用的模型（同一提供商内，用于降级）
+            max_tokens: 覆盖本次请求的最大输出token数
+            detail: 图片detail级别 (low/high/auto)，仅OpenAI兼容接口使用
+            structured: 是否要求模型返回结构化JSON
 
         Returns:
             AI分析结果文本，失败返回None
         """
-        if not self.client:
-            error_msg = f"错误: AI模型未初始化，请检查API密钥设置 (当前提供商: {self.current_provider})"
+        # 只读取一次当前配置，切换模型不会影响进行中的请求
+        self.ensure_initialized()
+        self.last_request_at = time.monotonic()
+        self._usage.value = None
+        provider, current_model, client = self._state
+        if not client and self._needs_client():
+            error_msg = f"错误: AI模型未初始化，请检查API密钥设置 (当前提供商: {provider})"
             print(error_msg)
             return error_msg
 
+        start = time.perf_counter()
         try:
-            prompt = self.config.get_ai_prompt()
-            print(f"开始分析图片，使用模型: {self.current_provider}:{self.current_model}")
-
-            if self.current_provider == "gemini":
-                return self._analyze_with_gemini(image_base64, prompt)
-            elif self.current_provider in ["qwen", "openai"]:
-                return self._analyze_with_openai_compatible(image_base64, prompt)
+            prompt = self.config.get_json_prompt() if structured else self.config.get_ai_prompt()
+            response_format = json_config = None
+            if structured:
+                provider_config = self.config.get_available_models().get(provider, {})
+                response_format = get_response_format(provider_config.get("structured_output"))
+                json_config = get_generation_config(provider_config.get("structured_output"))
+            model = model or current_model
+            self._usage.model = model
+            max_tokens = max_tokens or 1000
+            print(f"开始分析图片，使用模型: {provider}:{model}")
+
+            if provider == "gemini":
+                if client is not None and model != current_model:
+                    client = _import_genai().GenerativeModel(model)
+                text = self._analyze_with_gemini(client, image_base64, prompt, max_tokens, model, json_config)
+            elif provider in OPENAI_COMPATIBLE_PROVIDERS:
+                text = self._analyze_with_openai_compatible(
+                    client, image_base64, prompt, model, max_tokens, detail or "auto", response_format
+                )
             else:
-                error_msg = f"错误: 不支持的AI提供商: {self.current_provider}"
+                error_msg = f"错误: 不支持的AI提供商: {provider}"
                 print(error_msg)
                 return error_msg
 
         except Exception as e:
-            error_msg = self._handle_error(e)
-            print(f"AI分析异常: {error_msg}")
-            return error_msg
+            text = self._handle_error(e)
+            print(f"AI分析异常: {text}")
+
+        self._observe_call(provider, text, time.perf_counter() - start)
+        return text
+
+    def analyze_text(
+        self,
+        question_text: str,
+        max_tokens: Optional[int] = None,
+        structured: bool = False
+    ) -> Optional[str]:
+        """
+        使用更便宜的纯文本模型分析OCR识别出的题目文字
 
-    def _analyze_with_gemini(self, image_base64: str, prompt: str) -> str:
-        """使用Gemini分析图片"""
-        image_data = base64.b64decode(image_base64)
-        image = Image.open(io.BytesIO(image_data))
+        Args:
+            question_text: 题目文字
+            max_tokens: 最大输出token数
+            structured: 是否要求模型返回结构化JSON
 
-        response = self.client.generate_content([prompt, image])
+        Returns:
+            AI分析结果文本，失败返回以"错误:"开头的消息
+        """
+        self.ensure_initialized()
+        self.last_request_at = time.monotonic()
+        self._usage.value = None
+        provider, current_model, client = self._state
+        if not client and self._needs_client():
+            return f"错误: AI模型未初始化，请检查API密钥设置 (当前提供商: {provider})"
+
+        start = time.perf_counter()
+        try:
+            provider_config = self.config.get_available_models().get(provider, {})
+            model = provider_config.get("text_model", current_model)
+            self._usage.model = model
+            prompt = self.config.get_text_prompt(question_text, structured)
+            max_tokens = max_tokens or 1000
+            print(f"开始分析题目文字，使用模型: {provider}:{model}")
+
+            if provider == "gemini":
+                json_config = get_generation_config(provider_config.get("structured_output")) if structured else None
+
+                def invoke():
+                    response = _import_genai().GenerativeModel(model).generate_content(
+                        prompt,
+                        generation_config={"max_output_tokens": max_tokens, **(json_config or {})}
+                    )
+                    self._record_usage(response)
+                    return response.text if response else None
+
+                request = {"kind": "text", "model": model, "prompt": prompt, "max_tokens": max_tokens}
+                if json_config:
+                    request["response_format"] = json_config
+                text = self._call_provider(request, invoke)
+            elif provider in OPENAI_COMPATIBLE_PROVIDERS:
+                response_format = get_response_format(provider_config.get("structured_output")) if structured else None
+                extra_args = {"response_format": response_format} if response_format else {}
+
+                def invoke():
+                    response = client.chat.completions.create(
+                        model=model,
+                        messages=[{"role": "user", "content": prompt}],
+                        max_tokens=max_tokens,
+                        **extra_args
+                    )
+                    self._record_usage(response)
+                    return response.choices[0].message.content if response.choices else None
+
+                text = self._call_provider(
+                    {"kind": "text", "model": model, "prompt": prompt, "max_tokens": max_tokens,
+                     "response_format": response_format},
+                    invoke
+                )
+            else:
+                return f"错误: 不支持的AI提供商: {provider}"
 
-        if response and response.text:
-            return response.text.strip()
-        else:
-            return "错误: AI未返回有效响应"
+            text = text.strip() if text else "错误: AI未返回有效响应"
 
-    def _analyze_with_openai_compatible(self, image_base64: str, prompt: str) -> str:
+        except Exception as e:
+            text = self._handle_error(e)
+            print(f"AI文本分析异常: {text}")
+
+        self._observe_call(provider, text, time.perf_counter() - start)
+        return text
+
+    def _observe_call(self, provider: str, text: Optional[str], latency: float):
+        """把一次实际的提供商调用结果汇报给观察者（健康统计）"""
+        if self.call_observer:
+            self.call_observer(provider, bool(text) and not text.startswith("错误:"), latency)
+
+    def _analyze_with_gemini(
+        self,
+        client,
+        image_base64: str,
+        prompt: str,
+        max_tokens: int,
+        model: Optional[str] = None,
+        json_config: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """使用Gemini分析图片（json_config为原生JSON输出参数，合并进generation_config）"""
+        def invoke():
+            image = Image.open(io.BytesIO(base64.b64decode(image_base64)))
+            response = client.generate_content(
+                [prompt, image],
+                generation_config={"max_output_tokens": max_tokens, **(json_config or {})}
+            )
+            self._record_usage(response)
+
+            if response and response.text:
+                return response.text.strip()
+            else:
+                return "错误: AI未返回有效响应"
+
+        request = {"kind": "image", "model": model or self.current_model, "prompt": prompt,
+                   "image": image_base64, "max_tokens": max_tokens}
+        if json_config:
+            request["response_format"] = json_config
+        return self._call_provider(request, invoke)
+
+    def _analyze_with_openai_compatible(
+        self,
+        client,
+        image_base64: str,
+        prompt: str,
+        model: str,
+        max_tokens: int,
+        detail: str = "auto",
+        response_format: Optional[Dict[str, Any]] = None
+    ) -> str:
         """使用OpenAI兼容API分析图片"""
         messages = [
             {
@@ -207,23 +620,35 @@ class AIService:
                     {
                         "type": "image_url",
                         "image_url": {
-                            "url": f"data:image/png;base64,{image_base64}"
+                            "url": f"data:image/png;base64,{image_base64}",
+                            "detail": detail
                         }
                     }
                 ]
             }
         ]
 
-        response = self.client.chat.completions.create(
-            model=self.current_model,
-            messages=messages,
-            max_tokens=1000
-        )
+        extra_args = {"response_format": response_format} if response_format else {}
 
-        if response.choices and response.choices[0].message.content:
-            return response.choices[0].message.content.strip()
-        else:
-            return "错误: AI未返回有效响应"
+        def invoke():
+            response = client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                **extra_args
+            )
+            self._record_usage(response)
+
+            if response.choices and response.choices[0].message.content:
+                return response.choices[0].message.content.strip()
+            else:
+                return "错误: AI未返回有效响应"
+
+        return self._call_provider(
+            {"kind": "image", "model": model, "prompt": prompt, "image": image_base64,
+             "max_tokens": max_tokens, "detail": detail, "response_format": response_format},
+            invoke
+        )
 
     def _handle_error(self, error: Exception) -> str:
         """处理错误信息"""
@@ -239,47 +664,19 @@ class AIService:
 
     def test_connection(self) -> bool:
         """
-        测试AI服务连接
+        测试AI服务连接（发送不消耗token的轻量请求）
 
         Returns:
             bool: 连接是否正常
         """
-        if not self.client:
+        self.ensure_initialized()
+        provider, client = self.get_active_client()
+        if not client:
             return False
 
         try:
-            # 创建一个小的测试图片
-            test_image = Image.new('RGB', (100, 100), color='white')
-            buffer = io.BytesIO()
-            test_image.save(buffer, format='PNG')
-            test_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-
-            # 测试API调用
-            test_prompt = "请简单描述这张图片"
-
-            if self.current_provider == "gemini":
-                response = self.client.generate_content([test_prompt, test_image])
-                return response and response.text is not None
-            else:
-                messages = [
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": test_prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {"url": f"data:image/png;base64,{test_base64}"}
-                            }
-                        ]
-                    }
-                ]
-                response = self.client.chat.completions.create(
-                    model=self.current_model,
-                    messages=messages,
-                    max_tokens=100
-                )
-                return response.choices and response.choices[0].message.content
-
+            ping_client(provider, client)
+            return True
         except Exception as e:
             print(f"AI服务连接测试失败: {e}")
             return False
@@ -297,15 +694,51 @@ class AIService:
 class QuestionAnalyzer:
     """题目分析器 - Web版本"""
 
-    def __init__(self, ai_service: AIService):
+    # 按题目文字精确缓存的结果条数
+    RESULT_CACHE_SIZE = 256
+
+    def __init__(
+        self,
+        ai_service: AIService,
+        structured_output: bool = False,
+        ocr_text_first: bool = False,
+        ocr_min_confidence: float = 80.0,
+        ocr_min_chars: int = 8,
+        question_bank=None
+    ):
+        """
+        Args:
+            ai_service: AI服务实例
+            structured_output: 是否使用结构化JSON输出模式（失败时回退到文本解析）
+            ocr_text_first: 是否先做本地OCR，高置信度时改用纯文本模型
+            ocr_min_confidence: 走纯文本路径所需的OCR平均置信度 (0-100)
+            ocr_min_chars: 走纯文本路径所需的最少识别字符数
+            question_bank: 本地题库 (QuestionBank)，命中时直接返回已知答案
+        """
         self.ai_service = ai_service
-
-    def analyze_question_image(self, image_base64: str) -> Dict[str, Any]:
+        self.structured_output = structured_output
+        self.ocr_text_first = ocr_text_first
+        self.ocr_min_confidence = ocr_min_confidence
+        self.ocr_min_chars = ocr_min_chars
+        self.question_bank = question_bank
+        self._result_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def analyze_question_image(
+        self,
+        image_base64: str,
+        model: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+        detail: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         分析题目图片
 
         Args:
             image_base64: base64编码的图片
+            model: 覆盖本次请求使用的模型
+            max_tokens: 覆盖本次请求的最大输出token数
+            detail: 图片detail级别 (low/high/auto)
 
         Returns:
             分析结果字典，包含题目类型、内容、答案等
@@ -317,13 +750,60 @@ class QuestionAnalyzer:
             'answer': '',
             'explanation': '',
             'raw_response': '',
-            'error': None
+            'error': None,
+            'pipeline': 'vision',
+            'question_key': None,
+            'ocr_confidence': None,
+            'model_used': None
         }
 
         try:
-            # 调用AI分析
-            print(f"QuestionAnalyzer开始调用AI服务...")
-            ai_response = self.ai_service.analyze_image(image_base64)
+            # 可选的本地OCR阶段：高置信度时走纯文本模型，并得到精确的题目缓存键
+            ai_response = None
+            question_text, ocr_confident = self._ocr_question_text(image_base64, result)
+            if result['question_key']:
+                cached = self._get_cached_result(result['question_key'])
+                if cached:
+                    result.update(cached)
+                    result['pipeline'] = 'cache'
+                    result['success'] = True
+                    print("命中题目文字缓存，跳过AI调用")
+                    return result
+
+            # 本地题库模糊匹配（与纯文本路径相同的置信度门槛，低置信度的识别结果可能误命中）
+            if question_text and ocr_confident and self.question_bank:
+                known = self.question_bank.lookup(question_text)
+                if known:
+                    result.update({field: known[field] for field in
+                                   ('question_type', 'question_content', 'answer', 'explanation')})
+                    result['pipeline'] = 'question_bank'
+                    result['success'] = True
+                    print(f"命中本地题库，相似度 {known['similarity']}，跳过AI调用")
+                    return result
+
+            if question_text and ocr_confident:
+                print("OCR置信度足够，使用纯文本模型分析...")
+                ai_response = self.ai_service.analyze_text(
+                    question_text,
+                    max_tokens=max_tokens,
+                    structured=self.structured_output
+                )
+                if ai_response and not ai_response.startswith("错误:"):
+                    result['pipeline'] = 'ocr_text'
+                else:
+                    print(f"纯文本分析失败，回退到视觉模型: {ai_response}")
+                    ai_response = None
+
+            if ai_response is None:
+                # 调用AI分析
+                print(f"QuestionAnalyzer开始调用AI服务...")
+                ai_response = self.ai_service.analyze_image(
+                    image_base64,
+                    model=model,
+                    max_tokens=max_tokens,
+                    detail=detail,
+                    structured=self.structured_output
+                )
 
             if not ai_response:
                 result['error'] = "AI未返回响应"
@@ -337,19 +817,76 @@ class QuestionAnalyzer:
                 return result
 
             result['raw_response'] = ai_response
+            result['model_used'] = self.ai_service.get_last_model()
             print(f"AI服务响应成功，长度: {len(ai_response)} 字符")
 
-            # 解析AI响应
-            parsed_result = self._parse_ai_response(ai_response)
+            # 解析AI响应：结构化模式优先走JSON解析，失败再回退到文本解析
+            parsed_result = None
+            if self.structured_output:
+                parsed_result = parse_structured_response(ai_response)
+                if parsed_result is None:
+                    print("结构化响应解析失败，回退到文本解析")
+            if parsed_result is None:
+                parsed_result = self._parse_ai_response(ai_response)
             result.update(parsed_result)
             result['success'] = True
 
+            if result['question_key']:
+                self._put_cached_result(result['question_key'], parsed_result)
+            if self.question_bank:
+                self.question_bank.add(parsed_result)
+
         except Exception as e:
             result['error'] = f"分析失败: {str(e)}"
             print(f"QuestionAnalyzer异常: {str(e)}")
 
         return result
 
+    def _ocr_question_text(self, image_base64: str, result: Dict[str, Any]) -> Tuple[Optional[str], bool]:
+        """
+        运行本地OCR，记录题目缓存键和置信度
+
+        Returns:
+            (识别出的题目文字, 置信度是否足够走纯文本模型)
+        """
+        if not self.ocr_text_first or not ocr.is_available():
+            return None, False
+
+        try:
+            ocr_result = ocr.extract_text(base64.b64decode(image_base64))
+        except Exception as e:
+            print(f"OCR识别失败，使用视觉模型: {e}")
+            return None, False
+
+        text = ocr_result['text'].strip() if ocr_result else ''
+        if not text:
+            return None, False
+
+        result['ocr_confidence'] = round(ocr_result['confidence'], 1)
+        print(f"OCR识别完成: {ocr_result['words']} 个词, 平均置信度 {result['ocr_confidence']}")
+
+        confident = ocr_result['confidence'] >= self.ocr_min_confidence and len(text) >= self.ocr_min_chars
+        # 只有置信度足够时才按文字精确缓存：低置信度的识别结果可能是乱码，不同图片会得到相同的键
+        if confident:
+            result['question_key'] = ocr.question_key(text)
+        return text, confident
+
+    def _get_cached_result(self, key: str) -> Optional[Dict[str, str]]:
+        """读取题目文字缓存"""
+        with self._cache_lock:
+            cached = self._result_cache.get(key)
+            if cached is not None:
+                self._result_cache.move_to_end(key)
+            return dict(cached) if cached else None
+
+    def _put_cached_result(self, key: str, parsed: Dict[str, str]):
+        """写入题目文字缓存（LRU淘汰）"""
+        with self._cache_lock:
+            self._result_cache[key] = dict(parsed)
+            self._result_cache.move_to_end(key)
+            while len(self._result_cache) > self.RESULT_CACHE_SIZE:
+                self._result_cache.popitem(last=False)
+
     def _parse_ai_response(self, response: str) -> Dict[str, str]:
         """
         解析AI响应文本
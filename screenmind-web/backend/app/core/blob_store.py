@@ -0,0 +1,241 @@
+"""
+图片存储模块
+按内容哈希 (SHA-256) 保存分析过的原始图片，相同的截图只存一份，重新分析时用图片ID引用而无需重新上传
+
+- 两级分片目录 (ab/cd/abcd...)，避免单个目录下文件过多
+- 先写临时文件再原子重命名，进程崩溃不会留下半个文件
+- 可选把PNG无损重新压缩为WebP（更小时才保留）
+- 总大小超过上限时按最近访问时间淘汰
+"""
+import hashlib
+import io
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Dict, Any
+from PIL import Image, features
+from .logger import app_logger
+
+# 图片ID为SHA-256十六进制串
+_IMAGE_ID = re.compile(r"^[0-9a-f]{64}$")
+
+# 按文件头识别格式 (文件头, 扩展名)
+_FORMATS = (
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"GIF8", ".gif"),
+    (b"BM", ".bmp"),
+)
+_EXTENSIONS = {".png": "image/png", ".jpg": "image/jpeg", ".gif": "image/gif",
+               ".bmp": "image/bmp", ".webp": "image/webp", ".bin": "application/octet-stream"}
+
+# 淘汰时清理到上限的这个比例，避免每次写入都触发淘汰
+EVICT_TARGET_RATIO = 0.9
+
+
+def is_valid_image_id(image_id: str) -> bool:
+    return bool(_IMAGE_ID.match(image_id or ""))
+
+
+def _sniff_extension(data) -> str:
+    head = bytes(data[:12])
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    for magic, ext in _FORMATS:
+        if head.startswith(magic):
+            return ext
+    return ".bin"
+
+
+def recompress_webp(data: bytes) -> Optional[bytes]:
+    """PNG无损重新压缩为WebP，结果没有更小时返回None"""
+    try:
+        image = Image.open(io.BytesIO(data))
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, format="WEBP", lossless=True, method=4)
+    except Exception as e:
+        app_logger.warning(f"WebP重新压缩失败: {e}")
+        return None
+    webp = buffer.getvalue()
+    return webp if len(webp) < len(data) else None
+
+
+class BlobStore:
+    """内容寻址的图片存储"""
+
+    def __init__(self, root: str = "data/blobs", max_bytes: int = 500 * 1024 * 1024, webp: bool = False):
+        """
+        Args:
+            root: 存储根目录
+            max_bytes: 总大小上限，超过后淘汰最久未访问的图片
+            webp: 是否把PNG无损重新压缩为WebP保存
+        """
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.webp = webp and features.check("webp")
+        if webp and not self.webp:
+            app_logger.warning("Pillow不支持WebP，图片按原格式保存")
+
+        self._lock = threading.Lock()
+        # 图片ID -> (路径, 大小)，按最近访问排序，首次使用时扫描目录建立
+        self._index: Optional["OrderedDict[str, tuple]"] = None
+        self._total_bytes = 0
+        self._stats = {"stored": 0, "deduplicated": 0, "evicted": 0, "saved_bytes": 0}
+
+    @classmethod
+    def from_env(cls) -> "BlobStore":
+        """从环境变量创建"""
+        return cls(
+            root=os.getenv("BLOB_STORE_PATH", "data/blobs"),
+            max_bytes=int(float(os.getenv("BLOB_STORE_MAX_MB", "500")) * 1024 * 1024),
+            webp=os.getenv("BLOB_STORE_WEBP", "false").lower() == "true"
+        )
+
+    def _ensure_index(self) -> "OrderedDict[str, tuple]":
+        """扫描存储目录建立索引（调用方持有锁）"""
+        if self._index is not None:
+            return self._index
+
+        entries = []
+        if self.root.exists():
+            for path in self.root.glob("*/*/*"):
+                image_id = path.stem
+                if path.suffix in _EXTENSIONS and is_valid_image_id(image_id):
+                    stat = path.stat()
+                    entries.append((stat.st_mtime, image_id, path, stat.st_size))
+        entries.sort()
+        self._index = OrderedDict((image_id, (path, size)) for _, image_id, path, size in entries)
+        self._total_bytes = sum(size for _, _, _, size in entries)
+        if entries:
+            app_logger.info(f"图片存储已加载 {len(entries)} 张图片，共 {self._total_bytes / 1024 / 1024:.1f}MB")
+        return self._index
+
+    def _shard_dir(self, image_id: str) -> Path:
+        return self.root / image_id[:2] / image_id[2:4]
+
+    def _touch(self, image_id: str, path: Path):
+        """更新最近访问时间（mtime用于重启后恢复淘汰顺序）"""
+        self._index.move_to_end(image_id)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def put(self, data, image_id: Optional[str] = None) -> str:
+        """
+        保存图片（已存在时只更新访问时间）
+
+        Args:
+            data: 图片字节（bytes/memoryview）
+            image_id: 已知的图片ID，None时按内容计算
+
+        Returns:
+            图片ID
+        """
+        if not len(data):
+            raise ValueError("图片数据为空")
+        image_id = image_id or hashlib.sha256(data).hexdigest()
+
+        with self._lock:
+            index = self._ensure_index()
+            existing = index.get(image_id)
+            if existing is not None:
+                self._touch(image_id, existing[0])
+                self._stats["deduplicated"] += 1
+                return image_id
+
+        ext = _sniff_extension(data)
+        payload = data
+        if self.webp and ext == ".png":
+            webp = recompress_webp(bytes(data))
+            if webp is not None:
+                payload, ext = webp, ".webp"
+
+        shard = self._shard_dir(image_id)
+        shard.mkdir(parents=True, exist_ok=True)
+        path = shard / (image_id + ext)
+        fd, tmp_path = tempfile.mkstemp(dir=shard, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        with self._lock:
+            if image_id not in self._index:
+                self._index[image_id] = (path, len(payload))
+                self._total_bytes += len(payload)
+                self._stats["stored"] += 1
+                self._stats["saved_bytes"] += len(data) - len(payload)
+            self._evict()
+        return image_id
+
+    def _evict(self):
+        """总大小超过上限时淘汰最久未访问的图片（调用方持有锁）"""
+        if self._total_bytes <= self.max_bytes:
+            return
+        target = self.max_bytes * EVICT_TARGET_RATIO
+        for image_id in list(self._index):
+            if self._total_bytes <= target:
+                break
+            path, size = self._index[image_id]
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue  # Windows下正被读取的文件无法删除，下次再淘汰
+            del self._index[image_id]
+            self._total_bytes -= size
+            self._stats["evicted"] += 1
+
+    def get_path(self, image_id: str) -> Optional[Path]:
+        """图片文件路径（同时更新访问时间），不存在时返回None"""
+        if not is_valid_image_id(image_id):
+            return None
+        with self._lock:
+            entry = self._ensure_index().get(image_id)
+            if entry is None:
+                return None
+            self._touch(image_id, entry[0])
+        return entry[0]
+
+    def content_type(self, path: Path) -> str:
+        return _EXTENSIONS.get(path.suffix, "application/octet-stream")
+
+    def read(self, image_id: str) -> bytes:
+        """
+        读取图片字节
+
+        Raises:
+            KeyError: 图片不存在（包括在 get_path 之后刚被淘汰）
+        """
+        path = self.get_path(image_id)
+        if path is None:
+            raise KeyError(image_id)
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:
+            raise KeyError(image_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """存储统计信息"""
+        with self._lock:
+            self._ensure_index()
+            return {
+                "images": len(self._index),
+                "total_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "webp": self.webp,
+                **self._stats
+            }
@@ -0,0 +1,117 @@
+"""
+截屏能力注册表
+启动时只做廉价的可用性检查（不截屏，gnome-screenshot等工具截屏时会闪屏），按默认优先级使用；
+按需刷新时才实际截屏测速并按速度排序，避免每次请求都用 which / FileNotFoundError 试错
+"""
+import threading
+import time
+from typing import Callable, Dict, Any, List, Optional, Tuple
+from .logger import app_logger
+
+# 截屏后端：capture(bbox) -> PNG字节
+CaptureFunc = Callable[[Optional[Tuple[int, int, int, int]]], bytes]
+
+
+class CaptureBackend:
+    """一个截屏后端的描述"""
+
+    def __init__(self, name: str, capture: CaptureFunc, available: Callable[[], bool]):
+        """
+        Args:
+            name: 后端名称
+            capture: 截屏函数
+            available: 廉价的可用性检查（不截屏）
+        """
+        self.name = name
+        self.capture = capture
+        self.available = available
+
+
+class CaptureRegistry:
+    """截屏能力注册表"""
+
+    def __init__(self, backends_factory: Callable[[], List[CaptureBackend]], benchmark: bool = True):
+        """
+        Args:
+            backends_factory: 返回当前平台候选后端列表（按默认优先级排列）
+            benchmark: 刷新 (refresh) 时是否实际截屏测速
+        """
+        self.backends_factory = backends_factory
+        self.benchmark = benchmark
+        self._lock = threading.Lock()
+        self._backends: List[CaptureBackend] = []
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._order: List[str] = []
+        self._probed_at: Optional[float] = None
+        self._benchmarked = False
+
+    def probe(self, benchmark: bool = False) -> Dict[str, Any]:
+        """
+        探测所有候选后端
+
+        Args:
+            benchmark: 是否实际截屏测速并按耗时从快到慢排序，否则只检查可用性、保持默认优先级
+
+        Returns:
+            探测结果（同 get_status）
+        """
+        backends = self.backends_factory()
+        results = {}
+        for backend in backends:
+            result = {"available": False, "working": False, "duration": None, "error": None}
+            try:
+                result["available"] = bool(backend.available())
+            except Exception as e:
+                result["error"] = str(e)
+
+            if result["available"] and benchmark:
+                start = time.perf_counter()
+                try:
+                    backend.capture(None)
+                    result["working"] = True
+                    result["duration"] = round(time.perf_counter() - start, 4)
+                except Exception as e:
+                    result["error"] = str(e)
+            elif result["available"]:
+                result["working"] = True
+            results[backend.name] = result
+
+        working = [b.name for b in backends if results[b.name]["working"]]
+        if benchmark:
+            working.sort(key=lambda name: results[name]["duration"] or 0.0)
+        # 没有测速成功的后端时（例如无显示器的服务器），保留所有存在的后端以便请求时报告真实错误
+        if not working:
+            working = [b.name for b in backends if results[b.name]["available"]]
+
+        with self._lock:
+            self._backends = backends
+            self._results = results
+            self._order = working
+            self._probed_at = time.time()
+            self._benchmarked = benchmark
+
+        app_logger.info(f"截屏后端{'测速' if benchmark else '探测'}完成，可用顺序: {working or '无'}")
+        return self.get_status()
+
+    def refresh(self) -> Dict[str, Any]:
+        """按需重新探测（benchmark开启时实际截屏测速）"""
+        return self.probe(benchmark=self.benchmark)
+
+    def ordered_backends(self) -> List[CaptureBackend]:
+        """可用后端（测速过则按速度排序），首次调用时自动探测可用性"""
+        if self._probed_at is None:
+            self.probe()
+        with self._lock:
+            by_name = {backend.name: backend for backend in self._backends}
+            return [by_name[name] for name in self._order]
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取探测结果"""
+        with self._lock:
+            return {
+                "backends": dict(self._results),
+                "order": list(self._order),
+                "fastest": self._order[0] if self._order and self._benchmarked else None,
+                "benchmarked": self._benchmarked,
+                "probed_at": self._probed_at
+            }
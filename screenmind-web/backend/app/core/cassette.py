@@ -0,0 +1,184 @@
+"""
+提供商调用录制/回放模块
+把AIService对提供商的每次实际调用（请求指纹 -> 回答、token用量、耗时）记录到本地文件，之后可以离线回放，
+用于复现线上的慢请求、离线回归测试和真实延迟的压测
+
+模式:
+  passthrough  直接调用提供商，不录制也不回放（默认）
+  record       调用提供商并录制（包括失败的调用），同一请求以最后一次录制为准
+  replay       只回放，未录制的请求按调用失败处理，不访问网络
+  auto         命中时回放，未命中时调用提供商并录制成功的结果
+
+文件格式为JSON Lines，每行一次调用。只保存请求的指纹和少量摘要字段（模型、类型、max_tokens、detail），
+不保存图片和提示词，文件大小只与回答文本有关
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, Callable, Tuple
+from .logger import ai_logger
+
+PASSTHROUGH = "passthrough"
+RECORD = "record"
+REPLAY = "replay"
+AUTO = "auto"
+CASSETTE_MODES = (PASSTHROUGH, RECORD, REPLAY, AUTO)
+
+# 录制文件中保留的请求摘要字段（便于人工查看，不参与匹配）
+SUMMARY_FIELDS = ("kind", "model", "max_tokens", "detail")
+
+
+class CassetteMissError(Exception):
+    """回放模式下请求没有录制"""
+
+
+class RecordedProviderError(Exception):
+    """回放录制时失败的调用"""
+
+
+def fingerprint(request: Dict[str, Any]) -> str:
+    """请求指纹：请求各字段（含图片、提示词全文）规范化JSON的SHA-256前128位"""
+    canonical = json.dumps(request, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32]
+
+
+class ProviderCassette:
+    """提供商调用录制文件"""
+
+    def __init__(self, path: str = "data/cassette.jsonl", mode: str = PASSTHROUGH, replay_latency: float = 0.0):
+        """
+        Args:
+            path: 录制文件路径 (.jsonl)
+            mode: passthrough / record / replay / auto
+            replay_latency: 回放时按录制耗时的多少倍等待（0表示立即返回，1表示重现真实延迟）
+        """
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"未知的录制模式: {mode}")
+        self.path = Path(path)
+        self.mode = mode
+        self.replay_latency = max(0.0, replay_latency)
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._last = threading.local()
+        self._stats = {"replayed": 0, "recorded": 0, "missed": 0, "passthrough": 0}
+        if mode != PASSTHROUGH:
+            self._load()
+
+    @classmethod
+    def from_env(cls) -> "ProviderCassette":
+        """从环境变量创建"""
+        return cls(
+            path=os.getenv("CASSETTE_PATH", "data/cassette.jsonl"),
+            mode=os.getenv("CASSETTE_MODE", PASSTHROUGH).lower(),
+            replay_latency=float(os.getenv("CASSETTE_REPLAY_LATENCY", "0"))
+        )
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                    self._entries[entry["key"]] = entry
+                except (ValueError, KeyError):
+                    # 进程中途退出可能留下半行，跳过即可
+                    ai_logger.warning(f"录制文件第 {line_no} 行无效，已跳过")
+        ai_logger.info(f"已加载 {len(self._entries)} 条提供商调用录制 ({self.mode})")
+
+    def _append(self, key: str, request: Dict[str, Any], latency: float, **result):
+        entry = {
+            "key": key,
+            **{field: request.get(field) for field in SUMMARY_FIELDS if request.get(field) is not None},
+            **result,
+            "latency": round(latency, 4),
+            "recorded_at": round(time.time(), 3)
+        }
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._entries[key] = entry
+            self._stats["recorded"] += 1
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # 追加模式下每次只写一行，多个worker同时录制也不会互相覆盖
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def _replay(self, entry: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, int]]]:
+        with self._lock:
+            self._stats["replayed"] += 1
+        self._last.value = {"latency": entry["latency"], "replayed": True}
+        if self.replay_latency:
+            time.sleep(entry["latency"] * self.replay_latency)
+        if "error" in entry:
+            raise RecordedProviderError(entry["error"])
+        return entry["text"], entry.get("usage")
+
+    def call(
+        self,
+        request: Dict[str, Any],
+        invoke: Callable[[], Tuple[str, Optional[Dict[str, int]]]]
+    ) -> Tuple[str, Optional[Dict[str, int]]]:
+        """
+        经录制层执行一次提供商调用
+
+        Args:
+            request: 决定回答的全部请求字段（模型、提示词、图片/文字、参数）
+            invoke: 实际调用提供商，返回 (回答文本, token用量)
+
+        Returns:
+            (回答文本, token用量)
+
+        Raises:
+            CassetteMissError: 回放模式下没有录制
+            RecordedProviderError: 回放录制时失败的调用
+        """
+        self._last.value = None
+        if self.mode == PASSTHROUGH:
+            with self._lock:
+                self._stats["passthrough"] += 1
+            return invoke()
+
+        key = fingerprint(request)
+        if self.mode in (REPLAY, AUTO):
+            entry = self._entries.get(key)
+            if entry is not None:
+                return self._replay(entry)
+            if self.mode == REPLAY:
+                with self._lock:
+                    self._stats["missed"] += 1
+                raise CassetteMissError(f"录制中没有该请求 ({request.get('model')}, {key[:12]})")
+
+        start = time.perf_counter()
+        try:
+            text, usage = invoke()
+        except Exception as e:
+            latency = time.perf_counter() - start
+            self._last.value = {"latency": latency, "replayed": False}
+            if self.mode == RECORD:
+                self._append(key, request, latency, error=str(e))
+            raise
+        latency = time.perf_counter() - start
+        self._last.value = {"latency": latency, "replayed": False}
+        # auto模式只录制成功的回答，失败的请求下次仍会重新调用
+        if self.mode == RECORD or (text and not text.startswith("错误:")):
+            self._append(key, request, latency, text=text, usage=usage)
+        return text, usage
+
+    def last_call(self) -> Optional[Dict[str, Any]]:
+        """当前线程最近一次经录制层的调用：{"latency": 录制或实际耗时, "replayed": 是否回放}"""
+        return getattr(self._last, "value", None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "path": str(self.path),
+                "entries": len(self._entries),
+                "replay_latency": self.replay_latency,
+                **self._stats
+            }
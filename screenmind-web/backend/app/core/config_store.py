@@ -0,0 +1,173 @@
+"""
+共享配置存储
+基于本地SQLite文件、带版本号的配置存储，多个uvicorn worker共享同一份配置；
+各worker只做廉价的文件mtime检查，版本变化时才重新读取。
+文件中保存着API密钥，只允许所有者读写 (0600)
+"""
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable, Optional, Dict, Any
+
+VERSION_KEY = "__version__"
+
+
+class ConfigStore:
+    """带版本号的配置存储"""
+
+    def __init__(self, path: str = "data/config.db", defaults: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            path: SQLite数据库文件路径
+            defaults: 首次创建时写入的默认配置
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # 先以0600创建空文件再交给SQLite（回滚日志沿用数据库文件的权限），已有文件也收紧权限
+        os.close(os.open(str(self.path), os.O_WRONLY | os.O_CREAT, 0o600))
+        os.chmod(self.path, 0o600)
+        self._lock = threading.Lock()
+        self._seen_mtime = None
+        self._seen_version = None
+
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.execute(
+                "INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)",
+                (VERSION_KEY, json.dumps(0))
+            )
+            for key, value in (defaults or {}).items():
+                conn.execute(
+                    "INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)",
+                    (key, json.dumps(value))
+                )
+
+    def _connect(self) -> sqlite3.Connection:
+        # 使用默认的回滚日志模式，每次提交都会更新数据库文件的mtime
+        return sqlite3.connect(str(self.path), timeout=5)
+
+    @staticmethod
+    def _read(conn: sqlite3.Connection) -> Dict[str, Any]:
+        rows = conn.execute("SELECT key, value FROM settings").fetchall()
+        data = {key: json.loads(value) for key, value in rows}
+        data["version"] = data.pop(VERSION_KEY, 0)
+        data.setdefault("api_keys", {})
+        return data
+
+    def snapshot(self) -> Dict[str, Any]:
+        """读取完整配置（包含version）"""
+        with self._connect() as conn:
+            return self._read(conn)
+
+    def load(self) -> Dict[str, Any]:
+        """读取配置并标记为本进程已应用（启动时使用）"""
+        # 先取mtime再读取：读取之后其他进程的提交会改变mtime，poll仍能发现
+        mtime = self._mtime()
+        snapshot = self.snapshot()
+        with self._lock:
+            self._seen_mtime = mtime
+        self._mark_seen(snapshot["version"])
+        return snapshot
+
+    def _commit(self, compute: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        在写事务中基于当前配置计算变更、写入并递增版本号（多进程同时写入时串行化）；
+        没有变更时不写入，版本号不变
+
+        Returns:
+            更新后的配置快照（本进程视为已应用，poll不会重复返回）
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            changes = compute(self._read(conn))
+            if not changes:
+                snapshot = self._read(conn)
+                conn.rollback()
+                self._mark_seen(snapshot["version"])
+                return snapshot
+            for key, value in changes.items():
+                conn.execute(
+                    "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                    (key, json.dumps(value))
+                )
+            conn.execute(
+                "UPDATE settings SET value = CAST(value AS INTEGER) + 1 WHERE key = ?",
+                (VERSION_KEY,)
+            )
+            snapshot = self._read(conn)
+
+        self._mark_seen(snapshot["version"])
+        return snapshot
+
+    def update(self, **changes) -> Dict[str, Any]:
+        """原子地更新若干配置项并递增版本号"""
+        return self._commit(lambda current: changes)
+
+    def apply_overrides(self, **overrides) -> Dict[str, Any]:
+        """
+        应用外部覆盖（启动时的环境变量）：只写入与存储值不同的项，值为None的项忽略，全部相同时版本号不变
+        （多个worker启动时各自调用，只有第一个会写入）
+
+        Returns:
+            应用后的配置快照
+        """
+        overrides = {key: value for key, value in overrides.items() if value is not None}
+        return self._commit(
+            lambda current: {key: value for key, value in overrides.items() if current.get(key) != value}
+        )
+
+    def set_model(self, provider: str, model: str) -> Dict[str, Any]:
+        """切换当前模型"""
+        return self.update(current_provider=provider, current_model=model)
+
+    def set_api_key(self, provider: str, api_key: Optional[str]) -> Dict[str, Any]:
+        """设置或删除（api_key为None）指定提供商的API密钥"""
+        def change(current: Dict[str, Any]) -> Dict[str, Any]:
+            api_keys = dict(current["api_keys"])
+            if api_key:
+                api_keys[provider] = api_key
+            else:
+                api_keys.pop(provider, None)
+            return {"api_keys": api_keys}
+
+        return self._commit(change)
+
+    def _mark_seen(self, version: int):
+        """
+        记录本进程已应用的版本
+
+        不在这里记录mtime：事务结束后再读取的mtime可能已经包含其他进程随后的提交，
+        记为已见会让poll漏掉那个版本。mtime留给poll在读取前记录，由版本号判断是否有新配置
+        """
+        with self._lock:
+            self._seen_version = max(version, self._seen_version or 0)
+
+    def _mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def poll(self) -> Optional[Dict[str, Any]]:
+        """
+        检查其他进程是否修改了配置
+
+        只有数据库文件mtime变化时才读取版本号，版本号高于本进程已应用的版本时返回新快照
+        （本进程自己写入后的第一次poll也会读取一次，版本号相同时返回None）
+
+        Returns:
+            配置有新版本时返回快照，否则返回None
+        """
+        mtime = self._mtime()
+        if mtime is None or mtime == self._seen_mtime:
+            return None
+
+        snapshot = self.snapshot()
+        with self._lock:
+            self._seen_mtime = mtime
+            if self._seen_version is not None and snapshot["version"] <= self._seen_version:
+                return None
+            self._seen_version = snapshot["version"]
+        return snapshot
@@ -0,0 +1,166 @@
+"""
+连接预热模块
+启动时和切换模型时用不消耗token的轻量请求提前建立到提供商的DNS/TCP/TLS连接，
+空闲时定期发送同样的请求，让连接池中的连接不因空闲而过期
+
+- OpenAI兼容提供商：列出模型，与分析请求共用同一个httpx连接池
+- Gemini：对当前模型调用count_tokens，与generate_content走同一个生成服务客户端
+  （列出模型走的是另一个模型服务客户端，预热不到分析请求使用的连接）
+"""
+import asyncio
+import os
+import threading
+import time
+from typing import Dict, Any
+from starlette.concurrency import run_in_threadpool
+from .logger import ai_logger
+
+# 连接池保留空闲连接的秒数（httpx默认只有5秒，空闲后下一次请求又要重新握手）
+KEEPALIVE_EXPIRY = 90.0
+
+# 空闲多久后发送一次保活请求，需要小于KEEPALIVE_EXPIRY和服务端的空闲超时
+DEFAULT_PING_INTERVAL = 45.0
+
+PING_TIMEOUT = 10.0
+
+
+def create_http_client(keepalive_expiry: float = KEEPALIVE_EXPIRY, verify=True):
+    """
+    为OpenAI兼容客户端创建保留空闲连接更久的httpx连接池
+
+    Args:
+        keepalive_expiry: 空闲连接保留秒数
+        verify: TLS证书校验（True、CA文件路径或ssl.SSLContext）
+    """
+    import httpx
+    return httpx.Client(
+        verify=verify,
+        limits=httpx.Limits(
+            max_connections=100,
+            max_keepalive_connections=20,
+            keepalive_expiry=keepalive_expiry
+        )
+    )
+
+
+def ping_client(provider: str, client) -> None:
+    """发送一次不消耗token的轻量请求，失败时抛出异常"""
+    if provider == "gemini":
+        # client是当前模型的GenerativeModel，count_tokens不消耗token配额
+        client.count_tokens("ping")
+    else:
+        client.models.list(timeout=PING_TIMEOUT)
+
+
+class ConnectionWarmer:
+    """提供商连接预热与保活"""
+
+    def __init__(self, ai_service, ping_interval: float = DEFAULT_PING_INTERVAL, enabled: bool = True):
+        """
+        Args:
+            ai_service: AI服务实例，用于读取当前客户端和最近一次请求时间
+            ping_interval: 空闲保活间隔（秒）
+            enabled: 是否启用预热和保活
+        """
+        self.ai_service = ai_service
+        self.ping_interval = ping_interval
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._status = {
+            "state": "disabled" if not enabled else "cold",
+            "provider": None,
+            "latency_ms": None,
+            "warmed_at": None,
+            "last_ping_at": None,
+            "pings": 0,
+            "failures": 0,
+            "error": None
+        }
+        self._last_ping = 0.0
+
+    @classmethod
+    def from_env(cls, ai_service) -> "ConnectionWarmer":
+        """从环境变量创建"""
+        return cls(
+            ai_service,
+            ping_interval=float(os.getenv("CONNECTION_PING_INTERVAL", str(DEFAULT_PING_INTERVAL))),
+            enabled=os.getenv("CONNECTION_WARMUP", "true").lower() == "true"
+        )
+
+    def warm(self, provider: str, client) -> bool:
+        """
+        预热一个客户端的连接（AI服务在新客户端替换上线前调用）
+
+        Returns:
+            是否预热成功
+        """
+        if not self.enabled or client is None:
+            return False
+
+        with self._lock:
+            self._status["state"] = "warming"
+            self._status["provider"] = provider
+
+        start = time.perf_counter()
+        try:
+            ping_client(provider, client)
+            ok, error = True, None
+        except Exception as e:
+            ok, error = False, str(e)
+        latency = time.perf_counter() - start
+
+        with self._lock:
+            self._last_ping = time.monotonic()
+            self._status["pings"] += 1
+            self._status["last_ping_at"] = time.time()
+            self._status["latency_ms"] = round(latency * 1000, 1)
+            self._status["error"] = error
+            if ok:
+                self._status["state"] = "warm"
+                self._status["warmed_at"] = time.time()
+            else:
+                self._status["state"] = "failed"
+                self._status["failures"] += 1
+
+        if ok:
+            ai_logger.info(f"{provider} 连接预热完成，耗时 {latency * 1000:.0f}ms")
+        else:
+            ai_logger.warning(f"{provider} 连接预热失败: {error}")
+        return ok
+
+    def ping_if_idle(self) -> bool:
+        """
+        空闲超过保活间隔时对当前客户端发送一次保活请求
+
+        Returns:
+            是否发送了保活请求
+        """
+        now = time.monotonic()
+        last_activity = max(self._last_ping, self.ai_service.last_request_at)
+        if now - last_activity < self.ping_interval:
+            return False
+
+        provider, client = self.ai_service.get_active_client()
+        if client is None:
+            return False
+        self.warm(provider, client)
+        return True
+
+    async def keep_alive(self):
+        """后台保活循环（在启动钩子中创建任务）"""
+        if not self.enabled:
+            return
+        while True:
+            await asyncio.sleep(self.ping_interval / 3)
+            try:
+                await run_in_threadpool(self.ping_if_idle)
+            except Exception as e:
+                ai_logger.error(f"连接保活失败: {e}")
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取预热状态"""
+        with self._lock:
+            status = dict(self._status)
+        status["enabled"] = self.enabled
+        status["ping_interval"] = self.ping_interval
+        return status
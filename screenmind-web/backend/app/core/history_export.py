@@ -0,0 +1,84 @@
+"""
+分析历史导出
+把按批读取的历史记录逐批编码为CSV或JSONL（可选gzip），配合流式响应导出，内存占用与历史总量无关
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Dict, Any, List
+
+EXPORT_FORMATS = ("csv", "jsonl")
+
+EXPORT_FIELDS = (
+    "id", "created_at", "question_type", "question_content", "answer",
+    "explanation", "model_used", "pipeline", "image_id", "device_id"
+)
+
+# 每批读取的记录数
+EXPORT_BATCH_SIZE = 500
+
+
+class ExportEncoder:
+    """逐批编码导出数据（有状态：CSV表头只写一次，gzip压缩流跨批次连续）"""
+
+    def __init__(self, fmt: str = "csv", gzip: bool = False):
+        """
+        Args:
+            fmt: csv 或 jsonl
+            gzip: 是否输出gzip压缩流
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"不支持的导出格式: {fmt}")
+        self.fmt = fmt
+        self._started = False
+        # wbits=31 生成带gzip头的流，可直接保存为 .gz 文件
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+
+    @property
+    def media_type(self) -> str:
+        if self._compressor:
+            return "application/gzip"
+        return "text/csv; charset=utf-8" if self.fmt == "csv" else "application/x-ndjson"
+
+    @property
+    def filename(self) -> str:
+        return f"screenmind_history.{self.fmt}" + (".gz" if self._compressor else "")
+
+    @staticmethod
+    def _export_row(row: Dict[str, Any]) -> Dict[str, Any]:
+        data = {field: row.get(field) for field in EXPORT_FIELDS}
+        data["created_at"] = datetime.fromtimestamp(row["created_at"]).isoformat(timespec="seconds")
+        return data
+
+    def _encode_text(self, rows: List[Dict[str, Any]]) -> str:
+        buffer = io.StringIO()
+        if self.fmt == "csv":
+            if not self._started:
+                # UTF-8 BOM让Excel正确识别中文
+                buffer.write("\ufeff")
+            writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+            if not self._started:
+                writer.writeheader()
+            writer.writerows(self._export_row(row) for row in rows)
+        else:
+            for row in rows:
+                buffer.write(json.dumps(self._export_row(row), ensure_ascii=False))
+                buffer.write("\n")
+        self._started = True
+        return buffer.getvalue()
+
+    def encode(self, rows: List[Dict[str, Any]]) -> bytes:
+        """编码一批记录（压缩模式下可能返回空字节，数据留在压缩器缓冲区中）"""
+        data = self._encode_text(rows).encode("utf-8")
+        if self._compressor:
+            return self._compressor.compress(data)
+        return data
+
+    def finish(self) -> bytes:
+        """结束导出：CSV没有任何记录时输出表头，压缩模式下输出剩余数据和gzip尾部"""
+        data = self._encode_text([]).encode("utf-8") if not self._started else b""
+        if self._compressor:
+            return self._compressor.compress(data) + self._compressor.flush()
+        return data
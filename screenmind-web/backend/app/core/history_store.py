@@ -0,0 +1,301 @@
+"""
+分析历史模块
+每次完成的分析写入本地SQLite，题目、答案和解析建立FTS5全文索引
+
+FTS5自带的unicode61分词器会把连续的中文当成一个词，无法按词检索；
+这里在Python侧把中日韩文字切成重叠的二元组 (bigram) 再写入索引，
+查询时同样切分并以短语匹配，保证命中的二元组在原文中相邻
+"""
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+# 中日韩文字（平假名/片假名、CJK统一表意文字及扩展A、兼容表意文字、韩文音节）
+_CJK = "぀-ヿ㐀-䶿一-鿿豈-﫿가-힯"
+_TOKEN = re.compile(rf"([{_CJK}]+)|((?:(?![{_CJK}])[^\W_])+)")
+
+RECORD_FIELDS = (
+    "question_type", "question_content", "answer", "explanation", "model_used", "pipeline", "image_id"
+)
+
+# 排序权重：题目内容 > 答案 > 解析
+RANK_WEIGHTS = (3.0, 1.5, 1.0)
+
+MAX_PAGE_SIZE = 100
+
+# 排序候选上限：匹配过多时只在最近的这些匹配中按相关度排序，避免为常见词计算所有匹配的分数
+MAX_RANKED_CANDIDATES = 5000
+
+
+def _normalize(text: str) -> str:
+    """全角转半角并转小写"""
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+
+def tokenize(text: str) -> List[List[str]]:
+    """
+    切分文本
+
+    Returns:
+        词组列表：每段连续中文切成一组二元组（单字保留为一元），其他文字每个词一组
+    """
+    groups = []
+    for cjk, word in _TOKEN.findall(_normalize(text)):
+        if cjk:
+            if len(cjk) == 1:
+                groups.append([cjk])
+            else:
+                groups.append([cjk[i:i + 2] for i in range(len(cjk) - 1)])
+        else:
+            groups.append([word])
+    return groups
+
+
+def index_text(text: str) -> str:
+    """写入FTS索引的文本（空格分隔的词）"""
+    return " ".join(token for group in tokenize(text) for token in group)
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """
+    把用户输入转换为FTS5 MATCH表达式：每段中文为一个短语，英文/数字做前缀匹配，各段之间为AND
+
+    Returns:
+        MATCH表达式，输入中没有可检索的文字时返回None
+    """
+    terms = []
+    for group in tokenize(query):
+        if len(group) == 1:
+            # 英文/数字词和单字做前缀匹配（单个汉字在索引中只作为二元组的首字出现）
+            terms.append(f'"{group[0]}"*')
+        else:
+            terms.append('"' + " ".join(group) + '"')
+    return " ".join(terms) or None
+
+
+class HistoryStore:
+    """分析历史存储（SQLite + FTS5）"""
+
+    def __init__(self, path: str = "data/history.db"):
+        """
+        Args:
+            path: SQLite数据库文件路径
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+
+        conn = self._connection()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS history (
+                    id INTEGER PRIMARY KEY,
+                    created_at REAL NOT NULL,
+                    question_type TEXT,
+                    question_content TEXT,
+                    answer TEXT,
+                    explanation TEXT,
+                    model_used TEXT,
+                    pipeline TEXT,
+                    image_id TEXT,
+                    device_id TEXT
+                )
+            """)
+            # 旧版本创建的表没有device_id列
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(history)")}
+            if "device_id" not in columns:
+                conn.execute("ALTER TABLE history ADD COLUMN device_id TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_history_created_at ON history (created_at)")
+            # 按设备列出/导出时按 (device_id, id) 顺序扫描
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_history_device ON history (device_id, id)")
+            # 无内容 (contentless) 索引：原文只存在history表中，索引只保存词和位置
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'history_fts'"
+            ).fetchone()
+            if not exists:
+                conn.execute(
+                    "CREATE VIRTUAL TABLE history_fts USING fts5("
+                    "question_content, answer, explanation, content='', tokenize='unicode61')"
+                )
+                conn.execute(
+                    "INSERT INTO history_fts (history_fts, rank) VALUES ('rank', ?)",
+                    ("bm25({}, {}, {})".format(*RANK_WEIGHTS),)
+                )
+
+    def _connection(self) -> sqlite3.Connection:
+        """每个线程复用一个连接（WAL模式下读写互不阻塞）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=5)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, record: Dict[str, Any], created_at: Optional[float] = None, device_id: Optional[str] = None) -> int:
+        """
+        记录一次分析结果
+
+        Args:
+            record: 分析结果
+            created_at: 记录时间，默认为当前时间
+            device_id: 发起分析的设备ID（请求头 Device-Id），未知时为None
+
+        Returns:
+            历史记录ID
+        """
+        values = [record.get(field) for field in RECORD_FIELDS]
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(
+                f"INSERT INTO history (created_at, device_id, {', '.join(RECORD_FIELDS)}) "
+                f"VALUES (?, ?{', ?' * len(RECORD_FIELDS)})",
+                [created_at or time.time(), device_id, *values]
+            )
+            record_id = cursor.lastrowid
+            conn.execute(
+                "INSERT INTO history_fts (rowid, question_content, answer, explanation) VALUES (?, ?, ?, ?)",
+                (
+                    record_id,
+                    index_text(record.get("question_content")),
+                    index_text(record.get("answer")),
+                    index_text(record.get("explanation"))
+                )
+            )
+        return record_id
+
+    def get(self, record_id: int) -> Optional[Dict[str, Any]]:
+        """按ID读取一条记录"""
+        row = self._connection().execute("SELECT * FROM history WHERE id = ?", (record_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list_recent(
+        self,
+        page: int = 1,
+        page_size: int = 20,
+        question_type: Optional[str] = None,
+        device_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """按时间倒序分页列出记录（可只列出指定题目类型或设备）"""
+        page, page_size = max(1, page), max(1, min(page_size, MAX_PAGE_SIZE))
+        conditions, params = [], []
+        if question_type:
+            conditions.append("question_type = ?")
+            params.append(question_type)
+        if device_id:
+            conditions.append("device_id = ?")
+            params.append(device_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._connection().execute(
+            f"SELECT * FROM history {where} ORDER BY id DESC LIMIT ? OFFSET ?",
+            [*params, page_size + 1, (page - 1) * page_size]
+        ).fetchall()
+        return {
+            "items": [dict(row) for row in rows[:page_size]],
+            "page": page,
+            "page_size": page_size,
+            "has_more": len(rows) > page_size
+        }
+
+    def fetch_batch(
+        self,
+        after_id: int = 0,
+        limit: int = 500,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        question_type: Optional[str] = None,
+        device_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        按ID顺序读取一批记录（键集分页，用于导出），可只读取指定设备的记录
+
+        每批都是独立的短查询，不会长时间占用读事务；调用方用最后一条的id作为下一批的after_id
+        """
+        conditions, params = ["id > ?"], [after_id]
+        if since is not None:
+            conditions.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("created_at < ?")
+            params.append(until)
+        if question_type:
+            conditions.append("question_type = ?")
+            params.append(question_type)
+        if device_id:
+            conditions.append("device_id = ?")
+            params.append(device_id)
+        rows = self._connection().execute(
+            f"SELECT * FROM history WHERE {' AND '.join(conditions)} ORDER BY id LIMIT ?",
+            [*params, limit]
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def search(self, query: str, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
+        """
+        全文检索，按BM25相关度排序（题目内容权重最高）
+
+        匹配超过MAX_RANKED_CANDIDATES条时只对最近的匹配排序
+
+        Args:
+            query: 检索词，多个词之间为AND
+            page: 页码，从1开始
+            page_size: 每页条数（最大100）
+        """
+        page, page_size = max(1, page), max(1, min(page_size, MAX_PAGE_SIZE))
+        start = time.perf_counter()
+        match = build_match_query(query)
+        rows = []
+        if match:
+            rows = self._connection().execute(
+                """
+                SELECT h.*, f.score
+                FROM (
+                    SELECT rowid, score FROM (
+                        SELECT rowid, rank AS score FROM history_fts
+                        WHERE history_fts MATCH ?
+                        ORDER BY rowid DESC
+                        LIMIT ?
+                    )
+                    ORDER BY score
+                    LIMIT ? OFFSET ?
+                ) AS f
+                JOIN history AS h ON h.id = f.rowid
+                ORDER BY f.score
+                """,
+                (match, MAX_RANKED_CANDIDATES, page_size + 1, (page - 1) * page_size)
+            ).fetchall()
+
+        items = []
+        for row in rows[:page_size]:
+            item = dict(row)
+            # bm25越小越相关，对外返回越大越相关的分数
+            item["score"] = round(-item["score"], 4)
+            items.append(item)
+        return {
+            "items": items,
+            "query": query,
+            "page": page,
+            "page_size": page_size,
+            "has_more": len(rows) > page_size,
+            "took_ms": round((time.perf_counter() - start) * 1000, 2)
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """记录总数以及今天、最近7天的记录数"""
+        now = time.localtime()
+        today_start = time.mktime((now.tm_year, now.tm_mon, now.tm_mday, 0, 0, 0, 0, 0, -1))
+        row = self._connection().execute(
+            """
+            SELECT
+                (SELECT COUNT(*) FROM history) AS total,
+                (SELECT COUNT(*) FROM history WHERE created_at >= ?) AS today,
+                (SELECT COUNT(*) FROM history WHERE created_at >= ?) AS week
+            """,
+            (today_start, today_start - 6 * 86400)
+        ).fetchone()
+        return dict(row)
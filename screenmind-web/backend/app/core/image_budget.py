@@ -0,0 +1,139 @@
+"""
+图片预算模块
+根据图片的廉价统计量（尺寸、文字密度、估计题目数）为每个请求选择
+图片detail级别和输出token预算
+"""
+import io
+from typing import Dict, Any, List, Tuple, Union
+from PIL import Image
+
+# 统计时使用的缩略图最大宽度，足够区分文字行；窄图不放大
+_SAMPLE_WIDTH = 512
+# 缩略图最大高度，超长图按比例缩得更窄，统计开销与原图尺寸无关
+_MAX_SAMPLE_HEIGHT = 2048
+# 允许的最大长宽比，更极端的图片不是题目截图
+MAX_ASPECT_RATIO = 20
+# 缩略后与背景灰度相差超过该值的像素视为"墨迹"（缩略会把细笔画平均淡化）
+_INK_THRESHOLD = 24
+
+# 低detail只适用于小而简单的截图
+LOW_DETAIL_MAX_SIDE = 768
+LOW_DETAIL_MAX_DENSITY = 0.08
+LOW_DETAIL_MAX_LINES = 8
+
+MIN_MAX_TOKENS = 300
+MAX_MAX_TOKENS = 1500
+
+
+def analyze_image_stats(image: Union[bytes, Image.Image]) -> Dict[str, Any]:
+    """
+    计算图片的廉价统计量
+
+    Args:
+        image: 图片字节或已打开的PIL图片
+
+    Returns:
+        包含宽高、文字密度、文字行数和估计题目数的字典
+    """
+    if isinstance(image, bytes):
+        image = Image.open(io.BytesIO(image))
+    width, height = image.size
+
+    sample_width, sample_height = _sample_size(width, height)
+    # 先缩略再转灰度，大图不需要在原分辨率上做转换
+    gray = image.resize((sample_width, sample_height), Image.BOX, reducing_gap=2.0).convert('L')
+
+    # 以出现最多的灰度作为背景色
+    histogram = gray.histogram()
+    background = histogram.index(max(histogram))
+    ink = gray.point(lambda v: 255 if abs(v - background) > _INK_THRESHOLD else 0)
+
+    pixels = ink.tobytes()
+    total = len(pixels)
+    ink_pixels = total - pixels.count(0)
+    density = ink_pixels / total if total else 0.0
+
+    # 按行投影找出文字行，再按较大的行间距划分题目块
+    row_ink = [
+        sample_width - pixels[y * sample_width:(y + 1) * sample_width].count(0)
+        for y in range(sample_height)
+    ]
+    lines = _find_text_lines(row_ink, sample_width)
+    questions = _estimate_question_blocks(lines)
+
+    return {
+        "width": width,
+        "height": height,
+        "text_density": round(density, 4),
+        "text_lines": len(lines),
+        "estimated_questions": questions
+    }
+
+
+def _sample_size(width: int, height: int) -> Tuple[int, int]:
+    """统计用缩略图尺寸：宽不超过 _SAMPLE_WIDTH、高不超过 _MAX_SAMPLE_HEIGHT，保持比例且只缩小不放大"""
+    width, height = max(width, 1), max(height, 1)
+    scale = min(1.0, _SAMPLE_WIDTH / width, _MAX_SAMPLE_HEIGHT / height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def check_aspect_ratio(width: int, height: int) -> bool:
+    """长宽比是否在允许范围内"""
+    return max(width, height) <= MAX_ASPECT_RATIO * max(1, min(width, height))
+
+
+def _find_text_lines(row_ink: List[int], sample_width: int = _SAMPLE_WIDTH) -> List[tuple]:
+    """根据行投影返回文字行的 (起始行, 结束行) 列表"""
+    min_ink = max(2, sample_width // 100)
+    lines = []
+    start = None
+    for y, count in enumerate(row_ink):
+        if count >= min_ink and start is None:
+            start = y
+        elif count < min_ink and start is not None:
+            lines.append((start, y))
+            start = None
+    if start is not None:
+        lines.append((start, len(row_ink)))
+    return lines
+
+
+def _estimate_question_blocks(lines: List[tuple]) -> int:
+    """行间距明显大于中位间距的位置视为题目分隔"""
+    if not lines:
+        return 0
+    gaps = [lines[i + 1][0] - lines[i][1] for i in range(len(lines) - 1)]
+    if not gaps:
+        return 1
+    median_gap = sorted(gaps)[len(gaps) // 2]
+    return 1 + sum(1 for gap in gaps if gap > max(2 * median_gap, 3))
+
+
+def plan_image_budget(image: Union[bytes, Image.Image]) -> Dict[str, Any]:
+    """
+    为一次分析请求选择图片detail级别和max_tokens
+
+    Args:
+        image: 图片字节或已打开的PIL图片
+
+    Returns:
+        {"detail": "low"/"high", "max_tokens": int, "stats": {...}}
+    """
+    stats = analyze_image_stats(image)
+
+    simple = (
+        max(stats["width"], stats["height"]) <= LOW_DETAIL_MAX_SIDE
+        and stats["text_density"] <= LOW_DETAIL_MAX_DENSITY
+        and stats["text_lines"] <= LOW_DETAIL_MAX_LINES
+    )
+    detail = "low" if simple else "high"
+
+    questions = max(1, stats["estimated_questions"])
+    max_tokens = 200 + 250 * questions + 15 * stats["text_lines"]
+    max_tokens = max(MIN_MAX_TOKENS, min(MAX_MAX_TOKENS, max_tokens))
+
+    return {
+        "detail": detail,
+        "max_tokens": max_tokens,
+        "stats": stats
+    }
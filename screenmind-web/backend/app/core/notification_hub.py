@@ -0,0 +1,291 @@
+"""
+通知中心模块
+进程内的发布/订阅：每次分析完成后发布一条通知，小程序通过长轮询或SSE按游标接收，
+代替客户端定时轮询
+
+- 广播通知（分析结果）只写入一个共享的环形缓冲区，发布开销与绑定设备数无关
+- 定向通知（测试通知等）写入该设备自己的环形缓冲区，只为已绑定的设备在第一次收到时创建，解绑时释放
+- 只有已绑定的设备（或已知的openid）可以订阅
+- 只有正在长轮询/SSE的设备才持有等待对象，空闲的绑定设备只占一条绑定记录
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Set, Tuple
+from .logger import app_logger
+
+# 每个订阅者一次最多补发的通知数（也是定向通知缓冲区大小）
+DEFAULT_BUFFER_SIZE = 50
+
+# 共享广播缓冲区大小
+DEFAULT_BROADCAST_SIZE = 200
+
+
+class NotificationHub:
+    """通知中心（设备绑定 + 环形缓冲区 + 游标补发）"""
+
+    def __init__(
+        self,
+        bindings_path: Optional[str] = None,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+        broadcast_size: int = DEFAULT_BROADCAST_SIZE
+    ):
+        """
+        Args:
+            bindings_path: 设备绑定持久化文件 (JSON)，None表示仅在内存中
+            buffer_size: 每个订阅者的缓冲区大小，游标落后更多时只补发最近的通知
+            broadcast_size: 广播缓冲区大小
+        """
+        self.bindings_path = Path(bindings_path) if bindings_path else None
+        self.buffer_size = buffer_size
+
+        self._lock = threading.Lock()
+        # 序号从当前毫秒时间开始递增，服务重启后新通知的序号仍大于客户端保存的旧游标
+        self._seq = int(time.time() * 1000)
+        self._broadcast: deque = deque(maxlen=broadcast_size)
+        self._broadcast_dropped = 0
+        self._direct: Dict[str, deque] = {}
+        self._direct_dropped: Dict[str, int] = {}
+        self._bindings: Dict[str, Dict[str, Any]] = {}
+        self._openids: Dict[str, str] = {}
+        self._waiters: Dict[str, Set[asyncio.Future]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._published = 0
+
+        self._load_bindings()
+
+    @classmethod
+    def from_env(cls) -> "NotificationHub":
+        """从环境变量创建"""
+        return cls(
+            bindings_path=os.getenv("MINIPROGRAM_BINDINGS_PATH", "data/miniprogram_bindings.json"),
+            buffer_size=int(os.getenv("NOTIFICATION_BUFFER_SIZE", str(DEFAULT_BUFFER_SIZE)))
+        )
+
+    # ---------- 设备绑定 ----------
+
+    def _load_bindings(self):
+        if not self.bindings_path or not self.bindings_path.exists():
+            return
+        try:
+            with open(self.bindings_path, "r", encoding="utf-8") as f:
+                self._bindings = json.load(f)
+        except (OSError, ValueError) as e:
+            app_logger.error(f"读取设备绑定失败: {e}")
+            return
+        self._openids = {b["openid"]: device_id for device_id, b in self._bindings.items() if b.get("openid")}
+        app_logger.info(f"已加载 {len(self._bindings)} 个小程序设备绑定")
+
+    def _save_bindings(self):
+        """原子写入绑定文件（调用方持有锁）"""
+        if not self.bindings_path:
+            return
+        self.bindings_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.bindings_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._bindings, f, ensure_ascii=False)
+        os.replace(tmp_path, self.bindings_path)
+
+    def bind(self, device_id: str, openid: Optional[str] = None, user_info: Optional[Dict[str, Any]] = None) -> str:
+        """
+        绑定设备
+
+        Args:
+            device_id: 小程序生成的设备ID
+            openid: 微信openid，未提供时由设备ID生成一个稳定的本地标识
+
+        Returns:
+            绑定使用的openid
+        """
+        openid = openid or "local_" + hashlib.sha1(device_id.encode("utf-8")).hexdigest()[:16]
+        with self._lock:
+            previous = self._bindings.get(device_id)
+            if previous and previous.get("openid") != openid:
+                self._openids.pop(previous.get("openid"), None)
+            self._bindings[device_id] = {
+                "openid": openid,
+                "nickname": (user_info or {}).get("nickName"),
+                "bound_at": time.time()
+            }
+            self._openids[openid] = device_id
+            self._save_bindings()
+        return openid
+
+    def unbind(self, device_id: str) -> bool:
+        """解除绑定并丢弃该设备的定向通知，返回设备之前是否已绑定"""
+        with self._lock:
+            binding = self._bindings.pop(device_id, None)
+            if binding is None:
+                return False
+            self._openids.pop(binding.get("openid"), None)
+            self._direct.pop(device_id, None)
+            self._direct_dropped.pop(device_id, None)
+            self._save_bindings()
+        return True
+
+    def is_bound(self, device_id: str) -> bool:
+        return device_id in self._bindings
+
+    def resolve(self, device_id: Optional[str] = None, openid: Optional[str] = None) -> Optional[str]:
+        """由设备ID或openid得到订阅者键，设备未绑定时返回None"""
+        with self._lock:
+            if device_id:
+                return device_id if device_id in self._bindings else None
+            if openid:
+                return self._openids.get(openid)
+        return None
+
+    # ---------- 发布 ----------
+
+    def publish(self, notification: Dict[str, Any], device_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        发布一条通知（线程安全）
+
+        Args:
+            notification: 通知内容
+            device_id: 目标设备，None表示广播给所有订阅者
+
+        Returns:
+            带序号和创建时间的通知；目标设备未绑定时丢弃并返回None
+        """
+        with self._lock:
+            if device_id is not None and device_id not in self._bindings:
+                return None
+            self._seq += 1
+            self._published += 1
+            item = {**notification, "id": self._seq, "created_at": int(time.time() * 1000)}
+            if device_id is None:
+                buffer, dropped = self._broadcast, None
+            else:
+                buffer = self._direct.get(device_id)
+                if buffer is None:
+                    buffer = self._direct[device_id] = deque(maxlen=self.buffer_size)
+                dropped = device_id
+
+            if len(buffer) == buffer.maxlen:
+                if dropped is None:
+                    self._broadcast_dropped = buffer[0]["id"]
+                else:
+                    self._direct_dropped[dropped] = buffer[0]["id"]
+            buffer.append(item)
+
+        self._notify(device_id)
+        return item
+
+    def _notify(self, device_id: Optional[str]):
+        """唤醒等待中的订阅者（可能从线程池中调用）"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._wake(device_id)
+        else:
+            loop.call_soon_threadsafe(self._wake, device_id)
+
+    def _wake(self, device_id: Optional[str]):
+        if device_id is None:
+            waiter_sets = list(self._waiters.values())
+            self._waiters.clear()
+        else:
+            waiter_sets = [self._waiters.pop(device_id, set())]
+        for waiters in waiter_sets:
+            for future in waiters:
+                if not future.done():
+                    future.set_result(None)
+
+    # ---------- 订阅 ----------
+
+    def latest_cursor(self) -> int:
+        """当前最新序号，新订阅者从这里开始只接收之后的通知"""
+        return self._seq
+
+    def read(self, device_id: Optional[str], cursor: int) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        读取游标之后的通知
+
+        Args:
+            device_id: 订阅者（None只读广播通知）
+            cursor: 客户端已收到的最后一条通知序号
+
+        Returns:
+            (按序号排列的通知，最多buffer_size条, 是否有通知因缓冲区溢出而丢失)
+        """
+        with self._lock:
+            items = [n for n in self._broadcast if n["id"] > cursor]
+            missed = cursor < self._broadcast_dropped
+            direct = self._direct.get(device_id) if device_id else None
+            if direct:
+                items.extend(n for n in direct if n["id"] > cursor)
+                items.sort(key=lambda n: n["id"])
+                missed = missed or cursor < self._direct_dropped.get(device_id, 0)
+
+        if len(items) > self.buffer_size:
+            items = items[-self.buffer_size:]
+            missed = True
+        return items, missed
+
+    def latest(self, device_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """该订阅者能看到的最新一条通知"""
+        with self._lock:
+            candidates = []
+            if self._broadcast:
+                candidates.append(self._broadcast[-1])
+            direct = self._direct.get(device_id) if device_id else None
+            if direct:
+                candidates.append(direct[-1])
+        return max(candidates, key=lambda n: n["id"]) if candidates else None
+
+    async def wait(self, device_id: Optional[str], cursor: int, timeout: float) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        长轮询：游标之后已有通知时立即返回，否则等待新通知或超时
+
+        Returns:
+            同 read()
+        """
+        items, missed = self.read(device_id, cursor)
+        if items or timeout <= 0:
+            return items, missed
+
+        loop = asyncio.get_running_loop()
+        self._loop = loop
+        key = device_id or ""
+        future = loop.create_future()
+        self._waiters.setdefault(key, set()).add(future)
+        try:
+            # 注册后再读一次，避免漏掉读取和注册之间从其他线程发布的通知
+            items, missed = self.read(device_id, cursor)
+            if items:
+                return items, missed
+            try:
+                await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                return [], False
+        finally:
+            waiters = self._waiters.get(key)
+            if waiters is not None:
+                waiters.discard(future)
+                if not waiters:
+                    del self._waiters[key]
+
+        return self.read(device_id, cursor)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """通知中心统计信息"""
+        with self._lock:
+            return {
+                "bound_devices": len(self._bindings),
+                "waiting_subscribers": sum(len(w) for w in self._waiters.values()),
+                "published": self._published,
+                "broadcast_buffered": len(self._broadcast),
+                "direct_buffers": len(self._direct),
+                "cursor": self._seq
+            }
@@ -0,0 +1,80 @@
+"""
+本地OCR模块
+在调用视觉模型之前用本地OCR（pytesseract，可选依赖）提取题目文字和置信度
+"""
+import hashlib
+import io
+import re
+import shutil
+import unicodedata
+from typing import Optional, Dict, Any
+from PIL import Image
+
+try:
+    import pytesseract
+except ImportError:  # 未安装时OCR阶段自动关闭
+    pytesseract = None
+
+DEFAULT_LANG = "chi_sim+eng"
+
+_WHITESPACE = re.compile(r"\s+")
+
+_available = None
+
+
+def is_available() -> bool:
+    """pytesseract和tesseract可执行文件是否都可用（结果会被缓存）"""
+    global _available
+    if _available is None:
+        _available = pytesseract is not None and shutil.which(
+            pytesseract.pytesseract.tesseract_cmd
+        ) is not None
+    return _available
+
+
+def extract_text(image_data: bytes, lang: str = DEFAULT_LANG) -> Optional[Dict[str, Any]]:
+    """
+    识别图片中的文字
+
+    Args:
+        image_data: 图片字节
+        lang: tesseract语言包
+
+    Returns:
+        {"text": 识别文本, "confidence": 平均置信度(0-100), "words": 词数}，
+        OCR不可用时返回None
+    """
+    if not is_available():
+        return None
+
+    image = Image.open(io.BytesIO(image_data)).convert('L')
+    data = pytesseract.image_to_data(image, lang=lang, output_type=pytesseract.Output.DICT)
+
+    lines = {}
+    confidences = []
+    for i, word in enumerate(data["text"]):
+        word = word.strip()
+        confidence = float(data["conf"][i])
+        if not word or confidence < 0:
+            continue
+        confidences.append(confidence)
+        line_id = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(line_id, []).append(word)
+
+    text = "\n".join(" ".join(words) for words in lines.values())
+    return {
+        "text": text,
+        "confidence": sum(confidences) / len(confidences) if confidences else 0.0,
+        "words": len(confidences)
+    }
+
+
+def normalize_question_text(text: str) -> str:
+    """规范化题目文本：全角转半角、小写、去掉所有空白"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return _WHITESPACE.sub("", text)
+
+
+def question_key(text: str) -> str:
+    """根据规范化后的题目文本生成精确缓存键"""
+    return hashlib.sha1(normalize_question_text(text).encode('utf-8')).hexdigest()
@@ -0,0 +1,192 @@
+"""
+过载保护模块
+在并发数或排队等待过高时对请求降级（换用更便宜的模型、降低max_tokens和图片分辨率），
+负载回落后带滞回地自动恢复
+"""
+import os
+import threading
+import time
+from typing import Optional, Dict, Any
+from PIL import Image
+from .logger import ai_logger
+
+
+class OverloadController:
+    """过载控制器 - 监控 /analyze 的并发数与延迟"""
+
+    def __init__(
+        self,
+        max_in_flight: int = 4,
+        recover_in_flight: int = 2,
+        max_queue_wait: float = 2.0,
+        recover_queue_wait: float = 0.5,
+        max_latency: float = 20.0,
+        recover_latency: float = 8.0,
+        min_degraded_seconds: float = 10.0,
+        degraded_max_tokens: int = 400,
+        degraded_max_side: int = 1280,
+        ewma_alpha: float = 0.3
+    ):
+        """
+        Args:
+            max_in_flight: 进入降级的在途请求数阈值（包括在调度器中排队的交互请求）
+            recover_in_flight: 恢复正常所需的在途请求数上限
+            max_queue_wait: 进入降级的平均排队等待（秒）
+            recover_queue_wait: 恢复正常所需的平均排队等待（秒）
+            max_latency: 进入降级的平均分析延迟（秒）
+            recover_latency: 恢复正常所需的平均分析延迟（秒）
+            min_degraded_seconds: 降级状态最短持续时间，避免来回抖动
+            degraded_max_tokens: 降级时的max_tokens
+            degraded_max_side: 降级时图片最长边（像素）
+            ewma_alpha: 指数滑动平均系数
+        """
+        self.max_in_flight = max_in_flight
+        self.recover_in_flight = recover_in_flight
+        self.max_queue_wait = max_queue_wait
+        self.recover_queue_wait = recover_queue_wait
+        self.max_latency = max_latency
+        self.recover_latency = recover_latency
+        self.min_degraded_seconds = min_degraded_seconds
+        self.degraded_max_tokens = degraded_max_tokens
+        self.degraded_max_side = degraded_max_side
+        self.ewma_alpha = ewma_alpha
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._avg_queue_wait = 0.0
+        self._avg_latency = 0.0
+        self._degraded = False
+        self._degraded_since = 0.0
+        self._degrade_reason = ""
+        self._degraded_count = 0
+
+    @classmethod
+    def from_env(cls) -> "OverloadController":
+        """从环境变量创建控制器，未设置的项使用默认值"""
+        def _num(name, default, cast=float):
+            value = os.getenv(name)
+            return cast(value) if value else default
+
+        return cls(
+            max_in_flight=_num("OVERLOAD_MAX_IN_FLIGHT", 4, int),
+            recover_in_flight=_num("OVERLOAD_RECOVER_IN_FLIGHT", 2, int),
+            max_queue_wait=_num("OVERLOAD_MAX_QUEUE_WAIT", 2.0),
+            recover_queue_wait=_num("OVERLOAD_RECOVER_QUEUE_WAIT", 0.5),
+            max_latency=_num("OVERLOAD_MAX_LATENCY", 20.0),
+            recover_latency=_num("OVERLOAD_RECOVER_LATENCY", 8.0),
+            min_degraded_seconds=_num("OVERLOAD_MIN_DEGRADED_SECONDS", 10.0),
+            degraded_max_tokens=_num("OVERLOAD_DEGRADED_MAX_TOKENS", 400, int),
+            degraded_max_side=_num("OVERLOAD_DEGRADED_MAX_SIDE", 1280, int)
+        )
+
+    def enter(self):
+        """请求进入分析流程（交互请求从进入调度队列时算起）"""
+        with self._lock:
+            self._in_flight += 1
+            self._update_state()
+
+    def leave(self, latency: Optional[float] = None):
+        """
+        请求离开分析流程
+
+        Args:
+            latency: 本次分析耗时（秒），请求在排队时被取消等未执行分析的情况为None，不计入平均延迟
+        """
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+            if latency is not None:
+                self._avg_latency += self.ewma_alpha * (latency - self._avg_latency)
+            self._update_state()
+
+    def observe_queue_wait(self, wait: float):
+        """记录一次排队等待时间（秒）"""
+        with self._lock:
+            self._avg_queue_wait += self.ewma_alpha * (wait - self._avg_queue_wait)
+            self._update_state()
+
+    def _update_state(self):
+        """根据当前指标切换降级状态（调用方需持有锁）"""
+        now = time.monotonic()
+        if not self._degraded:
+            reason = ""
+            if self._in_flight > self.max_in_flight:
+                reason = f"并发数过高({self._in_flight})"
+            elif self._avg_queue_wait > self.max_queue_wait:
+                reason = f"排队等待过长({self._avg_queue_wait:.2f}秒)"
+            elif self._avg_latency > self.max_latency:
+                reason = f"分析延迟过高({self._avg_latency:.2f}秒)"
+
+            if reason:
+                self._degraded = True
+                self._degraded_since = now
+                self._degrade_reason = reason
+                ai_logger.warning(f"进入降级模式: {reason}")
+            return
+
+        recovered = (
+            self._in_flight <= self.recover_in_flight
+            and self._avg_queue_wait <= self.recover_queue_wait
+            and self._avg_latency <= self.recover_latency
+            and now - self._degraded_since >= self.min_degraded_seconds
+        )
+        if recovered:
+            self._degraded = False
+            self._degrade_reason = ""
+            ai_logger.info("负载回落，退出降级模式")
+
+    def plan(self, provider: str, available_models: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        获取当前请求的降级方案
+
+        Args:
+            provider: 当前AI提供商
+            available_models: WebConfig.get_available_models() 返回的模型目录
+
+        Returns:
+            降级方案字典，未降级时返回None
+        """
+        with self._lock:
+            self._update_state()
+            if not self._degraded:
+                return None
+            self._degraded_count += 1
+            reason = self._degrade_reason
+
+        model_config = available_models.get(provider, {})
+        return {
+            "model": model_config.get("degraded_model"),
+            "max_tokens": self.degraded_max_tokens,
+            "max_image_side": self.degraded_max_side,
+            "reason": reason
+        }
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取当前负载状态"""
+        with self._lock:
+            return {
+                "degraded": self._degraded,
+                "reason": self._degrade_reason,
+                "in_flight": self._in_flight,
+                "avg_queue_wait": round(self._avg_queue_wait, 3),
+                "avg_latency": round(self._avg_latency, 3),
+                "degraded_requests": self._degraded_count
+            }
+
+
+def downscale_image(image: Image.Image, max_side: int) -> Image.Image:
+    """
+    将图片缩小到最长边不超过max_side，未超过时原样返回
+
+    Args:
+        image: 原始图片
+        max_side: 最长边（像素）
+
+    Returns:
+        缩放后的图片（新对象，原图不变）
+    """
+    if max(image.size) <= max_side:
+        return image
+
+    image = image.copy()
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    return image
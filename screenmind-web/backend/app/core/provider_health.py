@@ -0,0 +1,163 @@
+"""
+提供商健康状态模块
+综合真实流量的成功率和后台廉价探测（与连接保活相同的轻量请求，不消耗token）判断当前提供商是否可用，
+结果缓存在内存中，存活/就绪检查只读内存，负载均衡器可以高频轮询
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional, Dict, Any
+from starlette.concurrency import run_in_threadpool
+from .connection_warmer import ping_client
+from .logger import ai_logger
+
+# 每个提供商保留的最近调用结果数
+CALL_HISTORY_SIZE = 100
+
+# 可以接收分析请求的状态（unknown表示还没有足够信号，不拒绝流量；replay表示回答来自录制文件，不需要提供商）
+READY_STATES = ("available", "degraded", "unknown", "replay")
+
+
+class ProviderHealth:
+    """提供商健康状态（真实流量成功率 + TTL缓存的后台探测）"""
+
+    def __init__(
+        self,
+        ai_service,
+        ttl: float = 60.0,
+        window: float = 300.0,
+        min_samples: int = 5,
+        min_success_rate: float = 0.5
+    ):
+        """
+        Args:
+            ai_service: AI服务实例
+            ttl: 探测结果的有效期（秒），期间有成功的真实调用时不再探测
+            window: 统计真实流量成功率的时间窗口（秒）
+            min_samples: 窗口内至少有多少次调用才以成功率为准
+            min_success_rate: 低于该成功率视为降级
+        """
+        self.ai_service = ai_service
+        self.ttl = ttl
+        self.window = window
+        self.min_samples = min_samples
+        self.min_success_rate = min_success_rate
+        self._lock = threading.Lock()
+        self._calls: Dict[str, deque] = {}
+        self._last_success: Dict[str, float] = {}
+        self._probes: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def from_env(cls, ai_service) -> "ProviderHealth":
+        """从环境变量创建"""
+        return cls(
+            ai_service,
+            ttl=float(os.getenv("HEALTH_PROBE_TTL", "60")),
+            window=float(os.getenv("HEALTH_WINDOW", "300"))
+        )
+
+    def record_call(self, provider: str, success: bool, latency: float):
+        """记录一次真实调用的结果（AI服务的call_observer回调）"""
+        now = time.monotonic()
+        with self._lock:
+            self._calls.setdefault(provider, deque(maxlen=CALL_HISTORY_SIZE)).append((now, success, latency))
+            if success:
+                self._last_success[provider] = now
+
+    def probe(self, force: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        探测当前提供商（结果未过期、或TTL内有成功的真实调用时跳过）
+
+        Returns:
+            本次探测结果，跳过时返回None
+        """
+        provider, client = self.ai_service.get_active_client()
+        if client is None:
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            last_probe = self._probes.get(provider, {}).get("checked_at_monotonic", float("-inf"))
+            last_success = self._last_success.get(provider, float("-inf"))
+        if not force and now - max(last_probe, last_success) < self.ttl:
+            return None
+
+        start = time.perf_counter()
+        try:
+            ping_client(provider, client)
+            ok, error = True, None
+        except Exception as e:
+            ok, error = False, str(e)
+            ai_logger.warning(f"{provider} 健康探测失败: {error}")
+
+        result = {
+            "ok": ok,
+            "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+            "error": error,
+            "checked_at": time.time(),
+            "checked_at_monotonic": time.monotonic()
+        }
+        with self._lock:
+            self._probes[provider] = result
+        return result
+
+    async def run(self):
+        """后台探测循环（在启动钩子中创建任务）"""
+        while True:
+            try:
+                await run_in_threadpool(self.probe)
+            except Exception as e:
+                ai_logger.error(f"健康探测异常: {e}")
+            await asyncio.sleep(self.ttl / 2)
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        当前提供商的健康状态（只读内存）
+
+        status取值: initializing / replay / unconfigured / available / degraded / unavailable / unknown
+        """
+        provider, client = self.ai_service.get_active_client()
+        now = time.monotonic()
+
+        with self._lock:
+            recent = [(ok, latency) for t, ok, latency in self._calls.get(provider, ()) if now - t <= self.window]
+            probe = self._probes.get(provider)
+
+        successes = sum(1 for ok, _ in recent if ok)
+        success_rate = successes / len(recent) if recent else None
+        probe_fresh = probe is not None and now - probe["checked_at_monotonic"] <= self.ttl * 2
+
+        if not self.ai_service.initialized:
+            status = "initializing"
+        elif self.ai_service.replaying:
+            status = "replay"
+        elif client is None:
+            status = "unconfigured"
+        elif len(recent) >= self.min_samples:
+            if success_rate >= self.min_success_rate:
+                status = "available"
+            else:
+                status = "degraded" if successes else "unavailable"
+        elif recent and recent[-1][0]:
+            status = "available"
+        elif probe_fresh:
+            status = "available" if probe["ok"] else "unavailable"
+        else:
+            status = "unknown"
+
+        return {
+            "status": status,
+            "provider": provider,
+            "traffic": {
+                "samples": len(recent),
+                "success_rate": round(success_rate, 3) if success_rate is not None else None,
+                "avg_latency_ms": round(sum(l for _, l in recent) / len(recent) * 1000, 1) if recent else None
+            },
+            "probe": {k: v for k, v in probe.items() if k != "checked_at_monotonic"} if probe else None
+        }
+
+    def is_ready(self) -> bool:
+        """是否可以接收分析请求（客户端已创建且提供商不是确定不可用）"""
+        return self.get_status()["status"] in READY_STATES
@@ -0,0 +1,240 @@
+"""
+本地题库模块
+用历史分析结果和导入的题库文件建立字符n-gram倒排索引，
+新题目与已知题目足够相似时直接返回已存的答案和解析，无需调用大模型
+"""
+import csv
+import io
+import json
+import math
+import re
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+from .ocr import normalize_question_text
+
+# 规范化时去掉的标点和符号（保留中日韩文字、字母、数字和运算符，否则"12+35"与"1+235"会被视为同一题）
+_PUNCTUATION = re.compile(r"[^\w一-鿿+\-*/=<>×÷^%.()]+")
+
+ENTRY_FIELDS = ("question_type", "question_content", "answer", "explanation")
+
+
+def normalize_question(text: str) -> str:
+    """规范化题目文本：全角转半角、小写、去空白和标点（保留运算符）"""
+    return _PUNCTUATION.sub("", normalize_question_text(text)).replace("_", "")
+
+
+class QuestionBank:
+    """
+    题库 - 字符n-gram倒排索引 + 前缀过滤的Jaccard相似度查找
+
+    对阈值t，相似度不低于t的题目必定与查询在"最稀有的 |q|-ceil(t*|q|)+1 个n-gram"
+    中至少有一个相同，因此查找时只需遍历少量倒排表，再对候选做精确校验
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        threshold: float = 0.8,
+        ngram: int = 3,
+        min_length: int = 6
+    ):
+        """
+        Args:
+            path: 题库持久化文件 (JSONL)，None表示仅在内存中
+            threshold: 命中所需的Jaccard相似度
+            ngram: 字符n-gram长度
+            min_length: 参与索引和查找的最短规范化文本长度
+        """
+        self.path = Path(path) if path else None
+        self.threshold = threshold
+        self.ngram = ngram
+        self.min_length = min_length
+
+        self._lock = threading.Lock()
+        # 追加写文件使用单独的锁，查找不会被磁盘I/O阻塞
+        self._file_lock = threading.Lock()
+        self._entries: List[Dict[str, Any]] = []
+        self._shingles: List[frozenset] = []
+        self._index: Dict[str, List[int]] = {}
+        self._by_text: Dict[str, int] = {}
+        self._hits = 0
+        self._misses = 0
+
+        if self.path and self.path.exists():
+            self._load()
+
+    def _shingle(self, normalized: str) -> frozenset:
+        """把规范化文本切成字符n-gram集合"""
+        n = self.ngram
+        if len(normalized) <= n:
+            return frozenset([normalized])
+        return frozenset(normalized[i:i + n] for i in range(len(normalized) - n + 1))
+
+    def _load(self):
+        """从持久化文件加载题库，文件中有重复或无效的行时压缩重写"""
+        lines = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                lines += 1
+                try:
+                    self._insert(json.loads(line))
+                except (ValueError, KeyError):
+                    continue
+        if lines > len(self._entries):
+            self._compact()
+
+    def _compact(self):
+        """按内存中的题目重写持久化文件（同一题目只保留最后一条）"""
+        temp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for entry in self._entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        temp_path.replace(self.path)
+
+    def _insert(self, entry: Dict[str, Any]) -> Optional[int]:
+        """插入或更新一条题目（调用方需持有锁或处于初始化阶段）"""
+        normalized = normalize_question(entry.get("question_content", ""))
+        if len(normalized) < self.min_length or not entry.get("answer"):
+            return None
+
+        existing = self._by_text.get(normalized)
+        if existing is not None:
+            self._entries[existing] = entry
+            return existing
+
+        entry_id = len(self._entries)
+        shingles = self._shingle(normalized)
+        self._entries.append(entry)
+        self._shingles.append(shingles)
+        self._by_text[normalized] = entry_id
+        for shingle in shingles:
+            self._index.setdefault(shingle, []).append(entry_id)
+        return entry_id
+
+    def add(self, result: Dict[str, Any], source: str = "analysis") -> bool:
+        """
+        把一次分析结果加入题库
+
+        Args:
+            result: 包含 question_type/question_content/answer/explanation 的字典
+            source: 来源标记 (analysis/import)
+
+        Returns:
+            是否加入成功
+        """
+        if result.get("question_type") in ("未识别", "解析失败", "无法识别"):
+            return False
+
+        entry = {field: str(result.get(field, "") or "") for field in ENTRY_FIELDS}
+        entry["source"] = source
+        entry["created_at"] = int(time.time())
+
+        with self._lock:
+            existing = self._by_text.get(normalize_question(entry["question_content"]))
+            previous = self._entries[existing] if existing is not None else None
+            if self._insert(entry) is None:
+                return False
+
+        # 同一题目重复出现时只在答案变化时追加，文件不会随重复分析无限增长
+        changed = previous is None or any(previous.get(field) != entry[field] for field in ("question_type", "answer"))
+        if self.path and changed:
+            with self._file_lock:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return True
+
+    def lookup(self, question_text: str) -> Optional[Dict[str, Any]]:
+        """
+        查找与题目文本足够相似的已知题目
+
+        Args:
+            question_text: 题目文本（OCR结果或题目内容）
+
+        Returns:
+            命中时返回已存题目（附带similarity），否则返回None
+        """
+        normalized = normalize_question(question_text)
+        if len(normalized) < self.min_length:
+            return None
+
+        with self._lock:
+            exact = self._by_text.get(normalized)
+            if exact is not None:
+                self._hits += 1
+                return {**self._entries[exact], "similarity": 1.0}
+
+            query = self._shingle(normalized)
+            # 前缀过滤：只遍历最稀有的若干个n-gram的倒排表
+            postings = sorted(
+                (self._index[s] for s in query if s in self._index),
+                key=len
+            )
+            prefix_size = len(query) - math.ceil(self.threshold * len(query)) + 1
+            candidates = Counter()
+            for posting in postings[:prefix_size]:
+                candidates.update(posting)
+
+            best_id, best_score = None, 0.0
+            for entry_id in candidates:
+                shingles = self._shingles[entry_id]
+                overlap = len(query & shingles)
+                score = overlap / (len(query) + len(shingles) - overlap)
+                if score > best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None or best_score < self.threshold:
+                self._misses += 1
+                return None
+
+            self._hits += 1
+            return {**self._entries[best_id], "similarity": round(best_score, 4)}
+
+    def import_file(self, content: bytes, filename: str) -> int:
+        """
+        导入题库文件
+
+        Args:
+            content: 文件内容，支持 .jsonl / .json（对象数组）/ .csv（带表头）
+            filename: 文件名，用于判断格式
+
+        Returns:
+            成功导入的题目数
+        """
+        text = content.decode('utf-8-sig')
+        suffix = Path(filename).suffix.lower()
+
+        if suffix == ".csv":
+            rows = list(csv.DictReader(io.StringIO(text)))
+        elif suffix == ".json":
+            rows = json.loads(text)
+            if not isinstance(rows, list):
+                raise ValueError("JSON题库文件必须是对象数组")
+        elif suffix == ".jsonl":
+            rows = [json.loads(line) for line in text.splitlines() if line.strip()]
+        else:
+            raise ValueError(f"不支持的题库文件格式: {suffix}")
+
+        imported = 0
+        for row in rows:
+            if isinstance(row, dict) and self.add(row, source="import"):
+                imported += 1
+        return imported
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取题库统计信息"""
+        with self._lock:
+            return {
+                "questions": len(self._entries),
+                "ngrams": len(self._index),
+                "threshold": self.threshold,
+                "hits": self._hits,
+                "misses": self._misses,
+                "path": str(self.path) if self.path else None
+            }
@@ -0,0 +1,232 @@
+"""
+响应层
+- FastJSONResponse: 有orjson时用orjson序列化（截图接口返回数MB的base64字符串）
+- CompressionMiddleware: 按Accept-Encoding协商brotli/gzip，只压缩超过阈值的完整响应
+- PrecompressedAsset / PrecompressedStaticFiles: 首页和静态文件预先压缩，
+  带ETag/Last-Modified，重复加载返回304
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+
+try:
+    import orjson
+except ImportError:  # 可选依赖，未安装时使用标准库json
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # 可选依赖，未安装时只协商gzip
+    brotli = None
+
+# 小于该大小的响应不压缩（压缩收益抵不过开销）
+DEFAULT_MINIMUM_SIZE = 1024
+
+# 超过该大小时在线程池中压缩，避免阻塞事件循环
+THREADPOOL_COMPRESS_SIZE = 256 * 1024
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+# 预压缩缓存的静态文件大小上限
+MAX_CACHED_ASSET_SIZE = 4 * 1024 * 1024
+
+COMPRESSIBLE_TYPES = (
+    "text/", "application/json", "application/javascript", "application/xml", "image/svg+xml"
+)
+
+
+class FastJSONResponse(JSONResponse):
+    """使用orjson序列化的JSON响应（未安装orjson时与标准JSONResponse输出一致）"""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def is_compressible(content_type: str) -> bool:
+    """内容类型是否值得压缩"""
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    根据Accept-Encoding选择编码
+
+    Returns:
+        "br" / "gzip"，都不接受时返回None
+    """
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """按指定编码压缩"""
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    """
+    响应压缩中间件（ASGI）
+
+    只压缩一次性发送完的响应体；流式响应（SSE、流式导出等）和已带Content-Encoding的响应原样透传
+    """
+
+    def __init__(self, app, minimum_size: int = DEFAULT_MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if "content-encoding" in headers or not is_compressible(headers.get("content-type", "")):
+                    passthrough = True
+                    await send(message)
+                else:
+                    # 等到响应体到达后再决定是否压缩
+                    start_message = message
+                return
+
+            if passthrough or start_message is None:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if more_body or len(body) < self.minimum_size:
+                # 流式响应或小响应：原样发送
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            if len(body) >= THREADPOOL_COMPRESS_SIZE:
+                compressed = await run_in_threadpool(compress, body, encoding)
+            else:
+                compressed = compress(body, encoding)
+
+            headers = MutableHeaders(raw=start_message["headers"])
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+class PrecompressedAsset:
+    """预先压缩好的静态内容，带ETag/Last-Modified，支持条件请求"""
+
+    def __init__(self, body: bytes, media_type: str, last_modified: Optional[float] = None):
+        """
+        Args:
+            body: 原始内容
+            media_type: Content-Type
+            last_modified: 最后修改时间戳，默认为当前时间
+        """
+        self.body = body
+        self.media_type = media_type
+        self.last_modified = formatdate(last_modified or time.time(), usegmt=True)
+        self.etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        self.encoded: Dict[str, bytes] = {"gzip": compress(body, "gzip")}
+        if brotli is not None:
+            self.encoded["br"] = compress(body, "br")
+
+    def _not_modified(self, headers: Headers) -> bool:
+        if_none_match = headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = [tag.strip()[2:] if tag.strip().startswith("W/") else tag.strip()
+                    for tag in if_none_match.split(",")]
+            return self.etag in tags or "*" in tags
+
+        if_modified_since = headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                return parsedate_to_datetime(if_modified_since) >= parsedate_to_datetime(self.last_modified)
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def response(self, headers: Headers, status_code: int = 200) -> Response:
+        """根据请求头返回304、压缩内容或原始内容"""
+        response_headers = {
+            "ETag": self.etag,
+            "Last-Modified": self.last_modified,
+            "Cache-Control": "no-cache",
+            "Vary": "Accept-Encoding"
+        }
+        if self._not_modified(headers):
+            return Response(status_code=304, headers=response_headers)
+
+        body = self.body
+        encoding = choose_encoding(headers.get("accept-encoding", ""))
+        if encoding in self.encoded and len(body) >= DEFAULT_MINIMUM_SIZE:
+            body = self.encoded[encoding]
+            response_headers["Content-Encoding"] = encoding
+        return Response(content=body, status_code=status_code, media_type=self.media_type, headers=response_headers)
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """静态文件：可压缩的文本类文件首次访问时压缩并缓存（按文件路径和mtime失效）"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._assets: Dict[str, Tuple[int, PrecompressedAsset]] = {}
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200) -> Response:
+        media_type = mimetypes.guess_type(str(full_path))[0] or "application/octet-stream"
+        if not is_compressible(media_type) or stat_result.st_size > MAX_CACHED_ASSET_SIZE:
+            return super().file_response(full_path, stat_result, scope, status_code)
+
+        key = str(full_path)
+        cached = self._assets.get(key)
+        if cached is None or cached[0] != stat_result.st_mtime_ns:
+            with open(full_path, "rb") as f:
+                body = f.read()
+            if media_type.startswith("text/"):
+                media_type += "; charset=utf-8"
+            cached = (stat_result.st_mtime_ns, PrecompressedAsset(body, media_type, stat_result.st_mtime))
+            self._assets[key] = cached
+        return cached[1].response(Headers(scope=scope), status_code)
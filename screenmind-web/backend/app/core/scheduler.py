@@ -0,0 +1,185 @@
+"""
+分析调度模块
+在AI服务前限制并发并按优先级调度：交互请求（扩展/网页截图）总是先于排队中的后台任务
+（批量上传、重新分析、历史回填）；同一优先级内按设备做加权公平排队，单个设备的大批量任务
+不会饿死其他设备
+
+所有方法都在事件循环线程中调用，不需要加锁
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, List, AsyncIterator
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+PRIORITIES = (INTERACTIVE, BACKGROUND)
+
+# 未提供设备ID的请求共用一个队列
+ANONYMOUS_DEVICE = "anonymous"
+
+# 设备完成标签表超过该大小时清理已经落后于虚拟时间的设备
+FLOW_TABLE_PRUNE_SIZE = 1024
+
+
+class _ClassQueue:
+    """一个优先级的等待队列（按开始标签排序的加权公平排队）"""
+
+    def __init__(self):
+        self.heap: List[tuple] = []
+        self.virtual_time = 0.0
+        self.flow_finish: Dict[str, float] = {}
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.avg_wait = 0.0
+        self.max_wait = 0.0
+
+    def tag(self, device_id: str, weight: float) -> tuple:
+        """计算新任务的(开始标签, 完成标签)：同一设备的任务依次排在它上一个任务之后"""
+        start = max(self.virtual_time, self.flow_finish.get(device_id, 0.0))
+        finish = start + 1.0 / weight
+        self.flow_finish[device_id] = finish
+        if len(self.flow_finish) > FLOW_TABLE_PRUNE_SIZE:
+            self.flow_finish = {d: f for d, f in self.flow_finish.items() if f > self.virtual_time}
+        return start, finish
+
+
+class AnalysisScheduler:
+    """带优先级和按设备加权公平排队的并发调度器"""
+
+    def __init__(self, max_concurrency: int = 4, interactive_reserved: int = 1, ewma_alpha: float = 0.2):
+        """
+        Args:
+            max_concurrency: 同时调用AI服务的最大请求数
+            interactive_reserved: 为交互请求保留的并发数，后台任务最多占用其余部分，
+                                  正在执行的后台任务无法抢占，保留名额保证交互请求不必等它们结束
+            ewma_alpha: 平均等待时间的指数滑动平均系数
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self.background_limit = max(1, self.max_concurrency - max(0, interactive_reserved))
+        self.ewma_alpha = ewma_alpha
+        self._queues = {priority: _ClassQueue() for priority in PRIORITIES}
+        self._sequence = itertools.count()
+
+    @classmethod
+    def from_env(cls) -> "AnalysisScheduler":
+        """从环境变量创建"""
+        return cls(
+            max_concurrency=int(os.getenv("SCHEDULER_MAX_CONCURRENCY", "4")),
+            interactive_reserved=int(os.getenv("SCHEDULER_INTERACTIVE_RESERVED", "1"))
+        )
+
+    def _running_total(self) -> int:
+        return sum(queue.running for queue in self._queues.values())
+
+    def _can_start(self, priority: str) -> bool:
+        if self._running_total() >= self.max_concurrency:
+            return False
+        return priority == INTERACTIVE or self._queues[BACKGROUND].running < self.background_limit
+
+    def _must_wait(self, priority: str) -> bool:
+        """新请求是否需要排队（同级或更高优先级已有排队的请求时不插队）"""
+        if self._queues[INTERACTIVE].waiting:
+            return True
+        if priority == BACKGROUND and self._queues[BACKGROUND].waiting:
+            return True
+        return not self._can_start(priority)
+
+    def _dispatch(self):
+        """有空闲并发时按优先级、再按开始标签唤醒等待的请求"""
+        while True:
+            for priority in PRIORITIES:
+                queue = self._queues[priority]
+                if queue.waiting and self._can_start(priority):
+                    break
+            else:
+                return
+
+            start, _, _, future = heapq.heappop(queue.heap)
+            if future.cancelled():
+                continue
+            queue.waiting -= 1
+            queue.virtual_time = max(queue.virtual_time, start)
+            queue.running += 1
+            future.set_result(None)
+
+    def _release(self, priority: str):
+        self._queues[priority].running -= 1
+        self._queues[priority].completed += 1
+        self._dispatch()
+
+    def _record_wait(self, priority: str, wait: float):
+        queue = self._queues[priority]
+        queue.avg_wait += self.ewma_alpha * (wait - queue.avg_wait)
+        queue.max_wait = max(queue.max_wait, wait)
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        priority: str = INTERACTIVE,
+        device_id: Optional[str] = None,
+        weight: float = 1.0
+    ) -> AsyncIterator[float]:
+        """
+        获取一个分析名额，退出时释放
+
+        Args:
+            priority: interactive 或 background
+            device_id: 公平排队的设备ID
+            weight: 设备权重，权重越大分到的名额越多
+
+        Yields:
+            在调度器中的排队等待时间（秒）
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"未知的优先级: {priority}")
+
+        queue = self._queues[priority]
+        queued_at = time.monotonic()
+        start, finish = queue.tag(device_id or ANONYMOUS_DEVICE, max(weight, 0.01))
+
+        if not self._must_wait(priority):
+            queue.virtual_time = max(queue.virtual_time, start)
+            queue.running += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(queue.heap, (start, finish, next(self._sequence), future))
+            queue.waiting += 1
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # 已分配名额后才被取消，归还名额
+                    self._release(priority)
+                else:
+                    future.cancel()
+                    queue.waiting -= 1
+                raise
+
+        wait = time.monotonic() - queued_at
+        self._record_wait(priority, wait)
+        try:
+            yield wait
+        finally:
+            self._release(priority)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各优先级的队列深度、执行数和等待时间"""
+        classes = {}
+        for priority, queue in self._queues.items():
+            classes[priority] = {
+                "queued": queue.waiting,
+                "running": queue.running,
+                "completed": queue.completed,
+                "avg_wait_ms": round(queue.avg_wait * 1000, 1),
+                "max_wait_ms": round(queue.max_wait * 1000, 1)
+            }
+        return {
+            "max_concurrency": self.max_concurrency,
+            "background_limit": self.background_limit,
+            "classes": classes
+        }
@@ -0,0 +1,157 @@
+"""
+进程内截屏模块
+直接把屏幕抓取到内存（Pillow ImageGrab：macOS/Windows原生接口，Linux走X11/XCB），
+不再经过子进程和临时文件；支持按区域、显示器和当前活动窗口截取
+"""
+import ctypes
+import io
+import os
+import platform
+import re
+import subprocess
+from typing import Optional, Tuple, List, Dict
+from PIL import Image
+
+try:
+    from PIL import ImageGrab
+except ImportError:  # 部分平台的Pillow不带ImageGrab
+    ImageGrab = None
+
+try:
+    import mss
+except ImportError:  # 可选依赖，用于跨平台枚举显示器
+    mss = None
+
+BBox = Tuple[int, int, int, int]
+
+# PNG编码压缩级别：截屏图片大、只在本机和模型之间传递，优先编码速度
+PNG_COMPRESS_LEVEL = 1
+
+
+def in_process_capture_available() -> bool:
+    """当前环境是否可以进程内截屏"""
+    if ImageGrab is None:
+        return False
+    if platform.system().lower() == 'linux':
+        # Linux下ImageGrab依赖X11显示（Xvfb也可以）
+        return bool(os.getenv("DISPLAY"))
+    return True
+
+
+def grab_screen(bbox: Optional[BBox] = None) -> Image.Image:
+    """
+    进程内抓取屏幕
+
+    Args:
+        bbox: 截取区域 (left, top, right, bottom)，None表示整个屏幕
+
+    Returns:
+        PIL图片
+    """
+    if ImageGrab is None:
+        raise RuntimeError("当前Pillow不支持ImageGrab")
+    if platform.system().lower() == 'windows':
+        # Windows下副屏坐标可能为负，需要在虚拟桌面范围内截取
+        return ImageGrab.grab(bbox=bbox, all_screens=True)
+    return ImageGrab.grab(bbox=bbox)
+
+
+def encode_png(image: Image.Image) -> bytes:
+    """把图片编码为PNG字节（使用快速压缩级别）"""
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', compress_level=PNG_COMPRESS_LEVEL)
+    return buffer.getvalue()
+
+
+def capture_png_in_process(bbox: Optional[BBox] = None) -> bytes:
+    """进程内截屏并编码为PNG字节（先裁剪再编码，耗时与区域大小成正比）"""
+    return encode_png(grab_screen(bbox))
+
+
+def list_monitors() -> List[Dict[str, int]]:
+    """
+    枚举显示器
+
+    优先使用mss（可选依赖），Linux下没有mss时解析 xrandr --listmonitors
+
+    Returns:
+        显示器列表，每项包含 index/left/top/width/height，index从1开始
+    """
+    if mss is not None:
+        with mss.mss() as sct:
+            return [
+                {"index": i, "left": m["left"], "top": m["top"], "width": m["width"], "height": m["height"]}
+                for i, m in enumerate(sct.monitors[1:], start=1)
+            ]
+
+    if platform.system().lower() == 'linux':
+        try:
+            result = subprocess.run(['xrandr', '--listmonitors'], capture_output=True, text=True, timeout=5)
+        except (FileNotFoundError, subprocess.TimeoutExpired):
+            return []
+        # 例: " 0: +*eDP-1 2560/309x1600/174+0+0  eDP-1"
+        pattern = re.compile(r"(\d+)/\d+x(\d+)/\d+\+(-?\d+)\+(-?\d+)")
+        monitors = []
+        for match in pattern.finditer(result.stdout):
+            width, height, left, top = (int(v) for v in match.groups())
+            monitors.append({
+                "index": len(monitors) + 1, "left": left, "top": top, "width": width, "height": height
+            })
+        return monitors
+
+    return []
+
+
+def get_monitor_bbox(index: int) -> BBox:
+    """获取指定显示器（从1开始）的截取区域"""
+    monitors = list_monitors()
+    if not monitors:
+        raise ValueError("无法枚举显示器，请安装mss (pip install mss)")
+    for monitor in monitors:
+        if monitor["index"] == index:
+            return (
+                monitor["left"], monitor["top"],
+                monitor["left"] + monitor["width"], monitor["top"] + monitor["height"]
+            )
+    raise ValueError(f"显示器 {index} 不存在，共 {len(monitors)} 个显示器")
+
+
+def get_active_window_bbox() -> BBox:
+    """获取当前活动窗口的截取区域"""
+    system = platform.system().lower()
+
+    if system == 'windows':
+        class RECT(ctypes.Structure):
+            _fields_ = [("left", ctypes.c_long), ("top", ctypes.c_long),
+                        ("right", ctypes.c_long), ("bottom", ctypes.c_long)]
+        rect = RECT()
+        hwnd = ctypes.windll.user32.GetForegroundWindow()
+        if not hwnd or not ctypes.windll.user32.GetWindowRect(hwnd, ctypes.byref(rect)):
+            raise ValueError("无法获取当前活动窗口")
+        return (rect.left, rect.top, rect.right, rect.bottom)
+
+    if system == 'darwin':
+        script = ('tell application "System Events" to get {position, size} of front window '
+                  'of (first application process whose frontmost is true)')
+        result = subprocess.run(['osascript', '-e', script], capture_output=True, text=True, timeout=5)
+        values = [int(v) for v in re.findall(r"-?\d+", result.stdout)]
+        if result.returncode != 0 or len(values) != 4:
+            raise ValueError(f"无法获取当前活动窗口: {result.stderr.strip()}")
+        left, top, width, height = values
+        return (left, top, left + width, top + height)
+
+    if system == 'linux':
+        try:
+            result = subprocess.run(
+                ['xdotool', 'getactivewindow', 'getwindowgeometry', '--shell'],
+                capture_output=True, text=True, timeout=5
+            )
+        except FileNotFoundError:
+            raise ValueError("获取活动窗口需要安装xdotool")
+        geometry = dict(re.findall(r"(\w+)=(-?\d+)", result.stdout))
+        if result.returncode != 0 or not {"X", "Y", "WIDTH", "HEIGHT"} <= geometry.keys():
+            raise ValueError(f"无法获取当前活动窗口: {result.stderr.strip()}")
+        left, top = int(geometry["X"]), int(geometry["Y"])
+        return (left, top, left + int(geometry["WIDTH"]), top + int(geometry["HEIGHT"]))
+
+    raise ValueError(f"不支持的操作系统: {system}")
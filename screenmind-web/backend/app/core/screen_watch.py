@@ -0,0 +1,75 @@
+"""
+屏幕监视模块
+按固定间隔截屏，用缩略图分块哈希与上一帧比较，只有画面变化面积超过阈值
+并稳定下来后才触发分析
+"""
+import json
+from typing import Optional, List
+from PIL import Image
+
+# 比较用的缩略图宽度和分块网格
+SAMPLE_WIDTH = 256
+GRID_COLUMNS = 16
+GRID_ROWS = 16
+# 灰度量化位移：忽略抗锯齿和压缩带来的细微抖动
+QUANTIZE_SHIFT = 4
+
+
+class FrameDiffer:
+    """帧差检测器 - 记住上一帧的分块哈希，返回新帧的变化比例"""
+
+    def __init__(self, columns: int = GRID_COLUMNS, rows: int = GRID_ROWS):
+        self.columns = columns
+        self.rows = rows
+        self._previous: Optional[List[int]] = None
+
+    def tile_hashes(self, image: Image.Image) -> List[int]:
+        """
+        计算图片的分块哈希
+
+        Args:
+            image: 截屏图片
+
+        Returns:
+            按行优先排列的每个分块的哈希值
+        """
+        sample_height = max(self.rows, round(image.height * SAMPLE_WIDTH / max(image.width, 1)))
+        gray = image.resize((SAMPLE_WIDTH, sample_height), Image.BOX, reducing_gap=2.0).convert('L')
+        gray = gray.point(lambda v: v >> QUANTIZE_SHIFT)
+        pixels = gray.tobytes()
+
+        tile_width = SAMPLE_WIDTH // self.columns
+        hashes = []
+        for row in range(self.rows):
+            top = sample_height * row // self.rows
+            bottom = sample_height * (row + 1) // self.rows
+            for column in range(self.columns):
+                left = column * tile_width
+                tile = b"".join(
+                    pixels[y * SAMPLE_WIDTH + left:y * SAMPLE_WIDTH + left + tile_width]
+                    for y in range(top, bottom)
+                )
+                hashes.append(hash(tile))
+        return hashes
+
+    def update(self, image: Image.Image) -> float:
+        """
+        与上一帧比较并记住当前帧
+
+        Args:
+            image: 新截取的帧
+
+        Returns:
+            变化分块占比 (0-1)，第一帧返回1.0
+        """
+        hashes = self.tile_hashes(image)
+        previous, self._previous = self._previous, hashes
+        if previous is None or len(previous) != len(hashes):
+            return 1.0
+        changed = sum(1 for old, new in zip(previous, hashes) if old != new)
+        return changed / len(hashes)
+
+
+def format_sse(event: str, data: dict) -> str:
+    """格式化一条Server-Sent Events消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
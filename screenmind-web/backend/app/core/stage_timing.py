@@ -0,0 +1,61 @@
+"""
+分阶段计时模块
+记录一次分析请求各阶段（读取、解码、预处理、排队、模型调用、保存原图、写入历史）的耗时，
+以 Server-Timing 响应头返回，浏览器开发者工具和压测脚本可以直接读取
+"""
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Iterator, Optional
+
+
+def format_server_timing(stages: Dict[str, float], description: Optional[str] = None) -> str:
+    """
+    格式化 Server-Timing 响应头
+
+    Args:
+        stages: 阶段名 -> 耗时（秒）
+        description: 附加在每个阶段上的说明（只能包含ASCII字符）
+    """
+    desc = f';desc="{description}"' if description else ""
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}{desc}" for name, seconds in stages.items())
+
+
+class StageTimings:
+    """一次请求各阶段的耗时（同一阶段多次计时时累加）"""
+
+    def __init__(self):
+        self._started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + max(0.0, seconds)
+
+    @contextmanager
+    def measure(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def total(self) -> float:
+        """从创建到现在的总耗时（秒）"""
+        return time.perf_counter() - self._started
+
+    def header(self) -> str:
+        """Server-Timing 响应头（各阶段加上总耗时）"""
+        return format_server_timing({**self.stages, "total": self.total()})
+
+    @staticmethod
+    def mean_header(timings: List["StageTimings"], total: float) -> str:
+        """多张图片（批量分析）各阶段的平均耗时，以及整个请求的总耗时"""
+        sums: Dict[str, float] = {}
+        for item in timings:
+            for stage, seconds in item.stages.items():
+                sums[stage] = sums.get(stage, 0.0) + seconds
+        count = max(1, len(timings))
+        header = format_server_timing(
+            {stage: seconds / count for stage, seconds in sums.items()},
+            f"mean of {len(timings)}"
+        )
+        return ", ".join(filter(None, [header, format_server_timing({"total": total})]))
@@ -0,0 +1,181 @@
+"""
+结构化输出模块
+声明题目分析结果的JSON Schema（OpenAI兼容接口的response_format、Gemini的response_schema），
+提供单次校验解析和廉价的本地JSON修复
+"""
+import ast
+import json
+import re
+from typing import Optional, Dict, Any
+
+ANSWER_FIELDS = ("question_type", "question_content", "answer", "explanation")
+
+QUESTION_TYPES = ["选择题", "填空题", "判断题", "其他", "无法识别"]
+
+ANSWER_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "question_type": {"type": "string", "enum": QUESTION_TYPES},
+        "question_content": {"type": "string"},
+        "answer": {"type": "string"},
+        "explanation": {"type": "string"}
+    },
+    "required": list(ANSWER_FIELDS),
+    "additionalProperties": False
+}
+
+# Gemini的response_schema是OpenAPI子集，不支持additionalProperties
+GEMINI_SCHEMA = {key: value for key, value in ANSWER_SCHEMA.items() if key != "additionalProperties"}
+
+# 本地校验时必须有的字段，其余字段缺失（例如解析被max_tokens截断）时取空字符串
+REQUIRED_FIELDS = ("answer",)
+
+_CODE_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+def get_response_format(mode: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    构造OpenAI兼容接口的response_format参数
+
+    Args:
+        mode: 提供商支持的结构化方式 (json_schema/json_object)，None表示不支持
+
+    Returns:
+        response_format字典，不支持时返回None
+    """
+    if mode == "json_schema":
+        return {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "question_analysis",
+                "schema": ANSWER_SCHEMA,
+                "strict": True
+            }
+        }
+    if mode == "json_object":
+        return {"type": "json_object"}
+    return None
+
+
+def get_generation_config(mode: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    构造Gemini generation_config中的原生JSON输出参数
+
+    Args:
+        mode: 提供商支持的结构化方式 (response_schema)，None表示不支持
+
+    Returns:
+        要合并进generation_config的字典，不支持时返回None
+    """
+    if mode == "response_schema":
+        return {"response_mime_type": "application/json", "response_schema": GEMINI_SCHEMA}
+    return None
+
+
+def parse_structured_response(response: str) -> Optional[Dict[str, str]]:
+    """
+    解析并校验结构化JSON响应
+
+    先直接json.loads，失败后做一次本地修复再解析；
+    两次都失败或校验不通过时返回None，由调用方回退到文本解析器
+
+    Args:
+        response: AI原始响应
+
+    Returns:
+        包含四个字段的字典（只有answer是必需的，其余缺失时为空字符串），失败返回None
+    """
+    try:
+        data = json.loads(response)
+    except ValueError:
+        data = _load_repaired(response)
+
+    return _validate(data)
+
+
+def repair_json(text: str) -> str:
+    """
+    修复常见的"差一点"的JSON：代码块包裹、前后多余文字、尾随逗号、被截断的结尾
+
+    Args:
+        text: 原始文本
+
+    Returns:
+        修复后的文本（不保证一定合法）
+    """
+    text = _CODE_FENCE.sub("", text.strip())
+
+    start = text.find("{")
+    if start == -1:
+        return text
+    end = text.rfind("}")
+    text = text[start:end + 1] if end > start else text[start:]
+
+    text = _TRAILING_COMMA.sub(r"\1", text)
+    return _close_truncated(text)
+
+
+def _close_truncated(text: str) -> str:
+    """补齐被max_tokens截断的字符串引号和括号"""
+    depth = 0
+    in_string = False
+    escaped = False
+    for char in text:
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == '"':
+            in_string = not in_string
+        elif not in_string:
+            if char == "{":
+                depth += 1
+            elif char == "}":
+                depth -= 1
+
+    if in_string:
+        text += '"'
+    if depth > 0:
+        text = text.rstrip().rstrip(",") + "}" * depth
+    return text
+
+
+def _load_repaired(response: str) -> Any:
+    """对修复后的文本再解析一次，最后尝试Python字面量（单引号JSON）"""
+    repaired = repair_json(response)
+    try:
+        return json.loads(repaired)
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(repaired)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        return None
+
+
+def _validate(data: Any) -> Optional[Dict[str, str]]:
+    """
+    校验并规范化字段
+
+    只要求有答案：被max_tokens截断的回答通常只丢了最后的解析，答案仍然可用
+    """
+    if not isinstance(data, dict):
+        return None
+    if any(data.get(field) is None for field in REQUIRED_FIELDS) and data.get("question_type") != "无法识别":
+        return None
+
+    parsed = {}
+    for field in ANSWER_FIELDS:
+        value = data.get(field)
+        if value is None:
+            value = ""
+        if isinstance(value, list):
+            value = "\n".join(str(item) for item in value)
+        parsed[field] = str(value).strip()
+
+    if parsed["question_type"] not in QUESTION_TYPES:
+        parsed["question_type"] = "其他"
+    if not parsed["answer"] and parsed["question_type"] != "无法识别":
+        return None
+    return parsed
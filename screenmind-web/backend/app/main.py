@@ -1,10 +1,11 @@
 """
 ScreenMind Web版本 - FastAPI后端
 """
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse
+from starlette.concurrency import run_in_threadpool
+import asyncio
 import uvicorn
 import os
 from typing import Optional
@@ -13,8 +14,19 @@ import io
 from PIL import Image
 from dotenv import load_dotenv
 # 导入API路由
-from .api import analyze, config, health, screenshot
-from .core.ai_service import AIService, QuestionAnalyzer
+from .api import analyze, config, health, history, images, miniprogram, screenshot, ws, question_bank as question_bank_api
+from .core.ai_service import AIService, QuestionAnalyzer, WebConfig
+from .core.config_store import ConfigStore
+from .core.connection_warmer import ConnectionWarmer
+from .core.provider_health import ProviderHealth
+from .core.cassette import ProviderCassette, PASSTHROUGH
+from .core.notification_hub import NotificationHub
+from .core.blob_store import BlobStore
+from .core.history_store import HistoryStore
+from .core.responses import FastJSONResponse, CompressionMiddleware, PrecompressedAsset, PrecompressedStaticFiles
+from .core.overload import OverloadController
+from .core.scheduler import AnalysisScheduler
+from .core.question_bank import QuestionBank
 # 导入日志配置
 from .core.logger import app_logger, disable_uvicorn_console_logging
 
@@ -29,9 +41,13 @@ app_logger.info("ScreenMind应用启动中...")
 app = FastAPI(
     title="ScreenMind API",
     description="智能截图答题助手 - Web版本",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
 
+# 响应压缩（按Accept-Encoding协商brotli/gzip，只压缩超过阈值的响应）
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1024")))
+
 # 配置CORS
 app.add_middleware(
     CORSMiddleware,
@@ -43,17 +59,117 @@ app.add_middleware(
 
 # 挂载静态文件目录 (如果存在)
 try:
-    app.mount("/static", StaticFiles(directory="static"), name="static")
+    app.mount("/static", PrecompressedStaticFiles(directory="static"), name="static")
 except RuntimeError:
     pass  # static目录不存在时忽略
 
+# 共享配置存储：多个worker共用同一份模型和密钥配置
+ENV_PROVIDER, ENV_MODEL = os.getenv("AI_PROVIDER"), os.getenv("AI_MODEL")
+
+
+def _first_model(provider: str) -> Optional[str]:
+    models = WebConfig.get_available_models().get(provider, {}).get("models", [])
+    return models[0] if models else None
+
+
+config_store = ConfigStore(
+    os.getenv("CONFIG_STORE_PATH", "data/config.db"),
+    defaults={
+        "current_provider": ENV_PROVIDER or "qwen",
+        "current_model": ENV_MODEL or _first_model(ENV_PROVIDER or "qwen"),
+        "api_keys": {}
+    }
+)
+CONFIG_POLL_INTERVAL = float(os.getenv("CONFIG_POLL_INTERVAL", "1.0"))
+
+
+def _apply_env_model_overrides():
+    """显式设置的 AI_PROVIDER/AI_MODEL 在每次启动时覆盖存储的模型配置；未设置时以存储的配置（界面上的切换）为准"""
+    if not ENV_PROVIDER and not ENV_MODEL:
+        return
+    stored = config_store.snapshot()
+    env_model = ENV_MODEL
+    if not env_model and ENV_PROVIDER != stored["current_provider"]:
+        # 只换提供商时存储的模型属于原提供商，改用新提供商的第一个模型
+        env_model = _first_model(ENV_PROVIDER)
+    applied = config_store.apply_overrides(current_provider=ENV_PROVIDER, current_model=env_model)
+    if (applied["current_provider"], applied["current_model"]) != (stored["current_provider"], stored["current_model"]):
+        app_logger.info(
+            f"环境变量覆盖存储的模型配置: {stored['current_provider']}:{stored['current_model']} -> "
+            f"{applied['current_provider']}:{applied['current_model']}"
+        )
+
+
+_apply_env_model_overrides()
+initial_config = config_store.load()
+
 # 全局AI服务实例
 app_logger.info("初始化AI服务...")
-ai_service = AIService()
-question_analyzer = QuestionAnalyzer(ai_service)
+ai_service = AIService(
+    initial_config["current_provider"],
+    initial_config["current_model"],
+    initial_config["api_keys"],
+    lazy=True
+)
+# 连接预热：客户端替换上线前先建立好连接，空闲时定期保活
+connection_warmer = ConnectionWarmer.from_env(ai_service)
+if connection_warmer.enabled:
+    ai_service.client_warmer = connection_warmer.warm
+# 提供商健康状态：真实调用结果 + 后台廉价探测
+provider_health = ProviderHealth.from_env(ai_service)
+ai_service.call_observer = provider_health.record_call
+# 提供商调用录制/回放：复现线上慢请求、离线回归测试
+provider_cassette = None
+if os.getenv("CASSETTE_MODE", PASSTHROUGH).lower() != PASSTHROUGH:
+    provider_cassette = ProviderCassette.from_env()
+    ai_service.cassette = provider_cassette
+    app_logger.warning(f"提供商调用录制已启用: {provider_cassette.mode} ({provider_cassette.path})")
+# 题库查找依赖OCR识别出的题目文字，默认只在启用OCR优先时开启
+ocr_text_first = os.getenv("OCR_TEXT_FIRST", "false").lower() == "true"
+question_bank = None
+if os.getenv("QUESTION_BANK_ENABLED", str(ocr_text_first)).lower() == "true":
+    question_bank = QuestionBank(
+        path=os.getenv("QUESTION_BANK_PATH", "data/question_bank.jsonl"),
+        threshold=float(os.getenv("QUESTION_BANK_THRESHOLD", "0.8"))
+    )
+question_analyzer = QuestionAnalyzer(
+    ai_service,
+    structured_output=os.getenv("STRUCTURED_OUTPUT", "false").lower() == "true",
+    ocr_text_first=ocr_text_first,
+    ocr_min_confidence=float(os.getenv("OCR_MIN_CONFIDENCE", "80")),
+    question_bank=question_bank
+)
+overload_controller = OverloadController.from_env()
+# 分析调度：交互请求优先于后台批量任务，同一优先级内按设备公平排队
+analysis_scheduler = AnalysisScheduler.from_env()
+# 小程序通知中心：分析完成后推送给已绑定设备（长轮询/SSE）
+notification_hub = NotificationHub.from_env()
+# 图片存储：按内容哈希保存分析过的原图，重新分析时按图片ID引用
+blob_store = None
+if os.getenv("BLOB_STORE_ENABLED", "true").lower() == "true":
+    blob_store = BlobStore.from_env()
+# 分析历史：每次分析结果写入SQLite并建立全文索引
+history_store = None
+if os.getenv("HISTORY_ENABLED", "true").lower() == "true":
+    history_store = HistoryStore(os.getenv("HISTORY_PATH", "data/history.db"))
 
 # 将AI服务实例传递给analyze模块
 analyze.question_analyzer = question_analyzer
+analyze.overload_controller = overload_controller
+analyze.analysis_scheduler = analysis_scheduler
+analyze.blob_store = blob_store
+images.blob_store = blob_store
+analyze.history_store = history_store
+history.history_store = history_store
+health.overload_controller = overload_controller
+health.analysis_scheduler = analysis_scheduler
+health.connection_warmer = connection_warmer
+health.provider_health = provider_health
+health.provider_cassette = provider_cassette
+config.config_store = config_store
+config.ai_service = ai_service
+question_bank_api.question_bank = question_bank
+miniprogram.notification_hub = notification_hub
 app_logger.info("AI服务初始化完成")
 
 # 注册API路由
@@ -62,11 +178,55 @@ app.include_router(health.router, prefix="/api/v1", tags=["health"])
 app.include_router(analyze.router, prefix="/api/v1", tags=["analyze"])
 app.include_router(config.router, prefix="/api/v1", tags=["config"])
 app.include_router(screenshot.router, prefix="/api/v1", tags=["screenshot"])
+app.include_router(question_bank_api.router, prefix="/api/v1", tags=["question-bank"])
+app.include_router(ws.router, prefix="/api/v1", tags=["websocket"])
+app.include_router(images.router, prefix="/api/v1", tags=["images"])
+app.include_router(history.router, prefix="/api/v1", tags=["history"])
+app.include_router(miniprogram.router, prefix="/api/v1", tags=["miniprogram"])
 app_logger.info("路由注册完成")
 
+@app.on_event("startup")
+async def probe_capture_backends():
+    """启动时在后台探测截屏后端的可用性（不截屏），不阻塞服务启动"""
+    asyncio.create_task(run_in_threadpool(screenshot.capture_registry.probe))
+
+@app.on_event("startup")
+async def initialize_ai_client():
+    """在后台导入提供商SDK、创建客户端并预热连接，不阻塞服务启动（首个请求到达时若尚未完成会等待同一次初始化）"""
+    async def initialize():
+        await run_in_threadpool(ai_service.ensure_initialized)
+        # 客户端就绪后开始后台健康探测
+        await provider_health.run()
+
+    asyncio.create_task(initialize())
+    asyncio.create_task(connection_warmer.keep_alive())
+
+@app.on_event("startup")
+async def watch_shared_config():
+    """定期检查共享配置版本（只比较文件mtime），其他worker修改配置后热切换客户端"""
+    async def watch():
+        while True:
+            await asyncio.sleep(CONFIG_POLL_INTERVAL)
+            try:
+                snapshot = config_store.poll()
+                if snapshot:
+                    app_logger.info(
+                        f"共享配置已更新到版本 {snapshot['version']}: "
+                        f"{snapshot['current_provider']}:{snapshot['current_model']}"
+                    )
+                    await run_in_threadpool(config.apply_config_snapshot, snapshot)
+            except Exception as e:
+                app_logger.error(f"同步共享配置失败: {e}")
+
+    asyncio.create_task(watch())
+
 @app.get("/", response_class=HTMLResponse)
-async def read_root():
-    """根路径返回简单的欢迎页面"""
+async def read_root(request: Request):
+    """根路径返回简单的欢迎页面（预压缩，带ETag，重复加载返回304）"""
+    return ROOT_PAGE.response(request.headers)
+
+def _root_page_html() -> str:
+    """首页HTML"""
     return """
     <!DOCTYPE html>
     <html>
@@ -254,6 +414,9 @@ async def read_root():
                 <button onclick="startScreenCapture()" class="screenshot-btn" id="screenshotBtn">
                     📸 开始截屏
                 </button>
+                <button onclick="toggleWatchMode()" class="screenshot-btn" id="watchBtn">
+                    👀 监视模式
+                </button>
             </div>
 
             <div class="upload-area" onclick="document.getElementById('fileInput').click()">
@@ -292,6 +455,33 @@ async def read_root():
                 }
             });
 
+            // 渲染分析结果
+            function renderResult(data) {
+                document.getElementById('result').innerHTML = `
+                    <h3>📝 分析结果</h3>
+                    <div style="background: linear-gradient(45deg, #e8f5e8, #f0f8f0); padding: 15px; border-radius: 10px; margin: 10px 0;">
+                        <p><strong>🏷️ 题目类型：</strong><span style="color: #28a745; font-weight: bold;">${data.question_type}</span></p>
+                    </div>
+                    <div style="background: linear-gradient(45deg, #e3f2fd, #f0f8ff); padding: 15px; border-radius: 10px; margin: 10px 0;">
+                        <p><strong>📋 题目内容：</strong></p>
+                        <div style="background: white; padding: 10px; border-radius: 5px; margin-top: 5px;">${data.question_content}</div>
+                    </div>
+                    <div style="background: linear-gradient(45deg, #fff3cd, #fefefe); padding: 15px; border-radius: 10px; margin: 10px 0;">
+                        <p><strong>✅ 正确答案：</strong></p>
+                        <div style="background: #28a745; color: white; padding: 10px; border-radius: 5px; margin-top: 5px; font-weight: bold;">${data.answer}</div>
+                    </div>
+                    <div style="background: linear-gradient(45deg, #f8f9fa, #ffffff); padding: 15px; border-radius: 10px; margin: 10px 0;">
+                        <p><strong>💡 详细解析：</strong></p>
+                        <div style="background: white; padding: 10px; border-radius: 5px; margin-top: 5px; line-height: 1.6;">${data.explanation}</div>
+                    </div>
+                    <p style="text-align: center; color: #666; font-size: 14px; margin-top: 15px;">
+                        ⏱️ 分析耗时：${data.analysis_time}秒 | 🚀 ScreenMind AI
+                    </p>
+                    ${data.degraded ? `<p style="text-align: center; color: #e67e22; font-size: 13px;">⚠️ 服务繁忙，本次使用轻量模型快速作答（${data.degrade_reason}）</p>` : ''}
+                `;
+                document.getElementById('result').classList.remove('hidden');
+            }
+
             // 截屏功能 - 使用后端API
             async function startScreenCapture() {
                 if (isCapturing) return;
@@ -302,47 +492,26 @@ async def read_root():
                     document.getElementById('screenshotBtn').textContent = '📸 截屏中...';
                     document.getElementById('screenshotBtn').disabled = true;
 
-                    // 调用后端截屏API
-                    const response = await fetch('/api/v1/screenshot', {
-                        method: 'POST',
-                        headers: {
-                            'Content-Type': 'application/json'
-                        }
+                    // 截屏并直接在后端分析，图片不再经过浏览器中转
+                    updateStatus('🤖 截屏并分析中...', true);
+                    const response = await fetch('/api/v1/screenshot/analyze?thumbnail=true', {
+                        method: 'POST'
                     });
                     
                     if (!response.ok) {
                         const errorData = await response.json();
-                        throw new Error(errorData.detail || `截屏失败: ${response.status}`);
+                        throw new Error(errorData.detail || `截屏分析失败: ${response.status}`);
                     }
                     
                     const result = await response.json();
                     
                     if (result.success) {
-                        updateStatus('✅ 截屏完成');
-                        
-                        // 将base64图片数据转换为Blob
-                        const base64Data = result.data.image;
-                        const byteCharacters = atob(base64Data);
-                        const byteNumbers = new Array(byteCharacters.length);
-                        for (let i = 0; i < byteCharacters.length; i++) {
-                            byteNumbers[i] = byteCharacters.charCodeAt(i);
-                        }
-                        const byteArray = new Uint8Array(byteNumbers);
-                        const blob = new Blob([byteArray], { type: 'image/png' });
-                        
-                        // 创建文件对象
-                        const timestamp = new Date().toISOString().replace(/[:.]/g, '-');
-                        selectedFile = new File([blob], `screenshot-${timestamp}.png`, { type: 'image/png' });
-                        
-                        document.querySelector('.upload-area p').innerHTML = '✅ 截屏完成: ' + selectedFile.name + '<br><small>图片已准备好进行分析</small>';
-                        document.getElementById('analyzeBtn').disabled = false;
-                        
-                        // 自动开始分析
-                        setTimeout(() => {
-                            analyzeImage();
-                        }, 500);
+                        updateStatus('✅ 分析完成');
+                        document.querySelector('.upload-area p').innerHTML =
+                            `✅ 截屏完成<br><img src="${result.data.thumbnail}" style="max-width: 100%; border-radius: 8px; margin-top: 8px;">`;
+                        renderResult(result.data);
                     } else {
-                        throw new Error(result.message || '截屏失败');
+                        throw new Error(result.message || '截屏分析失败');
                     }
                     
                 } catch (error) {
@@ -367,6 +536,36 @@ async def read_root():
                 }
             }
 
+            // 监视模式 - 画面变化时自动分析并推送结果
+            let watchSource = null;
+            function toggleWatchMode() {
+                const button = document.getElementById('watchBtn');
+                if (watchSource) {
+                    watchSource.close();
+                    watchSource = null;
+                    button.textContent = '👀 监视模式';
+                    updateStatus('🟢 就绪');
+                    return;
+                }
+
+                watchSource = new EventSource('/api/v1/screenshot/watch?interval=1');
+                button.textContent = '⏹️ 停止监视';
+                updateStatus('👀 监视屏幕中...', true);
+
+                watchSource.addEventListener('change', () => {
+                    updateStatus('🔄 检测到画面变化...', true);
+                });
+                watchSource.addEventListener('result', (event) => {
+                    updateStatus('👀 监视屏幕中...', true);
+                    renderResult(JSON.parse(event.data));
+                });
+                watchSource.addEventListener('error', (event) => {
+                    if (event.data) {
+                        updateStatus('❌ ' + JSON.parse(event.data).message);
+                    }
+                });
+            }
+
             // 快捷键监听
             document.addEventListener('keydown', function(e) {
                 // Ctrl+Shift+S (Windows/Linux) 或 Cmd+Shift+S (Mac)
@@ -396,28 +595,7 @@ async def read_root():
                     if (response.ok) {
                         const result = await response.json();
                         updateStatus('✅ 分析完成');
-                        document.getElementById('result').innerHTML = `
-                            <h3>📝 分析结果</h3>
-                            <div style="background: linear-gradient(45deg, #e8f5e8, #f0f8f0); padding: 15px; border-radius: 10px; margin: 10px 0;">
-                                <p><strong>🏷️ 题目类型：</strong><span style="color: #28a745; font-weight: bold;">${result.data.question_type}</span></p>
-                            </div>
-                            <div style="background: linear-gradient(45deg, #e3f2fd, #f0f8ff); padding: 15px; border-radius: 10px; margin: 10px 0;">
-                                <p><strong>📋 题目内容：</strong></p>
-                                <div style="background: white; padding: 10px; border-radius: 5px; margin-top: 5px;">${result.data.question_content}</div>
-                            </div>
-                            <div style="background: linear-gradient(45deg, #fff3cd, #fefefe); padding: 15px; border-radius: 10px; margin: 10px 0;">
-                                <p><strong>✅ 正确答案：</strong></p>
-                                <div style="background: #28a745; color: white; padding: 10px; border-radius: 5px; margin-top: 5px; font-weight: bold;">${result.data.answer}</div>
-                            </div>
-                            <div style="background: linear-gradient(45deg, #f8f9fa, #ffffff); padding: 15px; border-radius: 10px; margin: 10px 0;">
-                                <p><strong>💡 详细解析：</strong></p>
-                                <div style="background: white; padding: 10px; border-radius: 5px; margin-top: 5px; line-height: 1.6;">${result.data.explanation}</div>
-                            </div>
-                            <p style="text-align: center; color: #666; font-size: 14px; margin-top: 15px;">
-                                ⏱️ 分析耗时：${result.data.analysis_time}秒 | 🚀 ScreenMind AI
-                            </p>
-                        `;
-                        document.getElementById('result').classList.remove('hidden');
+                        renderResult(result.data);
                     } else {
                         // 处理HTTP错误状态码
                         const errorData = await response.json();
@@ -459,6 +637,9 @@ async def read_root():
     </html>
     """
 
+# 首页内容在启动时生成并压缩一次
+ROOT_PAGE = PrecompressedAsset(_root_page_html().encode("utf-8"), "text/html; charset=utf-8")
+
 if __name__ == "__main__":
     app_logger.info("启动FastAPI服务器...")
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
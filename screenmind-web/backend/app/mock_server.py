@@ -0,0 +1,435 @@
+"""
+本地模拟模型服务
+OpenAI兼容的离线替身（/v1/chat/completions、/v1/models），按“题目类型/题目内容/正确答案/解析”格式返回固定答案，
+用于在没有网络、不消耗API额度的情况下压测和测试完整的分析流程
+
+- 答案由请求内容的哈希决定：同一张图片、同一段题目文字总是得到同样的答案
+- 延迟按配置的分布采样 (fixed/uniform/normal/lognormal/exponential)；每次请求的随机数由
+  种子、请求内容和该内容的第几次请求共同决定，并发交错不同也能复现同样的延迟和错误序列
+- 按配置的比例返回429（限流，立即返回）和500（服务端错误，经过采样的延迟后返回）
+- 支持 stream=true 的SSE流式响应，以及 response_format 为 json_object/json_schema 时返回JSON
+- 按 max_tokens 截断回答（finish_reason=length），usage 中返回估算的token数
+
+用法:
+    python -m app.mock_server [--port 8001] [--latency lognormal --latency-mean 1.5 --latency-stddev 0.5]
+                              [--error-rate 0.01] [--rate-limit-rate 0.02] [--seed 42]
+
+然后设置 AI_PROVIDER=mock、AI_MODEL=mock-vl（或在设置页面切换到“本地模拟”）启动后端
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import time
+import uuid
+from typing import Optional, Dict, Any, List, Tuple
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+
+# 各模拟模型的延迟倍数（降级模型更快）
+MODEL_LATENCY_FACTOR = {"mock-vl": 1.0, "mock-vl-fast": 0.5}
+
+# 图片按OpenAI的计费方式估算输入token：low固定85，其余按一张512x512分块计
+IMAGE_TOKENS = {"low": 85, "high": 765, "auto": 765}
+
+# 记录的请求内容计数超过该数量时清空（只影响“第几次请求”的计数，不影响答案）
+MAX_TRACKED_FINGERPRINTS = 100000
+
+CANNED_ANSWERS = [
+    {
+        "question_type": "选择题",
+        "question_content": "TCP建立连接需要几次握手？ A. 1次 B. 2次 C. 3次 D. 4次",
+        "answer": "C",
+        "explanation": "TCP通过三次握手建立连接：SYN、SYN+ACK、ACK，确保双方的收发能力都正常。"
+    },
+    {
+        "question_type": "判断题",
+        "question_content": "HTTP是无状态协议。",
+        "answer": "正确",
+        "explanation": "HTTP本身不保存请求之间的状态，会话状态需要借助Cookie、Session等机制维持。"
+    },
+    {
+        "question_type": "填空题",
+        "question_content": "Python中用于定义函数的关键字是____。",
+        "answer": "def",
+        "explanation": "Python使用 def 关键字定义函数，lambda 用于定义匿名函数。"
+    },
+    {
+        "question_type": "选择题",
+        "question_content": "下列哪种数据结构遵循先进先出原则？ A. 栈 B. 队列 C. 二叉树 D. 哈希表",
+        "answer": "B",
+        "explanation": "队列 (Queue) 先进先出，栈 (Stack) 后进先出。"
+    },
+    {
+        "question_type": "填空题",
+        "question_content": "二分查找的时间复杂度为____。",
+        "answer": "O(log n)",
+        "explanation": "每次比较都把查找范围缩小一半，最多需要 log2(n) 次比较。"
+    },
+    {
+        "question_type": "判断题",
+        "question_content": "SQL中 DELETE 语句会删除表结构。",
+        "answer": "错误",
+        "explanation": "DELETE 只删除数据行，删除表结构需要使用 DROP TABLE。"
+    },
+]
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数：中日韩文字每字约1个token，其他字符约4个一个token"""
+    cjk = sum(1 for ch in text if ord(ch) >= 0x3000)
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> Tuple[str, bool]:
+    """按估算的token数截断文本，返回 (文本, 是否被截断)"""
+    if estimate_tokens(text) <= max_tokens:
+        return text, False
+    used = 0.0
+    for index, ch in enumerate(text):
+        used += 1.0 if ord(ch) >= 0x3000 else 0.25
+        if used > max_tokens:
+            return text[:index], True
+    return text, False
+
+
+def format_answer(answer: Dict[str, str], structured: bool) -> str:
+    """按提示词要求的格式输出答案"""
+    if structured:
+        return json.dumps(answer, ensure_ascii=False)
+    return (
+        f"题目类型：{answer['question_type']}\n"
+        f"题目内容：{answer['question_content']}\n"
+        f"正确答案：{answer['answer']}\n"
+        f"解析：{answer['explanation']}"
+    )
+
+
+def _message_parts(messages: List[Dict[str, Any]]) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """拆出消息中的文本和图片部分"""
+    texts, images = [], []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            texts.append(content)
+        elif isinstance(content, list):
+            for part in content:
+                if part.get("type") == "text":
+                    texts.append(part.get("text", ""))
+                elif part.get("type") == "image_url":
+                    images.append(part.get("image_url") or {})
+    return texts, images
+
+
+class MockSettings:
+    """模拟服务配置"""
+
+    def __init__(
+        self,
+        latency: str = "lognormal",
+        latency_mean: float = 1.0,
+        latency_stddev: float = 0.3,
+        latency_max: float = 30.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        seed: int = 0,
+        stream_chunk_chars: int = 8,
+        first_token_ratio: float = 0.3,
+        answers_path: Optional[str] = None
+    ):
+        """
+        Args:
+            latency: 延迟分布 (fixed/uniform/normal/lognormal/exponential)
+            latency_mean: 平均延迟（秒）
+            latency_stddev: 延迟标准差（秒），uniform分布为 mean±stddev
+            latency_max: 单次延迟上限（秒）
+            error_rate: 返回500的比例 (0-1)
+            rate_limit_rate: 返回429的比例 (0-1)
+            seed: 随机数种子
+            stream_chunk_chars: 流式响应每个分片的字符数
+            first_token_ratio: 流式响应首个分片前等待的时间占总延迟的比例
+            answers_path: 自定义答案JSON文件（字段同CANNED_ANSWERS的对象数组）
+        """
+        if latency not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"未知的延迟分布: {latency}")
+        self.latency = latency
+        self.latency_mean = max(0.0, latency_mean)
+        self.latency_stddev = max(0.0, latency_stddev)
+        self.latency_max = latency_max
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.seed = seed
+        self.stream_chunk_chars = max(1, stream_chunk_chars)
+        self.first_token_ratio = min(max(first_token_ratio, 0.0), 1.0)
+        self.answers = CANNED_ANSWERS
+        if answers_path:
+            with open(answers_path, "r", encoding="utf-8") as f:
+                self.answers = json.load(f)
+            if not self.answers:
+                raise ValueError("自定义答案文件为空")
+
+    @classmethod
+    def from_env(cls) -> "MockSettings":
+        """从环境变量创建"""
+        return cls(
+            latency=os.getenv("MOCK_LATENCY", "lognormal"),
+            latency_mean=float(os.getenv("MOCK_LATENCY_MEAN", "1.0")),
+            latency_stddev=float(os.getenv("MOCK_LATENCY_STDDEV", "0.3")),
+            latency_max=float(os.getenv("MOCK_LATENCY_MAX", "30")),
+            error_rate=float(os.getenv("MOCK_ERROR_RATE", "0")),
+            rate_limit_rate=float(os.getenv("MOCK_RATE_LIMIT_RATE", "0")),
+            seed=int(os.getenv("MOCK_SEED", "0")),
+            stream_chunk_chars=int(os.getenv("MOCK_STREAM_CHUNK_CHARS", "8")),
+            answers_path=os.getenv("MOCK_ANSWERS_PATH") or None
+        )
+
+    def sample_latency(self, rng: random.Random) -> float:
+        """按配置的分布采样一次延迟（秒）"""
+        mean, stddev = self.latency_mean, self.latency_stddev
+        if self.latency == "fixed" or mean == 0:
+            value = mean
+        elif self.latency == "uniform":
+            value = rng.uniform(mean - stddev, mean + stddev)
+        elif self.latency == "normal":
+            value = rng.gauss(mean, stddev)
+        elif self.latency == "exponential":
+            value = rng.expovariate(1.0 / mean)
+        else:
+            # 由期望和标准差换算对数正态分布的参数，长尾更接近真实的模型延迟
+            sigma2 = math.log(1 + (stddev / mean) ** 2)
+            value = rng.lognormvariate(math.log(mean) - sigma2 / 2, math.sqrt(sigma2))
+        return min(max(value, 0.0), self.latency_max)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "latency": self.latency,
+            "latency_mean": self.latency_mean,
+            "latency_stddev": self.latency_stddev,
+            "latency_max": self.latency_max,
+            "error_rate": self.error_rate,
+            "rate_limit_rate": self.rate_limit_rate,
+            "seed": self.seed,
+            "stream_chunk_chars": self.stream_chunk_chars,
+            "first_token_ratio": self.first_token_ratio,
+            "answers": len(self.answers)
+        }
+
+
+class MockModel:
+    """模拟模型：根据请求内容决定答案、延迟和是否出错（只在事件循环线程中调用）"""
+
+    def __init__(self, settings: MockSettings):
+        self.settings = settings
+        self._occurrences: Dict[str, int] = {}
+        self._stats = {
+            "requests": 0, "streamed": 0, "rate_limited": 0, "server_errors": 0,
+            "truncated": 0, "prompt_tokens": 0, "completion_tokens": 0
+        }
+
+    def fingerprint(self, texts: List[str], images: List[Dict[str, Any]]) -> str:
+        """请求内容的指纹（不含模型名和参数，换模型时同一题目仍得到同一答案）"""
+        digest = hashlib.sha256()
+        for text in texts:
+            digest.update(text.encode("utf-8"))
+            digest.update(b"\x00")
+        for image in images:
+            digest.update(str(image.get("url", "")).encode("utf-8"))
+            digest.update(b"\x01")
+        return digest.hexdigest()
+
+    def _rng(self, fingerprint: str) -> random.Random:
+        """每次请求独立的随机数：同一内容的第n次请求在任何运行中都得到同样的延迟和错误"""
+        if len(self._occurrences) >= MAX_TRACKED_FINGERPRINTS:
+            self._occurrences.clear()
+        occurrence = self._occurrences.get(fingerprint, 0)
+        self._occurrences[fingerprint] = occurrence + 1
+        return random.Random(f"{self.settings.seed}:{fingerprint}:{occurrence}")
+
+    def plan(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        决定一次请求的结果
+
+        Returns:
+            {"error": 状态码或None, "latency": 秒, "content": 回答, "finish_reason", "usage"}
+        """
+        texts, images = _message_parts(body.get("messages") or [])
+        fingerprint = self.fingerprint(texts, images)
+        rng = self._rng(fingerprint)
+        self._stats["requests"] += 1
+
+        model = body.get("model", "mock-vl")
+        latency = self.settings.sample_latency(rng) * MODEL_LATENCY_FACTOR.get(model, 1.0)
+        roll = rng.random()
+        if roll < self.settings.rate_limit_rate:
+            self._stats["rate_limited"] += 1
+            return {"error": 429, "latency": 0.0}
+        if roll < self.settings.rate_limit_rate + self.settings.error_rate:
+            self._stats["server_errors"] += 1
+            return {"error": 500, "latency": latency}
+
+        response_format = (body.get("response_format") or {}).get("type")
+        answer = self.settings.answers[int(fingerprint[:8], 16) % len(self.settings.answers)]
+        content = format_answer(answer, response_format in ("json_object", "json_schema"))
+        content, truncated = truncate_to_tokens(content, int(body.get("max_tokens") or 4096))
+        if truncated:
+            self._stats["truncated"] += 1
+
+        prompt_tokens = sum(estimate_tokens(text) for text in texts) + sum(
+            IMAGE_TOKENS.get(image.get("detail", "auto"), IMAGE_TOKENS["auto"]) for image in images
+        )
+        completion_tokens = estimate_tokens(content)
+        self._stats["prompt_tokens"] += prompt_tokens
+        self._stats["completion_tokens"] += completion_tokens
+        return {
+            "error": None,
+            "latency": latency,
+            "content": content,
+            "finish_reason": "length" if truncated else "stop",
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+
+    def record_stream(self):
+        self._stats["streamed"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self._stats, "settings": self.settings.to_dict()}
+
+
+def _error_response(status: int) -> JSONResponse:
+    """OpenAI格式的错误响应（openai SDK据此抛出RateLimitError/InternalServerError）"""
+    if status == 429:
+        error = {"message": "Rate limit reached (mock)", "type": "rate_limit_error", "code": "rate_limit_exceeded"}
+        return JSONResponse({"error": error}, status_code=429, headers={"Retry-After": "1"})
+    error = {"message": "The server had an error while processing your request (mock)", "type": "server_error", "code": None}
+    return JSONResponse({"error": error}, status_code=status)
+
+
+def create_app(settings: Optional[MockSettings] = None) -> FastAPI:
+    """创建模拟服务应用"""
+    mock = MockModel(settings or MockSettings.from_env())
+    app = FastAPI(title="ScreenMind Mock Model Server", docs_url=None, redoc_url=None)
+    app.state.mock = mock
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {
+            "object": "list",
+            "data": [
+                {"id": model, "object": "model", "created": 0, "owned_by": "screenmind-mock"}
+                for model in MODEL_LATENCY_FACTOR
+            ]
+        }
+
+    @app.get("/stats")
+    async def get_stats():
+        return mock.get_stats()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        plan = mock.plan(body)
+        completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:24]}"
+        model = body.get("model", "mock-vl")
+        created = int(time.time())
+
+        if plan["error"] is not None:
+            await asyncio.sleep(plan["latency"])
+            return _error_response(plan["error"])
+
+        if not body.get("stream"):
+            await asyncio.sleep(plan["latency"])
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": plan["content"]},
+                    "finish_reason": plan["finish_reason"]
+                }],
+                "usage": plan["usage"]
+            }
+
+        mock.record_stream()
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+        return StreamingResponse(
+            _stream_chunks(plan, mock.settings, completion_id, model, created, include_usage),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache"}
+        )
+
+    return app
+
+
+async def _stream_chunks(plan, settings: MockSettings, completion_id: str, model: str, created: int, include_usage: bool):
+    """按OpenAI的SSE格式逐片输出回答：首个分片前等待总延迟的一部分，其余时间平均分摊到各分片"""
+    content = plan["content"]
+    size = settings.stream_chunk_chars
+    pieces = [content[i:i + size] for i in range(0, len(content), size)] or [""]
+    first_wait = plan["latency"] * settings.first_token_ratio
+    per_piece = (plan["latency"] - first_wait) / len(pieces)
+
+    def event(choices, usage=None) -> str:
+        chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model, "choices": choices}
+        if usage is not None:
+            chunk["usage"] = usage
+        return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+    await asyncio.sleep(first_wait)
+    yield event([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+    for index, piece in enumerate(pieces):
+        if index:
+            await asyncio.sleep(per_piece)
+        yield event([{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+    await asyncio.sleep(per_piece)
+    yield event([{"index": 0, "delta": {}, "finish_reason": plan["finish_reason"]}])
+    if include_usage:
+        yield event([], plan["usage"])
+    yield "data: [DONE]\n\n"
+
+
+def main():
+    env = MockSettings.from_env()
+    parser = argparse.ArgumentParser(description="ScreenMind 本地模拟模型服务（OpenAI兼容）")
+    parser.add_argument("--host", default=os.getenv("MOCK_SERVER_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("MOCK_SERVER_PORT", "8001")))
+    parser.add_argument("--latency", choices=LATENCY_DISTRIBUTIONS, default=env.latency, help="延迟分布")
+    parser.add_argument("--latency-mean", type=float, default=env.latency_mean, help="平均延迟（秒）")
+    parser.add_argument("--latency-stddev", type=float, default=env.latency_stddev, help="延迟标准差（秒）")
+    parser.add_argument("--latency-max", type=float, default=env.latency_max, help="单次延迟上限（秒）")
+    parser.add_argument("--error-rate", type=float, default=env.error_rate, help="返回500的比例 (0-1)")
+    parser.add_argument("--rate-limit-rate", type=float, default=env.rate_limit_rate, help="返回429的比例 (0-1)")
+    parser.add_argument("--seed", type=int, default=env.seed, help="随机数种子")
+    parser.add_argument("--stream-chunk-chars", type=int, default=env.stream_chunk_chars, help="流式分片字符数")
+    parser.add_argument("--answers", default=os.getenv("MOCK_ANSWERS_PATH"), help="自定义答案JSON文件")
+    parser.add_argument("--log-level", default="warning", help="uvicorn日志级别（压测时默认只输出警告）")
+    args = parser.parse_args()
+
+    settings = MockSettings(
+        latency=args.latency,
+        latency_mean=args.latency_mean,
+        latency_stddev=args.latency_stddev,
+        latency_max=args.latency_max,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed,
+        stream_chunk_chars=args.stream_chunk_chars,
+        answers_path=args.answers
+    )
+    import uvicorn
+    print(f"模拟模型服务: http://{args.host}:{args.port}/v1  {json.dumps(settings.to_dict(), ensure_ascii=False)}")
+    uvicorn.run(create_app(settings), host=args.host, port=args.port, log_level=args.log_level)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""分析流程报告的模型和降级信息与实际处理请求的流程一致"""
+import asyncio
+import pytest
+from PIL import Image
+from app.api import analyze
+from app.core import ocr
+from app.core.ai_service import QuestionAnalyzer
+from app.core.overload import OverloadController
+from app.core.question_bank import QuestionBank
+
+REPLY = "题目类型：计算题\n题目内容：计算 12+35 的结果\n答案：47\n解析：模型作答"
+
+
+class StubAIService:
+    """按AIService的约定记录每次调用实际使用的模型"""
+
+    current_provider = "qwen"
+    current_model = "qwen-vl-max"
+
+    def __init__(self):
+        self.model = None
+
+    def get_last_model(self):
+        return self.model
+
+    def analyze_image(self, image_base64, model=None, **kwargs):
+        self.model = model or self.current_model
+        return REPLY
+
+    def analyze_text(self, text, **kwargs):
+        self.model = "qwen-turbo"
+        return REPLY
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    def _run(ocr_confidence=None, question_bank=None, degraded=False):
+        if ocr_confidence is not None:
+            monkeypatch.setattr(ocr, "is_available", lambda: True)
+            monkeypatch.setattr(ocr, "extract_text", lambda data: {
+                "text": "计算 12+35 的结果", "confidence": ocr_confidence, "words": 4
+            })
+        analyzer = QuestionAnalyzer(
+            StubAIService(), ocr_text_first=ocr_confidence is not None, ocr_min_chars=4, question_bank=question_bank
+        )
+        controller = OverloadController(max_in_flight=0, min_degraded_seconds=60)
+        if degraded:
+            controller.enter()
+            controller.leave()
+        monkeypatch.setattr(analyze, "question_analyzer", analyzer)
+        monkeypatch.setattr(analyze, "overload_controller", controller)
+        return asyncio.run(analyze.run_analysis_pipeline(Image.new("RGB", (64, 64), "white")))
+
+    return _run
+
+
+def test_vision_reports_current_model(pipeline):
+    result = pipeline()
+    assert result["pipeline"] == "vision"
+    assert result["model_used"] == "qwen-vl-max"
+    assert result["degraded"] is False
+
+
+def test_degraded_vision_reports_degraded_model(pipeline):
+    result = pipeline(degraded=True)
+    assert result["model_used"] == "qwen-vl-plus"
+    assert result["degraded"] is True
+    assert result["degrade_reason"]
+
+
+def test_ocr_text_reports_text_model(pipeline):
+    result = pipeline(ocr_confidence=95.0, degraded=True)
+    assert result["pipeline"] == "ocr_text"
+    assert result["model_used"] == "qwen-turbo"
+    assert result["degraded"] is True
+
+
+def test_question_bank_hit_is_not_degraded(pipeline):
+    bank = QuestionBank()
+    bank.add({"question_type": "计算题", "question_content": "计算 12+35 的结果", "answer": "47", "explanation": "题库"})
+    result = pipeline(ocr_confidence=95.0, question_bank=bank, degraded=True)
+    assert result["pipeline"] == "question_bank"
+    assert result["model_used"] is None
+    assert result["degraded"] is False
+    assert result["degrade_reason"] is None
@@ -0,0 +1,77 @@
+"""图片存储：内容寻址去重、按访问时间淘汰和读取已淘汰的图片"""
+import io
+import os
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+from app.api import images
+from app.core.blob_store import BlobStore
+
+
+def _png(seed: int, size: int = 64) -> bytes:
+    image = Image.frombytes("L", (size, size), bytes((seed * 31 + i) % 256 for i in range(size * size)))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_put_deduplicates_by_content(tmp_path):
+    store = BlobStore(str(tmp_path))
+    data = _png(1)
+    first = store.put(data)
+    assert store.put(data) == first
+    assert store.read(first) == data
+    stats = store.get_stats()
+    assert stats["images"] == 1 and stats["deduplicated"] == 1
+
+
+def test_evicts_least_recently_used(tmp_path):
+    blobs = [_png(i) for i in range(4)]
+    store = BlobStore(str(tmp_path), max_bytes=sum(len(b) for b in blobs[:3]))
+    ids = [store.put(b) for b in blobs[:3]]
+    # 访问第一张，淘汰时应先淘汰第二张
+    store.read(ids[0])
+    store.put(blobs[3])
+
+    assert store.get_path(ids[1]) is None
+    assert store.get_path(ids[0]) is not None
+    assert store.get_stats()["total_bytes"] <= store.max_bytes
+    assert store.get_stats()["evicted"] >= 1
+
+
+def test_index_rebuilt_from_disk(tmp_path):
+    store = BlobStore(str(tmp_path))
+    image_id = store.put(_png(2))
+    reloaded = BlobStore(str(tmp_path))
+    assert reloaded.read(image_id) == _png(2)
+    assert reloaded.get_stats()["images"] == 1
+
+
+def test_read_missing_raises_key_error(tmp_path):
+    store = BlobStore(str(tmp_path))
+    image_id = store.put(_png(3))
+    os.unlink(store.get_path(image_id))
+    with pytest.raises(KeyError):
+        store.read(image_id)
+    with pytest.raises(KeyError):
+        store.read("not-an-id")
+
+
+def test_get_image_returns_404_after_eviction(tmp_path, monkeypatch):
+    store = BlobStore(str(tmp_path))
+    monkeypatch.setattr(images, "blob_store", store)
+    app = FastAPI()
+    app.include_router(images.router, prefix="/api/v1")
+    client = TestClient(app)
+
+    data = _png(4)
+    image_id = store.put(data)
+    response = client.get(f"/api/v1/images/{image_id}")
+    assert response.status_code == 200
+    assert response.content == data
+    assert response.headers["content-type"] == "image/png"
+
+    os.unlink(store.get_path(image_id))
+    assert client.get(f"/api/v1/images/{image_id}").status_code == 404
+    assert client.post(f"/api/v1/images/{image_id}/analyze").status_code == 404
@@ -0,0 +1,61 @@
+"""截屏能力注册表：启动探测不截屏，刷新时才测速排序"""
+import time
+from app.core.capture_registry import CaptureBackend, CaptureRegistry
+
+
+class FakeBackends:
+    """记录每个后端实际截屏次数的候选后端"""
+
+    def __init__(self):
+        self.captures = {"slow": 0, "fast": 0, "missing": 0}
+
+    def _capture(self, name, delay):
+        def capture(bbox):
+            self.captures[name] += 1
+            time.sleep(delay)
+            return b"png"
+        return capture
+
+    def __call__(self):
+        return [
+            CaptureBackend("slow", self._capture("slow", 0.05), lambda: True),
+            CaptureBackend("fast", self._capture("fast", 0.0), lambda: True),
+            CaptureBackend("missing", self._capture("missing", 0.0), lambda: False),
+        ]
+
+
+def test_probe_checks_availability_without_capturing():
+    backends = FakeBackends()
+    registry = CaptureRegistry(backends)
+    status = registry.probe()
+
+    assert sum(backends.captures.values()) == 0
+    assert status["order"] == ["slow", "fast"]
+    assert status["benchmarked"] is False
+    assert status["fastest"] is None
+    assert [b.name for b in registry.ordered_backends()] == ["slow", "fast"]
+
+
+def test_first_use_probes_without_capturing():
+    backends = FakeBackends()
+    registry = CaptureRegistry(backends)
+    registry.ordered_backends()
+    assert sum(backends.captures.values()) == 0
+
+
+def test_refresh_benchmarks_and_orders_by_speed():
+    backends = FakeBackends()
+    registry = CaptureRegistry(backends)
+    status = registry.refresh()
+
+    assert backends.captures == {"slow": 1, "fast": 1, "missing": 0}
+    assert status["order"] == ["fast", "slow"]
+    assert status["fastest"] == "fast"
+    assert status["benchmarked"] is True
+
+
+def test_refresh_without_benchmark_never_captures():
+    backends = FakeBackends()
+    registry = CaptureRegistry(backends, benchmark=False)
+    registry.refresh()
+    assert sum(backends.captures.values()) == 0
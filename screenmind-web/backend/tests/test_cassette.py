@@ -0,0 +1,119 @@
+"""提供商调用录制/回放：指纹、录制后离线回放、未命中、录制的失败、auto模式和损坏的录制文件"""
+import json
+import pytest
+from app.core.ai_service import AIService
+from app.core.cassette import (
+    AUTO, PASSTHROUGH, RECORD, REPLAY, CassetteMissError, ProviderCassette, RecordedProviderError, fingerprint
+)
+
+REQUEST = {"kind": "image", "model": "qwen-vl-plus", "max_tokens": 800, "detail": "high", "prompt": "p", "image": "aGk="}
+USAGE = {"prompt_tokens": 10, "completion_tokens": 5}
+
+
+class Provider:
+    """记录调用次数的提供商替身"""
+
+    def __init__(self, text="答案：C", error=None):
+        self.calls = 0
+        self.text = text
+        self.error = error
+
+    def __call__(self):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return self.text, USAGE
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "cassette.jsonl")
+
+
+def test_fingerprint_ignores_key_order_and_covers_every_field():
+    assert fingerprint(REQUEST) == fingerprint(dict(reversed(list(REQUEST.items()))))
+    assert fingerprint(REQUEST) != fingerprint({**REQUEST, "image": "aGl="})
+    assert fingerprint(REQUEST) != fingerprint({**REQUEST, "max_tokens": 400})
+
+
+def test_record_then_replay_offline(path):
+    provider = Provider()
+    assert ProviderCassette(path, RECORD).call(REQUEST, provider) == ("答案：C", USAGE)
+
+    replay = ProviderCassette(path, REPLAY)
+    offline = Provider(error=AssertionError("回放不应访问提供商"))
+    assert replay.call(REQUEST, offline) == ("答案：C", USAGE)
+    assert offline.calls == 0
+    assert replay.last_call()["replayed"] is True
+    assert replay.get_stats()["replayed"] == 1
+
+
+def test_file_keeps_summary_but_not_image_or_prompt(path):
+    ProviderCassette(path, RECORD).call(REQUEST, Provider())
+    with open(path, encoding="utf-8") as f:
+        entry = json.loads(f.readline())
+    assert {"kind", "model", "max_tokens", "detail", "text", "usage", "latency"} <= set(entry)
+    assert "image" not in entry and "prompt" not in entry
+
+
+def test_replay_miss_raises(path):
+    cassette = ProviderCassette(path, REPLAY)
+    with pytest.raises(CassetteMissError):
+        cassette.call(REQUEST, Provider())
+    assert cassette.get_stats()["missed"] == 1
+
+
+def test_recorded_failure_is_replayed_as_failure(path):
+    with pytest.raises(TimeoutError):
+        ProviderCassette(path, RECORD).call(REQUEST, Provider(error=TimeoutError("timed out")))
+    with pytest.raises(RecordedProviderError, match="timed out"):
+        ProviderCassette(path, REPLAY).call(REQUEST, Provider())
+
+
+def test_auto_records_only_successes(path):
+    cassette = ProviderCassette(path, AUTO)
+    failing = Provider(text="错误: 限流")
+    cassette.call(REQUEST, failing)
+    cassette.call(REQUEST, failing)
+    assert failing.calls == 2
+
+    provider = Provider()
+    cassette.call(REQUEST, provider)
+    cassette.call(REQUEST, provider)
+    assert provider.calls == 1
+    assert cassette.get_stats()["recorded"] == 1
+
+
+def test_last_recording_wins_and_truncated_line_is_skipped(path):
+    recorder = ProviderCassette(path, RECORD)
+    recorder.call(REQUEST, Provider(text="旧答案"))
+    recorder.call(REQUEST, Provider(text="新答案"))
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"key": "half')
+
+    replay = ProviderCassette(path, REPLAY)
+    assert replay.get_stats()["entries"] == 1
+    assert replay.call(REQUEST, Provider())[0] == "新答案"
+
+
+def test_passthrough_does_not_touch_file(path):
+    cassette = ProviderCassette(path, PASSTHROUGH)
+    provider = Provider()
+    cassette.call(REQUEST, provider)
+    assert provider.calls == 1
+    assert cassette.get_stats()["entries"] == 0
+
+
+def test_unknown_mode_rejected(path):
+    with pytest.raises(ValueError):
+        ProviderCassette(path, "rewind")
+
+
+def test_ai_service_replay_miss_needs_no_api_key(path, monkeypatch):
+    monkeypatch.delenv("QWEN_API_KEY", raising=False)
+    service = AIService(provider="qwen", model="qwen-vl-plus", lazy=True)
+    service.cassette = ProviderCassette(path, REPLAY)
+    text = service.analyze_text("1+1=?")
+    assert text.startswith("错误:")
+    assert "API密钥" not in text
+    assert service.cassette.get_stats()["missed"] == 1
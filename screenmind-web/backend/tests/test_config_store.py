@@ -0,0 +1,78 @@
+"""共享配置存储：跨worker的版本号与poll、并发写入、启动时的环境变量覆盖和文件权限"""
+import os
+import stat
+import threading
+import pytest
+from app.core.config_store import ConfigStore
+
+DEFAULTS = {"current_provider": "qwen", "current_model": "qwen-vl-plus", "api_keys": {}}
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "config.db")
+
+
+def test_defaults_only_fill_missing_keys(db_path):
+    ConfigStore(db_path, defaults=DEFAULTS).set_model("openai", "gpt-4o")
+    snapshot = ConfigStore(db_path, defaults=DEFAULTS).load()
+    assert (snapshot["current_provider"], snapshot["current_model"]) == ("openai", "gpt-4o")
+    assert snapshot["version"] == 1
+
+
+def test_other_worker_sees_new_version_once(db_path):
+    worker_a = ConfigStore(db_path, defaults=DEFAULTS)
+    worker_b = ConfigStore(db_path, defaults=DEFAULTS)
+    worker_a.load()
+    worker_b.load()
+
+    written = worker_a.set_model("openai", "gpt-4o-mini")
+    snapshot = worker_b.poll()
+    assert snapshot is not None
+    assert snapshot["version"] == written["version"]
+    assert snapshot["current_model"] == "gpt-4o-mini"
+    assert worker_b.poll() is None
+    # 自己写入的版本不会被当作新配置
+    assert worker_a.poll() is None
+
+
+def test_concurrent_writers_do_not_lose_updates(db_path):
+    ConfigStore(db_path, defaults=DEFAULTS)
+    workers = [ConfigStore(db_path) for _ in range(4)]
+    per_worker = 5
+
+    def write(index, store):
+        for n in range(per_worker):
+            store.set_api_key(f"provider-{index}-{n}", "key")
+
+    threads = [threading.Thread(target=write, args=(i, store)) for i, store in enumerate(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    snapshot = workers[0].snapshot()
+    assert len(snapshot["api_keys"]) == len(workers) * per_worker
+    assert snapshot["version"] == len(workers) * per_worker
+
+
+def test_apply_overrides_only_writes_changes(db_path):
+    store = ConfigStore(db_path, defaults=DEFAULTS)
+    unchanged = store.apply_overrides(current_provider="qwen", current_model=None)
+    assert unchanged["version"] == 0
+
+    changed = store.apply_overrides(current_provider="mock", current_model="mock-vl")
+    assert changed["version"] == 1
+    assert (changed["current_provider"], changed["current_model"]) == ("mock", "mock-vl")
+
+    # 其他worker随后以相同的环境变量启动时不再递增版本号
+    assert ConfigStore(db_path).apply_overrides(current_provider="mock", current_model="mock-vl")["version"] == 1
+
+
+@pytest.mark.skipif(os.name != "posix", reason="只在POSIX上检查文件权限")
+def test_file_is_private(db_path):
+    open(db_path, "w").close()
+    os.chmod(db_path, 0o644)
+    store = ConfigStore(db_path, defaults=DEFAULTS)
+    store.set_api_key("qwen", "secret")
+    assert stat.S_IMODE(os.stat(db_path).st_mode) == 0o600
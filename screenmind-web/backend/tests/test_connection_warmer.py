@@ -0,0 +1,169 @@
+"""连接预热与保活：用本地HTTPS替身服务验证预热建立的连接被后续请求复用"""
+import datetime
+import json
+import ssl
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from app.core.connection_warmer import ConnectionWarmer, create_http_client, ping_client
+
+openai = pytest.importorskip("openai")
+
+
+def _self_signed_cert(directory):
+    """生成 127.0.0.1 的自签名证书，返回 (证书路径, 私钥路径)"""
+    x509 = pytest.importorskip("cryptography.x509")
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+    import ipaddress
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]), False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), True)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path, key_path = directory / "cert.pem", directory / "key.pem"
+    cert_path.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    key_path.write_bytes(key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ))
+    return cert_path, key_path
+
+
+class _StandIn(ThreadingHTTPServer):
+    """OpenAI兼容提供商的HTTPS替身：统计TLS握手次数和请求数"""
+    daemon_threads = True
+
+    def __init__(self, context):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.context = context
+        self.handshakes = 0
+        self.requests = 0
+        self.fail = False
+
+    def get_request(self):
+        sock, address = super().get_request()
+        self.handshakes += 1
+        return self.context.wrap_socket(sock, server_side=True), address
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.requests += 1
+        status = 500 if self.server.fail else 200
+        body = json.dumps({"object": "list", "data": [{"id": "stand-in", "object": "model",
+                                                       "created": 0, "owned_by": "test"}]}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stand_in(tmp_path):
+    cert_path, key_path = _self_signed_cert(tmp_path)
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert_path, key_path)
+    server = _StandIn(context)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.cert_path = str(cert_path)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(stand_in):
+    return openai.OpenAI(
+        api_key="test",
+        base_url=f"https://127.0.0.1:{stand_in.server_address[1]}/v1",
+        max_retries=0,
+        http_client=create_http_client(verify=ssl.create_default_context(cafile=stand_in.cert_path))
+    )
+
+
+class _StubService:
+    """只提供预热器需要的属性"""
+
+    def __init__(self, client):
+        self.client = client
+        self.last_request_at = 0.0
+
+    def get_active_client(self):
+        return "openai", self.client
+
+
+def test_warm_connection_is_reused(stand_in, client):
+    warmer = ConnectionWarmer(_StubService(client))
+    assert warmer.warm("openai", client)
+    for _ in range(3):
+        ping_client("openai", client)
+
+    assert stand_in.requests == 4
+    assert stand_in.handshakes == 1
+    status = warmer.get_status()
+    assert status["state"] == "warm" and status["pings"] == 1
+
+
+def test_warm_failure_is_reported(stand_in, client):
+    stand_in.fail = True
+    warmer = ConnectionWarmer(_StubService(client))
+    assert not warmer.warm("openai", client)
+    status = warmer.get_status()
+    assert status["state"] == "failed"
+    assert status["failures"] == 1 and status["error"]
+
+
+def test_ping_only_when_idle(stand_in, client):
+    service = _StubService(client)
+    warmer = ConnectionWarmer(service, ping_interval=60)
+    service.last_request_at = time.monotonic()
+    assert not warmer.ping_if_idle()
+    assert stand_in.requests == 0
+
+    service.last_request_at = time.monotonic() - 120
+    assert warmer.ping_if_idle()
+    assert stand_in.requests == 1
+    # 刚刚保活过，不再重复发送
+    assert not warmer.ping_if_idle()
+
+
+def test_disabled_warmer_does_nothing(stand_in, client):
+    warmer = ConnectionWarmer(_StubService(client), enabled=False)
+    assert not warmer.warm("openai", client)
+    assert stand_in.requests == 0
+    assert warmer.get_status()["state"] == "disabled"
+
+
+def test_gemini_ping_uses_generative_client():
+    """Gemini保活调用当前GenerativeModel的count_tokens（与generate_content共用客户端）"""
+    calls = []
+
+    class FakeModel:
+        def count_tokens(self, contents):
+            calls.append(contents)
+
+        def __getattr__(self, name):
+            raise AssertionError(f"unexpected call: {name}")
+
+    ping_client("gemini", FakeModel())
+    assert calls == ["ping"]
@@ -0,0 +1,42 @@
+"""就绪检查：没有API密钥时返回503，录制回放模式下不需要提供商，视为就绪"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import health
+from app.core.ai_service import AIService
+from app.core.cassette import ProviderCassette, REPLAY, RECORD
+from app.core.provider_health import ProviderHealth
+
+
+@pytest.fixture
+def make_client(monkeypatch, tmp_path):
+    for name in ("QWEN_API_KEY", "OPENAI_API_KEY", "GEMINI_API_KEY"):
+        monkeypatch.delenv(name, raising=False)
+
+    def _make(cassette_mode=None):
+        service = AIService(provider="qwen", model="qwen-vl-plus", lazy=True)
+        if cassette_mode:
+            service.cassette = ProviderCassette(str(tmp_path / "cassette.jsonl"), mode=cassette_mode)
+        service.ensure_initialized()
+        monkeypatch.setattr(health, "provider_health", ProviderHealth(service))
+        app = FastAPI()
+        app.include_router(health.router)
+        return TestClient(app)
+
+    return _make
+
+
+def test_missing_api_key_is_not_ready(make_client):
+    response = make_client().get("/ready")
+    assert response.status_code == 503
+    assert response.json() == {"ready": False, "ai_service": "unconfigured", "provider": "qwen"}
+
+
+def test_replay_mode_is_ready_without_api_key(make_client):
+    response = make_client(REPLAY).get("/ready")
+    assert response.status_code == 200
+    assert response.json() == {"ready": True, "ai_service": "replay", "provider": "qwen"}
+
+
+def test_record_mode_still_needs_api_key(make_client):
+    assert make_client(RECORD).get("/ready").status_code == 503
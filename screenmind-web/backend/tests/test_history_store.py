@@ -0,0 +1,77 @@
+"""分析历史：全文检索、按设备记录和分批导出"""
+import gzip
+import json
+import sqlite3
+from app.core.history_export import ExportEncoder
+from app.core.history_store import HistoryStore
+
+
+def _record(content, answer="A", question_type="选择题"):
+    return {"question_type": question_type, "question_content": content, "answer": answer, "explanation": ""}
+
+
+def test_search_matches_chinese_phrases(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    store.add(_record("TCP建立连接需要几次握手"))
+    store.add(_record("HTTP状态码404表示什么"))
+    items = store.search("三次握手")["items"]
+    assert items == []
+    items = store.search("握手")["items"]
+    assert [item["question_content"] for item in items] == ["TCP建立连接需要几次握手"]
+    assert store.search("http 404")["items"][0]["question_content"].startswith("HTTP")
+
+
+def test_fetch_batch_filters_by_device(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    for i in range(5):
+        store.add(_record(f"题目{i}"), device_id="a" if i % 2 == 0 else "b")
+    store.add(_record("没有设备的题目"))
+
+    rows = store.fetch_batch(0, 2, device_id="a")
+    assert [row["question_content"] for row in rows] == ["题目0", "题目2"]
+    rows = store.fetch_batch(rows[-1]["id"], 2, device_id="a")
+    assert [row["question_content"] for row in rows] == ["题目4"]
+    assert len(store.fetch_batch(0, 100)) == 6
+    assert [r["question_content"] for r in store.list_recent(device_id="b")["items"]] == ["题目3", "题目1"]
+
+
+def test_existing_table_gets_device_column(tmp_path):
+    path = tmp_path / "history.db"
+    conn = sqlite3.connect(str(path))
+    conn.execute(
+        "CREATE TABLE history (id INTEGER PRIMARY KEY, created_at REAL NOT NULL, question_type TEXT, "
+        "question_content TEXT, answer TEXT, explanation TEXT, model_used TEXT, pipeline TEXT, image_id TEXT)"
+    )
+    conn.execute("INSERT INTO history (created_at, question_content) VALUES (1, '旧记录')")
+    conn.commit()
+    conn.close()
+
+    store = HistoryStore(str(path))
+    store.add(_record("新记录"), device_id="a")
+    assert [row["device_id"] for row in store.fetch_batch(0, 10)] == [None, "a"]
+
+
+def test_export_encoder_gzip_jsonl_across_batches(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    for i in range(7):
+        store.add(_record(f"题目{i}"), device_id="a")
+    encoder = ExportEncoder("jsonl", gzip=True)
+    chunks, after_id = [], 0
+    while True:
+        rows = store.fetch_batch(after_id, 3, device_id="a")
+        if not rows:
+            break
+        after_id = rows[-1]["id"]
+        chunks.append(encoder.encode(rows))
+    chunks.append(encoder.finish())
+    lines = gzip.decompress(b"".join(chunks)).decode("utf-8").splitlines()
+    assert [json.loads(line)["question_content"] for line in lines] == [f"题目{i}" for i in range(7)]
+    assert all(json.loads(line)["device_id"] == "a" for line in lines)
+
+
+def test_export_encoder_csv_header_once():
+    encoder = ExportEncoder("csv")
+    rows = [{"id": 1, "created_at": 0, "question_content": "x"}]
+    text = (encoder.encode(rows) + encoder.encode(rows) + encoder.finish()).decode("utf-8-sig")
+    assert text.count("question_content") == 1
+    assert len(text.strip().splitlines()) == 3
@@ -0,0 +1,41 @@
+"""小程序通知API：未绑定的设备不能订阅"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import miniprogram
+from app.core.notification_hub import NotificationHub
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(miniprogram, "notification_hub", NotificationHub(bindings_path=None))
+    app = FastAPI()
+    app.include_router(miniprogram.router, prefix="/api/v1")
+    return TestClient(app)
+
+
+def test_unbound_device_cannot_subscribe(client):
+    response = client.get("/api/v1/miniprogram/notifications/latest", params={"deviceId": "made-up"})
+    assert response.status_code == 404
+    response = client.post("/api/v1/miniprogram/test-notification", json={"deviceId": "made-up"})
+    assert response.status_code == 404
+    assert miniprogram.notification_hub.get_stats()["direct_buffers"] == 0
+
+
+def test_bound_device_receives_test_notification(client):
+    bind = client.post("/api/v1/miniprogram/bind", json={"deviceId": "d1"}).json()["data"]
+    assert client.post("/api/v1/miniprogram/test-notification", json={"deviceId": "d1"}).status_code == 200
+
+    data = client.get(
+        "/api/v1/miniprogram/notifications/latest",
+        params={"openid": bind["openid"], "cursor": bind["cursor"]}
+    ).json()["data"]
+    assert [n["kind"] for n in data["notifications"]] == ["test"]
+
+    client.post("/api/v1/miniprogram/unbind", json={"deviceId": "d1"})
+    assert client.get("/api/v1/miniprogram/status", params={"deviceId": "d1"}).json()["data"]["connected"] is False
+    assert client.get("/api/v1/miniprogram/notifications/latest", params={"deviceId": "d1"}).status_code == 404
+
+
+def test_missing_identity_is_bad_request(client):
+    assert client.get("/api/v1/miniprogram/notifications/latest").status_code == 400
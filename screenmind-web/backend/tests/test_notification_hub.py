@@ -0,0 +1,97 @@
+"""通知中心：绑定校验、定向缓冲区、游标补发和长轮询"""
+import asyncio
+import threading
+from app.core.notification_hub import NotificationHub
+
+
+def make_hub(**kwargs) -> NotificationHub:
+    return NotificationHub(bindings_path=None, **kwargs)
+
+
+def test_resolve_only_bound_devices():
+    hub = make_hub()
+    assert hub.resolve("device-1") is None
+    openid = hub.bind("device-1")
+    assert hub.resolve("device-1") == "device-1"
+    assert hub.resolve(openid=openid) == "device-1"
+    assert hub.resolve(openid="unknown") is None
+
+    hub.unbind("device-1")
+    assert hub.resolve("device-1") is None
+    assert hub.resolve(openid=openid) is None
+
+
+def test_direct_publish_to_unbound_device_is_dropped():
+    hub = make_hub()
+    for i in range(100):
+        assert hub.publish({"kind": "test"}, f"made-up-{i}") is None
+    assert hub.get_stats()["direct_buffers"] == 0
+
+
+def test_unbind_releases_direct_buffer():
+    hub = make_hub()
+    hub.bind("device-1")
+    assert hub.publish({"kind": "test"}, "device-1") is not None
+    assert hub.get_stats()["direct_buffers"] == 1
+    hub.unbind("device-1")
+    assert hub.get_stats()["direct_buffers"] == 0
+
+
+def test_read_merges_broadcast_and_direct_by_cursor():
+    hub = make_hub()
+    hub.bind("a")
+    hub.bind("b")
+    cursor = hub.latest_cursor()
+    first = hub.publish({"kind": "analysis"})
+    direct = hub.publish({"kind": "test"}, "a")
+    last = hub.publish({"kind": "analysis"})
+
+    items, missed = hub.read("a", cursor)
+    assert [n["id"] for n in items] == [first["id"], direct["id"], last["id"]]
+    assert not missed
+
+    items, _ = hub.read("b", cursor)
+    assert [n["id"] for n in items] == [first["id"], last["id"]]
+
+    items, _ = hub.read("a", direct["id"])
+    assert [n["id"] for n in items] == [last["id"]]
+
+
+def test_overflow_reports_missed():
+    hub = make_hub(buffer_size=3, broadcast_size=5)
+    cursor = hub.latest_cursor()
+    for _ in range(8):
+        hub.publish({"kind": "analysis"})
+    items, missed = hub.read(None, cursor)
+    assert len(items) == 3
+    assert missed
+
+
+def test_wait_returns_when_published_from_other_thread():
+    hub = make_hub()
+    hub.bind("a")
+
+    async def scenario():
+        cursor = hub.latest_cursor()
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.05, lambda: threading.Thread(target=hub.publish, args=({"kind": "analysis"},)).start())
+        items, missed = await hub.wait("a", cursor, timeout=5)
+        return items, missed
+
+    items, missed = asyncio.run(scenario())
+    assert len(items) == 1 and not missed
+    assert hub.get_stats()["waiting_subscribers"] == 0
+
+
+def test_wait_times_out_without_notifications():
+    hub = make_hub()
+    items, missed = asyncio.run(hub.wait(None, hub.latest_cursor(), timeout=0.05))
+    assert items == [] and not missed
+
+
+def test_bindings_persist(tmp_path):
+    path = tmp_path / "bindings.json"
+    hub = NotificationHub(bindings_path=str(path))
+    openid = hub.bind("device-1")
+    reloaded = NotificationHub(bindings_path=str(path))
+    assert reloaded.resolve(openid=openid) == "device-1"
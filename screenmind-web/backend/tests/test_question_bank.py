@@ -0,0 +1,81 @@
+"""本地题库：规范化保留运算符、相似度查找，以及分析流程中按OCR置信度决定是否查题库"""
+import base64
+import pytest
+from app.core import ocr
+from app.core.ai_service import QuestionAnalyzer
+from app.core.question_bank import QuestionBank, normalize_question
+
+ENTRY = {
+    "question_type": "计算题",
+    "question_content": "计算 12+35 的结果",
+    "answer": "47",
+    "explanation": "12加35等于47"
+}
+
+
+class StubAIService:
+    """记录调用次数的AI服务替身"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_last_model(self):
+        return "stub-model"
+
+    def analyze_image(self, image_base64, **kwargs):
+        self.calls += 1
+        return "题目类型：计算题\n题目内容：计算 12+35 的结果\n答案：47\n解析：模型作答"
+
+    def analyze_text(self, text, **kwargs):
+        self.calls += 1
+        return "题目类型：计算题\n题目内容：计算 12+35 的结果\n答案：47\n解析：模型作答"
+
+
+def test_normalize_keeps_operators():
+    assert normalize_question("12+35=?") != normalize_question("1+235=?")
+    assert normalize_question("３×４＝？") == "3×4="
+    assert normalize_question("计算：(1+2)*3。") == "计算(1+2)*3"
+
+
+def test_operator_change_is_not_a_hit():
+    bank = QuestionBank(threshold=0.8)
+    assert bank.add(ENTRY)
+    assert bank.lookup("计算 1+235 的结果") is None
+    assert bank.lookup("计算 12-35 的结果") is None
+
+
+def test_whitespace_and_width_variants_hit():
+    bank = QuestionBank(threshold=0.8)
+    bank.add(ENTRY)
+    known = bank.lookup("计算１２ + ３５的结果")
+    assert known is not None
+    assert known["answer"] == "47"
+    assert known["similarity"] == 1.0
+
+
+def _analyze(monkeypatch, confidence):
+    monkeypatch.setattr(ocr, "is_available", lambda: True)
+    monkeypatch.setattr(ocr, "extract_text", lambda data: {
+        "text": "计算 12+35 的结果", "confidence": confidence, "words": 4
+    })
+    bank = QuestionBank(threshold=0.8)
+    bank.add({**ENTRY, "explanation": "题库答案"})
+    service = StubAIService()
+    analyzer = QuestionAnalyzer(service, ocr_text_first=True, ocr_min_chars=4, question_bank=bank)
+    result = analyzer.analyze_question_image(base64.b64encode(b"image").decode())
+    return result, service
+
+
+def test_confident_ocr_uses_question_bank(monkeypatch):
+    result, service = _analyze(monkeypatch, confidence=95.0)
+    assert result["pipeline"] == "question_bank"
+    assert result["explanation"] == "题库答案"
+    assert service.calls == 0
+
+
+@pytest.mark.parametrize("confidence", [10.0, 79.9])
+def test_low_confidence_ocr_skips_question_bank(monkeypatch, confidence):
+    result, service = _analyze(monkeypatch, confidence=confidence)
+    assert result["pipeline"] == "vision"
+    assert result["explanation"] == "模型作答"
+    assert service.calls == 1
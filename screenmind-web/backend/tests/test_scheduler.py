@@ -0,0 +1,158 @@
+"""分析调度器：并发上限、优先级、设备公平排队和取消"""
+import asyncio
+import threading
+import time
+import pytest
+from app.api import analyze
+from app.core.overload import OverloadController
+from app.core.scheduler import AnalysisScheduler, INTERACTIVE, BACKGROUND
+
+
+async def _job(scheduler, order, name, priority=INTERACTIVE, device_id=None, hold=0.01):
+    async with scheduler.slot(priority, device_id):
+        order.append(name)
+        await asyncio.sleep(hold)
+
+
+async def _blocked(scheduler, started):
+    """先占满所有名额，之后提交的请求都需要排队"""
+    release = asyncio.Event()
+
+    async def holder():
+        async with scheduler.slot(INTERACTIVE):
+            started.set()
+            await release.wait()
+
+    task = asyncio.create_task(holder())
+    await started.wait()
+    return task, release
+
+
+def test_concurrency_limit():
+    async def scenario():
+        scheduler = AnalysisScheduler(max_concurrency=2, interactive_reserved=0)
+        running = peak = 0
+
+        async def job():
+            nonlocal running, peak
+            async with scheduler.slot(INTERACTIVE):
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        await asyncio.gather(*(job() for _ in range(10)))
+        return peak, scheduler.get_stats()
+
+    peak, stats = asyncio.run(scenario())
+    assert peak == 2
+    assert stats["classes"][INTERACTIVE]["completed"] == 10
+    assert stats["classes"][INTERACTIVE]["running"] == 0
+
+
+def test_interactive_runs_before_queued_background():
+    async def scenario():
+        scheduler = AnalysisScheduler(max_concurrency=1, interactive_reserved=0)
+        task, release = await _blocked(scheduler, asyncio.Event())
+        order = []
+        jobs = [asyncio.create_task(_job(scheduler, order, f"bg{i}", BACKGROUND)) for i in range(3)]
+        await asyncio.sleep(0)
+        jobs.append(asyncio.create_task(_job(scheduler, order, "fg", INTERACTIVE)))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(task, *jobs)
+        return order
+
+    assert asyncio.run(scenario())[0] == "fg"
+
+
+def test_background_leaves_reserved_slot_for_interactive():
+    async def scenario():
+        scheduler = AnalysisScheduler(max_concurrency=2, interactive_reserved=1)
+        release = asyncio.Event()
+
+        async def background():
+            async with scheduler.slot(BACKGROUND):
+                await release.wait()
+
+        jobs = [asyncio.create_task(background()) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        running_background = scheduler.get_stats()["classes"][BACKGROUND]["running"]
+        started = time.monotonic()
+        async with scheduler.slot(INTERACTIVE) as wait:
+            pass
+        release.set()
+        await asyncio.gather(*jobs)
+        return running_background, wait, time.monotonic() - started
+
+    running_background, wait, elapsed = asyncio.run(scenario())
+    assert running_background == 1
+    assert elapsed < 0.5
+
+
+def test_fair_queuing_across_devices():
+    async def scenario():
+        scheduler = AnalysisScheduler(max_concurrency=1, interactive_reserved=0)
+        task, release = await _blocked(scheduler, asyncio.Event())
+        order = []
+        # 设备A先提交一大批，设备B随后提交两个，B不应排在A的整批之后
+        jobs = [asyncio.create_task(_job(scheduler, order, "A", BACKGROUND, "A", 0)) for _ in range(6)]
+        await asyncio.sleep(0)
+        jobs += [asyncio.create_task(_job(scheduler, order, "B", BACKGROUND, "B", 0)) for _ in range(2)]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(task, *jobs)
+        return order
+
+    order = asyncio.run(scenario())
+    assert order.index("B") <= 2
+    assert [i for i, name in enumerate(order) if name == "B"][-1] <= 4
+
+
+def test_cancelled_waiter_does_not_leak_slot():
+    async def scenario():
+        scheduler = AnalysisScheduler(max_concurrency=1, interactive_reserved=0)
+        task, release = await _blocked(scheduler, asyncio.Event())
+        waiter = asyncio.create_task(_job(scheduler, [], "cancelled"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        release.set()
+        await task
+        order = []
+        await asyncio.wait_for(_job(scheduler, order, "next"), 1)
+        return order, scheduler.get_stats()
+
+    order, stats = asyncio.run(scenario())
+    assert order == ["next"]
+    assert stats["classes"][INTERACTIVE]["queued"] == 0
+    assert stats["classes"][INTERACTIVE]["running"] == 0
+
+
+def test_queued_interactive_requests_count_as_in_flight(monkeypatch):
+    """调度器排队中的交互请求也计入过载控制器的在途数"""
+    gate = threading.Event()
+
+    class SlowAnalyzer:
+        def analyze_question_image(self, *args, **kwargs):
+            gate.wait(5)
+            return {"success": True}
+
+    controller = OverloadController(max_in_flight=3, min_degraded_seconds=0)
+    monkeypatch.setattr(analyze, "question_analyzer", SlowAnalyzer())
+    monkeypatch.setattr(analyze, "overload_controller", controller)
+    monkeypatch.setattr(analyze, "analysis_scheduler", AnalysisScheduler(max_concurrency=1, interactive_reserved=0))
+
+    async def scenario():
+        jobs = [asyncio.create_task(analyze._run_analysis("x")) for _ in range(5)]
+        await asyncio.sleep(0.1)
+        status = controller.get_status()
+        gate.set()
+        await asyncio.gather(*jobs)
+        return status
+
+    status = asyncio.run(scenario())
+    assert status["in_flight"] == 5
+    assert status["degraded"]
+    assert controller.get_status()["in_flight"] == 0
@@ -0,0 +1,119 @@
+"""结构化输出：JSON解析、本地修复、字段校验和各提供商的原生JSON参数"""
+import base64
+import io
+import json
+import pytest
+from PIL import Image
+from app.core.ai_service import AIService
+from app.core.structured_output import (
+    ANSWER_SCHEMA, GEMINI_SCHEMA, get_generation_config, get_response_format,
+    parse_structured_response, repair_json
+)
+
+SAMPLE = {
+    "question_type": "选择题",
+    "question_content": "TCP建立连接需要几次握手？",
+    "answer": "C",
+    "explanation": "三次握手"
+}
+
+
+def test_parses_plain_json():
+    assert parse_structured_response(json.dumps(SAMPLE, ensure_ascii=False)) == SAMPLE
+
+
+@pytest.mark.parametrize("text", [
+    "```json\n" + json.dumps(SAMPLE, ensure_ascii=False) + "\n```",
+    "结果如下：" + json.dumps(SAMPLE, ensure_ascii=False) + " 希望有帮助",
+    json.dumps(SAMPLE, ensure_ascii=False)[:-1] + ",}",
+    str(SAMPLE),
+])
+def test_repairs_near_json(text):
+    assert parse_structured_response(text) == SAMPLE
+
+
+def test_truncated_explanation_keeps_answer():
+    text = json.dumps(SAMPLE, ensure_ascii=False)
+    truncated = text[:text.index("三次") + 1]
+    parsed = parse_structured_response(truncated)
+    assert parsed["answer"] == "C"
+    assert parsed["explanation"] == "三"
+
+
+def test_missing_optional_fields_default_to_empty():
+    parsed = parse_structured_response('{"answer": "B"}')
+    assert parsed == {"question_type": "其他", "question_content": "", "answer": "B", "explanation": ""}
+
+
+def test_missing_answer_is_rejected():
+    assert parse_structured_response('{"question_type": "选择题", "question_content": "x"}') is None
+    assert parse_structured_response('{"question_type": "选择题", "answer": ""}') is None
+
+
+def test_unrecognizable_needs_no_answer():
+    parsed = parse_structured_response('{"question_type": "无法识别", "explanation": "图片模糊"}')
+    assert parsed["question_type"] == "无法识别" and parsed["answer"] == ""
+
+
+def test_non_json_returns_none():
+    assert parse_structured_response("题目类型：选择题\n正确答案：C") is None
+    assert parse_structured_response("[1, 2, 3]") is None
+
+
+def test_list_values_are_joined():
+    parsed = parse_structured_response('{"answer": ["A", "C"], "question_type": "选择题"}')
+    assert parsed["answer"] == "A\nC"
+
+
+def test_repair_closes_truncated_structures():
+    assert json.loads(repair_json('{"a": "x", "b": {"c": "y')) == {"a": "x", "b": {"c": "y"}}
+
+
+def test_openai_response_formats():
+    assert get_response_format("json_object") == {"type": "json_object"}
+    strict = get_response_format("json_schema")["json_schema"]
+    assert strict["strict"] and strict["schema"] is ANSWER_SCHEMA
+    assert get_response_format(None) is None
+
+
+def test_gemini_generation_config():
+    config = get_generation_config("response_schema")
+    assert config["response_mime_type"] == "application/json"
+    assert "additionalProperties" not in config["response_schema"]
+    assert get_generation_config(None) is None
+
+
+def test_gemini_schema_is_accepted_by_sdk():
+    generation_types = pytest.importorskip("google.generativeai.types.generation_types")
+    from google.generativeai import protos
+    config = generation_types.to_generation_config_dict(
+        {"max_output_tokens": 100, **get_generation_config("response_schema")}
+    )
+    proto = protos.GenerationConfig(**config)
+    assert proto.response_mime_type == "application/json"
+    assert set(proto.response_schema.properties) == set(GEMINI_SCHEMA["properties"])
+
+
+def test_gemini_request_uses_native_json_mode():
+    calls = []
+
+    class FakeGemini:
+        def generate_content(self, contents, generation_config):
+            calls.append(generation_config)
+
+            class Response:
+                text = json.dumps(SAMPLE, ensure_ascii=False)
+                usage_metadata = None
+            return Response()
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), "white").save(buffer, format="PNG")
+    service = AIService(provider="gemini", model="gemini-1.5-flash", lazy=True)
+    text = service._analyze_with_gemini(
+        FakeGemini(), base64.b64encode(buffer.getvalue()).decode(), "prompt", 300,
+        json_config=get_generation_config("response_schema")
+    )
+    assert parse_structured_response(text) == SAMPLE
+    assert calls[0]["max_output_tokens"] == 300
+    assert calls[0]["response_mime_type"] == "application/json"
+    assert calls[0]["response_schema"] is GEMINI_SCHEMA
@@ -0,0 +1,24 @@
+"""WebSocket通道：控制消息校验"""
+import json
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import ws
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(ws, "_status_summary", lambda: {"api": "running"})
+    app = FastAPI()
+    app.include_router(ws.router, prefix="/api/v1")
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("text", ["[1, 2]", '"ping"', "42", "null", "{not json"])
+def test_non_object_message_gets_error_and_keeps_connection(client, text):
+    with client.websocket_connect("/api/v1/ws") as socket:
+        assert json.loads(socket.receive_text())["type"] == "status"
+        socket.send_text(text)
+        assert json.loads(socket.receive_text()) == {"type": "error", "id": None, "message": "无效的JSON消息"}
+        socket.send_text(json.dumps({"type": "ping"}))
+        assert json.loads(socket.receive_text()) == {"type": "pong"}
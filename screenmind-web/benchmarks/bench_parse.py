@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+AI响应解析微基准
+对比文本解析器与结构化JSON解析器（含修复路径）的单次解析耗时
+
+用法:
+    python benchmarks/bench_parse.py [--number 20000]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+from app.core.ai_service import QuestionAnalyzer  # noqa: E402
+from app.core.structured_output import parse_structured_response  # noqa: E402
+
+SAMPLE = {
+    "question_type": "选择题",
+    "question_content": "TCP建立连接需要几次握手？ A. 1次 B. 2次 C. 3次 D. 4次",
+    "answer": "C",
+    "explanation": "TCP通过三次握手建立连接：SYN、SYN+ACK、ACK，确保双方收发能力正常。"
+}
+
+TEXT_RESPONSE = (
+    f"题目类型：{SAMPLE['question_type']}\n"
+    f"题目内容：{SAMPLE['question_content']}\n"
+    f"正确答案：{SAMPLE['answer']}\n"
+    f"解析：{SAMPLE['explanation']}\n"
+)
+JSON_RESPONSE = json.dumps(SAMPLE, ensure_ascii=False)
+FENCED_RESPONSE = "```json\n" + json.dumps(SAMPLE, ensure_ascii=False, indent=2) + ",\n```"
+TRUNCATED_RESPONSE = JSON_RESPONSE[:-20]
+
+# 解析不调用AI服务，不需要真实的服务实例
+ANALYZER = QuestionAnalyzer(ai_service=None)
+
+CASES = [
+    ("文本解析器", lambda: ANALYZER._parse_ai_response(TEXT_RESPONSE)),
+    ("JSON快速路径", lambda: parse_structured_response(JSON_RESPONSE)),
+    ("JSON修复(代码块+尾逗号)", lambda: parse_structured_response(FENCED_RESPONSE)),
+    ("JSON修复(截断)", lambda: parse_structured_response(TRUNCATED_RESPONSE)),
+    ("非JSON文本(失败路径)", lambda: parse_structured_response(TEXT_RESPONSE)),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI响应解析微基准")
+    parser.add_argument("--number", type=int, default=20000, help="每个用例的执行次数")
+    args = parser.parse_args()
+
+    print(f"{'用例':<28}{'每次耗时(µs)':>14}")
+    for name, func in CASES:
+        assert func() is not None or name.startswith("非JSON"), name
+        best = min(timeit.repeat(func, number=args.number, repeat=3))
+        print(f"{name:<28}{best / args.number * 1e6:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""
+分析流程端到端压测
+启动本地模拟模型服务 (python -m app.mock_server) 和后端 (uvicorn app.main:app --workers N)，
+按给定并发持续请求分析接口，统计：
+  1. 吞吐量 (请求/秒、图片/秒) 和 p50/p95/p99 延迟
+  2. 各阶段耗时（来自 Server-Timing 响应头：read/decode/prepare/queue/model/store/history）
+  3. 每个worker进程的峰值RSS
+
+场景:
+  analyze     POST /api/v1/analyze（上传单张图片）
+  batch       POST /api/v1/analyze/batch（每次上传 --batch-size 张）
+  screenshot  POST /api/v1/screenshot/analyze（截屏并分析，需要图形界面和截屏工具）
+
+结果可以保存为JSON，并与之前保存的基线比较，吞吐下降或延迟/内存上升超过阈值时以非零状态退出
+
+用法:
+    python benchmarks/bench_pipeline.py [--scenarios analyze,batch] [--concurrency 1,8,32]
+                                        [--requests 200] [--workers 1] [--mock-latency-mean 0.5]
+                                        [--output results.json] [--baseline baseline.json]
+                                        [--save-baseline baseline.json]
+    python benchmarks/bench_pipeline.py --url http://127.0.0.1:8000   # 压测已经在运行的后端
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+SCENARIOS = ("analyze", "batch", "screenshot")
+
+# 与基线比较的指标：(名称, 越大越好)
+COMPARED_METRICS = (
+    ("throughput_rps", True),
+    ("p50_ms", False),
+    ("p95_ms", False),
+    ("p99_ms", False),
+    ("peak_rss_mb", False),
+)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(url: str, process, timeout: float = 60.0):
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"进程启动失败: {url}")
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"等待服务就绪超时: {url}")
+
+
+def percentile(samples, q: float) -> float:
+    """线性插值百分位数 (q: 0-100)"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def parse_server_timing(header: str) -> dict:
+    """解析 Server-Timing 响应头，返回 阶段名 -> 毫秒"""
+    stages = {}
+    for entry in (header or "").split(","):
+        name, _, params = entry.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur" and name:
+                try:
+                    stages[name] = float(value)
+                except ValueError:
+                    pass
+    return stages
+
+
+def make_images(count: int, width: int, height: int, seed: int) -> list:
+    """生成类似题目截图的PNG（白底上的若干行深色“文字”块），每张内容不同"""
+    from PIL import Image, ImageDraw
+    rng = random.Random(seed)
+    images = []
+    for _ in range(count):
+        image = Image.new("RGB", (width, height), "white")
+        draw = ImageDraw.Draw(image)
+        y = 30
+        while y < height - 40:
+            x = 30
+            while x < width - 60:
+                word = rng.randint(12, 60)
+                draw.rectangle([x, y, x + word, y + 18], fill=(rng.randint(0, 60),) * 3)
+                x += word + rng.randint(6, 14)
+            y += rng.randint(34, 48)
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        images.append(buffer.getvalue())
+    return images
+
+
+class RSSMonitor:
+    """后台线程定期采样服务进程（及其worker子进程）的RSS，记录每个进程的峰值"""
+
+    def __init__(self, pid: int, interval: float = 0.1):
+        self.pid = pid
+        self.interval = interval
+        self.peaks = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        try:
+            import psutil
+            self._psutil = psutil
+        except ImportError:
+            self._psutil = None
+
+    @staticmethod
+    def _is_helper(cmdline: str) -> bool:
+        """multiprocessing的辅助进程（resource_tracker）不是worker"""
+        return "resource_tracker" in cmdline
+
+    def _processes(self) -> dict:
+        """pid -> 当前RSS（字节）；有worker子进程时只统计worker，不统计管理进程"""
+        if self._psutil:
+            try:
+                parent = self._psutil.Process(self.pid)
+                processes = [
+                    p for p in parent.children(recursive=True) if not self._is_helper(" ".join(p.cmdline()))
+                ] or [parent]
+                return {p.pid: p.memory_info().rss for p in processes if p.is_running()}
+            except self._psutil.Error:
+                return {}
+        pids = []
+        try:
+            for task in os.listdir(f"/proc/{self.pid}/task"):
+                with open(f"/proc/{self.pid}/task/{task}/children") as f:
+                    for pid in f.read().split():
+                        with open(f"/proc/{pid}/cmdline", "rb") as cmdline:
+                            if not self._is_helper(cmdline.read().decode(errors="replace")):
+                                pids.append(int(pid))
+        except OSError:
+            return {}
+        result = {}
+        for pid in pids or [self.pid]:
+            try:
+                with open(f"/proc/{pid}/status") as f:
+                    for line in f:
+                        # 不用VmHWM：它是进程整个生命周期的峰值，无法按用例分别统计
+                        if line.startswith("VmRSS:"):
+                            result[pid] = int(line.split()[1]) * 1024
+            except OSError:
+                pass
+        return result
+
+    def _run(self):
+        while not self._stop.is_set():
+            for pid, rss in self._processes().items():
+                self.peaks[pid] = max(self.peaks.get(pid, 0), rss)
+            self._stop.wait(self.interval)
+
+    @property
+    def available(self) -> bool:
+        return self._psutil is not None or os.path.exists(f"/proc/{self.pid}/status")
+
+    def start(self):
+        if self.available:
+            self._thread.start()
+
+    def reset(self):
+        self.peaks = {}
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=2)
+
+    def snapshot_mb(self) -> list:
+        return sorted(round(rss / 1024 / 1024, 1) for rss in self.peaks.values())
+
+
+def start_servers(args, workdir: str):
+    """启动模拟模型服务和后端，返回 (后端地址, 进程列表, 后端进程)"""
+    mock_port, app_port = _free_port(), _free_port()
+    mock_cmd = [
+        sys.executable, "-m", "app.mock_server", "--host", "127.0.0.1", "--port", str(mock_port),
+        "--latency", args.mock_latency, "--latency-mean", str(args.mock_latency_mean),
+        "--latency-stddev", str(args.mock_latency_stddev), "--error-rate", str(args.mock_error_rate),
+        "--seed", str(args.seed)
+    ]
+    env = {
+        **os.environ,
+        "PYTHONPATH": BACKEND_DIR,
+        "AI_PROVIDER": "mock",
+        "AI_MODEL": "mock-vl",
+        "MOCK_BASE_URL": f"http://127.0.0.1:{mock_port}/v1",
+    }
+    mock = subprocess.Popen(mock_cmd, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    processes = [mock]
+    _wait_ready(f"http://127.0.0.1:{mock_port}/v1/models", mock)
+
+    app_cmd = [
+        sys.executable, "-m", "uvicorn", "app.main:app", "--app-dir", BACKEND_DIR,
+        "--host", "127.0.0.1", "--port", str(app_port), "--log-level", "warning",
+        "--workers", str(args.workers)
+    ]
+    app = subprocess.Popen(app_cmd, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    processes.append(app)
+    url = f"http://127.0.0.1:{app_port}"
+    _wait_ready(f"{url}/api/v1/health", app)
+    return url, processes, app
+
+
+def stop_servers(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+async def _send(client, scenario: str, images: list, index: int, batch_size: int):
+    """发送一次请求，返回 (状态码, 延迟秒, Server-Timing阶段, 图片数)"""
+    start = time.perf_counter()
+    if scenario == "analyze":
+        files = {"image": ("question.png", images[index % len(images)], "image/png")}
+        response = await client.post("/api/v1/analyze", files=files)
+        count = 1
+    elif scenario == "batch":
+        files = [
+            ("images", (f"q{i}.png", images[(index * batch_size + i) % len(images)], "image/png"))
+            for i in range(batch_size)
+        ]
+        response = await client.post("/api/v1/analyze/batch", files=files, headers={"Device-Id": f"bench-{index % 4}"})
+        count = batch_size
+    else:
+        response = await client.post("/api/v1/screenshot/analyze")
+        count = 1
+    latency = time.perf_counter() - start
+    return response.status_code, latency, parse_server_timing(response.headers.get("server-timing")), count
+
+
+async def run_load(url: str, scenario: str, concurrency: int, requests: int, warmup: int, images: list,
+                   batch_size: int, timeout: float) -> dict:
+    """闭环压测：concurrency个并发客户端各自连续发送请求，直到完成requests次（不含预热）"""
+    import httpx
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        for i in range(warmup):
+            await _send(client, scenario, images, i, batch_size)
+
+        counter = iter(range(requests))
+        samples = []
+
+        async def worker():
+            for index in counter:
+                try:
+                    samples.append(await _send(client, scenario, images, warmup + index, batch_size))
+                except httpx.HTTPError as e:
+                    samples.append((type(e).__name__, None, {}, 0))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return summarize(samples, elapsed)
+
+
+def summarize(samples: list, elapsed: float) -> dict:
+    ok = [s for s in samples if s[0] == 200]
+    errors = {}
+    for status, *_ in samples:
+        if status != 200:
+            errors[str(status)] = errors.get(str(status), 0) + 1
+    latencies = [s[1] * 1000 for s in ok]
+    stages = {}
+    for _, _, timing, _ in ok:
+        for stage, ms in timing.items():
+            stages.setdefault(stage, []).append(ms)
+    return {
+        "requests": len(samples),
+        "succeeded": len(ok),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "images_per_s": round(sum(s[3] for s in ok) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(statistics.fmean(latencies), 1) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "max_ms": round(max(latencies), 1) if latencies else 0.0,
+        "stages_ms": {
+            stage: {"mean": round(statistics.fmean(values), 1), "p95": round(percentile(values, 95), 1)}
+            for stage, values in stages.items()
+        }
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """与基线比较，返回回退项列表 [(用例, 指标, 基线值, 当前值, 变化比例)]"""
+    regressions = []
+    base_runs = baseline.get("runs", {})
+    for key, run in results["runs"].items():
+        base = base_runs.get(key)
+        if not base:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS:
+            old, new = base.get(metric), run.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (higher_is_better and change < -threshold) or (not higher_is_better and change > threshold):
+                regressions.append((key, metric, old, new, change))
+    return regressions
+
+
+def print_report(results: dict, baseline: dict = None):
+    print(f"{'用例':<22}{'成功/总数':>12}{'req/s':>9}{'img/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'RSS(MB)':>16}")
+    for key, run in results["runs"].items():
+        rss = "/".join(str(v) for v in run.get("worker_peak_rss_mb", [])) or "-"
+        print(
+            f"{key:<22}{run['succeeded']:>6}/{run['requests']:<5}{run['throughput_rps']:>9.2f}"
+            f"{run['images_per_s']:>9.2f}{run['p50_ms']:>9.1f}{run['p95_ms']:>9.1f}{run['p99_ms']:>9.1f}{rss:>16}"
+        )
+        if run["errors"]:
+            print(f"{'':<22}错误: {run['errors']}")
+        if run["stages_ms"]:
+            stages = "  ".join(f"{stage}={v['mean']:.1f}" for stage, v in run["stages_ms"].items())
+            print(f"{'':<22}阶段均值(ms): {stages}")
+        base = (baseline or {}).get("runs", {}).get(key)
+        if base:
+            deltas = []
+            for metric, _ in COMPARED_METRICS:
+                if base.get(metric) and run.get(metric) is not None:
+                    deltas.append(f"{metric} {(run[metric] - base[metric]) / base[metric]:+.1%}")
+            print(f"{'':<22}对比基线: {'  '.join(deltas)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分析流程端到端压测")
+    parser.add_argument("--scenarios", default="analyze,batch", help=f"逗号分隔，可选 {','.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", default="1,8,32", help="逗号分隔的并发数列表")
+    parser.add_argument("--requests", type=int, default=200, help="每个用例的请求数（不含预热）")
+    parser.add_argument("--warmup", type=int, default=5, help="每个用例的预热请求数")
+    parser.add_argument("--batch-size", type=int, default=10, help="batch场景每次上传的图片数")
+    parser.add_argument("--images", type=int, default=50, help="生成的不同图片数（重复的图片会被图片存储去重）")
+    parser.add_argument("--image-size", default="1280x720", help="生成图片的尺寸 WxH")
+    parser.add_argument("--workers", type=int, default=1, help="后端uvicorn worker数")
+    parser.add_argument("--url", help="压测已经在运行的后端（不启动模拟服务和后端，也不测量RSS）")
+    parser.add_argument("--pid", type=int, help="配合--url，测量该进程及其worker的RSS")
+    parser.add_argument("--timeout", type=float, default=120.0, help="单次请求超时（秒）")
+    parser.add_argument("--mock-latency", default="lognormal", help="模拟模型的延迟分布")
+    parser.add_argument("--mock-latency-mean", type=float, default=0.5, help="模拟模型的平均延迟（秒）")
+    parser.add_argument("--mock-latency-stddev", type=float, default=0.2, help="模拟模型的延迟标准差（秒）")
+    parser.add_argument("--mock-error-rate", type=float, default=0.0, help="模拟模型返回500的比例")
+    parser.add_argument("--seed", type=int, default=42, help="随机数种子（图片内容和模拟延迟）")
+    parser.add_argument("--output", help="把结果写入JSON文件")
+    parser.add_argument("--baseline", help="与该JSON基线比较")
+    parser.add_argument("--save-baseline", help="把本次结果保存为基线")
+    parser.add_argument("--threshold", type=float, default=0.10, help="判定为回退的变化比例")
+    parser.add_argument("--json", action="store_true", help="以JSON输出结果")
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"未知的场景: {', '.join(sorted(unknown))}")
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    width, height = (int(v) for v in args.image_size.lower().split("x"))
+    images = make_images(args.images, width, height, args.seed)
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args)
+        },
+        "runs": {}
+    }
+
+    # 在临时目录中运行后端，避免在仓库中生成日志和数据文件
+    with tempfile.TemporaryDirectory() as workdir:
+        processes, server = [], None
+        try:
+            if args.url:
+                url = args.url.rstrip("/")
+            else:
+                url, processes, server = start_servers(args, workdir)
+            pid = args.pid or (server.pid if server else None)
+            monitor = RSSMonitor(pid) if pid else None
+            if monitor:
+                monitor.start()
+
+            for scenario in scenarios:
+                for concurrency in levels:
+                    key = f"{scenario}@c{concurrency}"
+                    if not args.json:
+                        print(f"运行 {key} ...", file=sys.stderr)
+                    if monitor:
+                        monitor.reset()
+                    run = asyncio.run(run_load(
+                        url, scenario, concurrency, args.requests, args.warmup, images, args.batch_size, args.timeout
+                    ))
+                    if monitor:
+                        run["worker_peak_rss_mb"] = monitor.snapshot_mb()
+                        run["peak_rss_mb"] = max(run["worker_peak_rss_mb"], default=None)
+                    results["runs"][key] = run
+            if monitor:
+                monitor.stop()
+        finally:
+            stop_servers(processes)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    regressions = compare(results, baseline, args.threshold) if baseline else []
+    if args.json:
+        print(json.dumps({**results, "regressions": regressions}, ensure_ascii=False, indent=2))
+    else:
+        print_report(results, baseline)
+        for key, metric, old, new, change in regressions:
+            print(f"回退: {key} {metric} {old} -> {new} ({change:+.1%})")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+冷启动基准
+在全新的子进程中测量：
+  1. 导入 app.main 的耗时（每次 --reload 重启和每个worker启动都要付出）
+  2. 各提供商SDK单独的导入耗时（按需加载时只有用到的提供商才付出）
+  3. 启动uvicorn到 /api/v1/health 可以响应的耗时
+
+用法:
+    python benchmarks/bench_startup.py [--repeat 5] [--skip-server] [--json]
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+IMPORT_CASES = [
+    ("app.main", "import app.main"),
+    ("openai SDK (qwen/openai)", "import openai"),
+    ("google.generativeai SDK (gemini)", "import google.generativeai"),
+]
+
+
+def _measure_import(statement: str, cwd: str) -> float:
+    """在新的解释器中执行导入语句，返回导入耗时（秒），失败时返回None"""
+    code = (
+        "import sys, time\n"
+        f"sys.path.insert(0, {BACKEND_DIR!r})\n"
+        "start = time.perf_counter()\n"
+        f"{statement}\n"
+        "print(time.perf_counter() - start)\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", code],
+        capture_output=True, text=True, cwd=cwd
+    )
+    if result.returncode != 0:
+        return None
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _measure_server_startup(cwd: str, timeout: float = 30.0) -> float:
+    """启动uvicorn（不带--reload），返回到health接口首次响应的耗时（秒）"""
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/api/v1/health"
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--app-dir", BACKEND_DIR,
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                return None
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.02)
+        return None
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def _summary(samples):
+    samples = [s for s in samples if s is not None]
+    if not samples:
+        return None
+    return {"median_ms": round(statistics.median(samples) * 1000, 1), "min_ms": round(min(samples) * 1000, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="冷启动基准")
+    parser.add_argument("--repeat", type=int, default=5, help="每项测量的重复次数")
+    parser.add_argument("--skip-server", action="store_true", help="不测量uvicorn启动耗时")
+    parser.add_argument("--json", action="store_true", help="以JSON输出结果")
+    args = parser.parse_args()
+
+    results = {}
+    # 在临时目录中运行，避免在仓库中生成日志和数据文件
+    with tempfile.TemporaryDirectory() as cwd:
+        for name, statement in IMPORT_CASES:
+            results[f"import {name}"] = _summary(_measure_import(statement, cwd) for _ in range(args.repeat))
+        if not args.skip_server:
+            results["uvicorn启动到health可响应"] = _summary(
+                _measure_server_startup(cwd) for _ in range(args.repeat)
+            )
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+
+    print(f"{'测量项':<40}{'中位数(ms)':>12}{'最小(ms)':>12}")
+    for name, summary in results.items():
+        if summary is None:
+            print(f"{name:<40}{'失败/未安装':>12}")
+        else:
+            print(f"{name:<40}{summary['median_ms']:>12.1f}{summary['min_ms']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+模型评测
+把带标注的题目截图逐张交给 QuestionAnalyzer，按 模型 × 变体（提示词/预处理）统计：
+  1. 答案准确率（选择题按选项集合、判断题按对/错、其余按规范化后的文字比较）和题型准确率
+  2. 模型调用延迟 p50/p95
+  3. token用量和按目录参考价格估算的费用
+
+标注目录中需要一个 labels.jsonl（或 labels.json / labels.csv），每条记录:
+    {"image": "q001.png", "answer": "C", "question_type": "选择题"}
+question_type 可省略
+
+录制文件 (--cassette) 即提供商调用录制层 (app.core.cassette) 的文件，保存每次模型调用的原始回答、
+token用量和延迟（以请求指纹为键，不保存图片），也可以直接使用线上 CASSETTE_MODE=record 录制的文件：
+  auto    命中时回放，未命中时调用模型并录制（默认）
+  replay  只回放，未录制的请求记为错误，不访问网络
+  record  全部重新调用并覆盖录制
+回放的延迟和费用取录制时的值，重复运行结果完全一致且不产生费用
+
+变体（多个用逗号分隔，同一变体内用+组合）:
+  default            与线上相同：按图片预算选择detail和max_tokens
+  structured         结构化JSON输出
+  ocr                本地OCR优先（需要pytesseract）
+  low_detail / high_detail
+  downscale:1280     最长边缩放到1280像素
+  prompt:path.txt    使用文件中的提示词替换默认的文本格式提示词
+
+用法:
+    python benchmarks/evaluate.py corpus/ --models qwen:qwen-vl-plus,qwen:qwen-vl-max,openai:gpt-4o-mini \\
+        --variants default,structured,downscale:1280 --concurrency 4 --cassette corpus/cassette.jsonl \\
+        --output eval.json
+"""
+import argparse
+import base64
+import contextlib
+import csv
+import io
+import json
+import os
+import re
+import statistics
+import sys
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+from PIL import Image  # noqa: E402
+from app.core.ai_service import AIService, QuestionAnalyzer, WebConfig  # noqa: E402
+from app.core.cassette import ProviderCassette, AUTO, RECORD, REPLAY  # noqa: E402
+from app.core.image_budget import plan_image_budget  # noqa: E402
+from app.core.overload import downscale_image  # noqa: E402
+from app.core.screen_capture import encode_png  # noqa: E402
+
+CASSETTE_MODES = (AUTO, REPLAY, RECORD)
+
+_CHOICE = re.compile(r"(?<![A-Za-z])[A-H](?![A-Za-z])")
+_CHOICE_ONLY = re.compile(r"^[A-H](?:[\s,，、和及]*[A-H])*$")
+_PUNCTUATION = re.compile(r"[\s\W_]+")
+TRUE_WORDS = ("正确", "对", "是", "√", "✓", "true", "t", "yes", "y")
+FALSE_WORDS = ("错误", "错", "否", "×", "✗", "x", "false", "f", "no", "n")
+
+
+def _normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text or "").strip()
+
+
+def _judgement(text: str):
+    """判断题答案 -> True/False，无法识别时返回None"""
+    word = _PUNCTUATION.sub("", _normalize(text).lower())
+    for prefix in ("答案", "答"):
+        word = word.removeprefix(prefix)
+    if word in TRUE_WORDS:
+        return True
+    if word in FALSE_WORDS:
+        return False
+    return None
+
+
+def answer_matches(expected: str, predicted: str) -> bool:
+    """比较标注答案和模型答案"""
+    expected, predicted = _normalize(expected), _normalize(predicted)
+    if not predicted:
+        return False
+    if _CHOICE_ONLY.match(expected.upper()):
+        return set(_CHOICE.findall(expected.upper())) == set(_CHOICE.findall(predicted.upper()))
+    judgement = _judgement(expected)
+    if judgement is not None:
+        return _judgement(predicted) == judgement
+    expected_key = _PUNCTUATION.sub("", expected.lower())
+    predicted_key = _PUNCTUATION.sub("", predicted.lower())
+    return bool(expected_key) and (expected_key == predicted_key or expected_key in predicted_key)
+
+
+def load_corpus(folder: str) -> list:
+    """读取标注，返回 [{"id", "path", "answer", "question_type"}]"""
+    rows = None
+    for name in ("labels.jsonl", "labels.json", "labels.csv"):
+        path = os.path.join(folder, name)
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8-sig") as f:
+            if name.endswith(".jsonl"):
+                rows = [json.loads(line) for line in f if line.strip()]
+            elif name.endswith(".json"):
+                rows = json.load(f)
+            else:
+                rows = list(csv.DictReader(f))
+        break
+    if rows is None:
+        raise SystemExit(f"标注目录中没有 labels.jsonl / labels.json / labels.csv: {folder}")
+
+    corpus = []
+    for row in rows:
+        image = row.get("image") or row.get("file")
+        path = os.path.join(folder, image)
+        if not os.path.exists(path):
+            print(f"跳过不存在的图片: {path}", file=sys.stderr)
+            continue
+        corpus.append({
+            "id": image,
+            "path": path,
+            "answer": str(row.get("answer", "")),
+            "question_type": row.get("question_type") or None
+        })
+    return corpus
+
+
+class Variant:
+    """一种提示词/预处理组合"""
+
+    def __init__(self, spec: str):
+        self.name = spec
+        self.structured = False
+        self.ocr = False
+        self.detail = None
+        self.max_side = None
+        self.prompt = None
+        for part in filter(None, spec.split("+")):
+            key, _, value = part.partition(":")
+            if key == "default":
+                pass
+            elif key == "structured":
+                self.structured = True
+            elif key == "ocr":
+                self.ocr = True
+            elif key in ("low_detail", "high_detail"):
+                self.detail = key.split("_")[0]
+            elif key == "downscale":
+                self.max_side = int(value)
+            elif key == "prompt":
+                with open(value, "r", encoding="utf-8") as f:
+                    self.prompt = f.read()
+            else:
+                raise SystemExit(f"未知的变体: {part}")
+
+
+class PromptConfig(WebConfig):
+    """替换文本格式提示词的配置"""
+
+    def __init__(self, prompt: str):
+        self.prompt = prompt
+
+    def get_ai_prompt(self):
+        return self.prompt
+
+
+class EvalAIService(AIService):
+    """评测用AI服务：模型调用经录制层（可选）回放或录制，并按线程累计用量和延迟"""
+
+    def __init__(self, provider: str, model: str, cassette: ProviderCassette = None, prompt: str = None):
+        super().__init__(provider=provider, model=model, lazy=True)
+        if prompt:
+            self.config = PromptConfig(prompt)
+        self.cassette = cassette
+        self._tally = threading.local()
+
+    def reset_tally(self):
+        self._tally.value = {"prompt_tokens": 0, "completion_tokens": 0, "latency": 0.0, "calls": 0, "replayed": 0}
+
+    def get_tally(self) -> dict:
+        return dict(self._tally.value)
+
+    def _tallied(self, call):
+        # 客户端在计时之外创建，延迟只包含模型调用
+        if self._needs_client():
+            self.ensure_initialized()
+        start = time.perf_counter()
+        text = call()
+        elapsed = time.perf_counter() - start
+
+        tally = self._tally.value
+        usage = self.get_last_usage() or {}
+        tally["prompt_tokens"] += usage.get("prompt_tokens", 0)
+        tally["completion_tokens"] += usage.get("completion_tokens", 0)
+        # 回放时使用录制的延迟，重复运行的结果完全一致
+        last = self.cassette.last_call() if self.cassette else None
+        tally["latency"] += last["latency"] if last else elapsed
+        tally["replayed"] += 1 if last and last["replayed"] else 0
+        tally["calls"] += 1
+        return text
+
+    def analyze_image(self, *args, **kwargs):
+        return self._tallied(lambda: super(EvalAIService, self).analyze_image(*args, **kwargs))
+
+    def analyze_text(self, *args, **kwargs):
+        return self._tallied(lambda: super(EvalAIService, self).analyze_text(*args, **kwargs))
+
+
+def prepare_image(data: bytes, variant: Variant):
+    """与线上流程相同的预处理：可选缩放，按图片预算选择detail和max_tokens"""
+    image = Image.open(io.BytesIO(data))
+    if variant.max_side:
+        resized = downscale_image(image, variant.max_side)
+        if resized is not image:
+            image, data = resized, encode_png(resized)
+    budget = plan_image_budget(image)
+    return base64.b64encode(data).decode("utf-8"), variant.detail or budget["detail"], budget["max_tokens"]
+
+
+def evaluate_item(analyzer: QuestionAnalyzer, item: dict, data: bytes, variant: Variant) -> dict:
+    service = analyzer.ai_service
+    service.reset_tally()
+    image_base64, detail, max_tokens = prepare_image(data, variant)
+    result = analyzer.analyze_question_image(image_base64, max_tokens=max_tokens, detail=detail)
+    tally = service.get_tally()
+    cost, currency = WebConfig.estimate_cost(service.current_provider, service.current_model, tally)
+    return {
+        "id": item["id"],
+        "expected": item["answer"],
+        "predicted": result.get("answer", ""),
+        "correct": bool(result["success"]) and answer_matches(item["answer"], result.get("answer", "")),
+        "type_correct": (
+            None if not item["question_type"] else result.get("question_type") == item["question_type"]
+        ),
+        "error": result.get("error"),
+        "pipeline": result.get("pipeline"),
+        "latency_ms": round(tally["latency"] * 1000, 1),
+        "prompt_tokens": tally["prompt_tokens"],
+        "completion_tokens": tally["completion_tokens"],
+        "cost": cost,
+        "currency": currency,
+        "replayed": tally["calls"] > 0 and tally["replayed"] == tally["calls"]
+    }
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(items: list) -> dict:
+    n = len(items)
+    typed = [item for item in items if item["type_correct"] is not None]
+    latencies = [item["latency_ms"] for item in items if not item["error"]]
+    pipelines = {}
+    for item in items:
+        pipelines[item["pipeline"]] = pipelines.get(item["pipeline"], 0) + 1
+    cost = sum(item["cost"] for item in items)
+    return {
+        "questions": n,
+        "correct": sum(item["correct"] for item in items),
+        "accuracy": round(sum(item["correct"] for item in items) / n, 4) if n else 0.0,
+        "type_accuracy": round(sum(item["type_correct"] for item in typed) / len(typed), 4) if typed else None,
+        "errors": sum(1 for item in items if item["error"]),
+        "latency_p50_ms": round(_percentile(latencies, 50), 1),
+        "latency_p95_ms": round(_percentile(latencies, 95), 1),
+        "latency_mean_ms": round(statistics.fmean(latencies), 1) if latencies else 0.0,
+        "prompt_tokens": sum(item["prompt_tokens"] for item in items),
+        "completion_tokens": sum(item["completion_tokens"] for item in items),
+        "cost": round(cost, 6),
+        "cost_per_100": round(cost / n * 100, 4) if n else 0.0,
+        "currency": items[0]["currency"] if items else None,
+        "replayed": sum(1 for item in items if item["replayed"]),
+        "pipelines": pipelines
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模型准确率/延迟/费用评测")
+    parser.add_argument("corpus", help="标注目录（包含图片和labels.jsonl）")
+    parser.add_argument("--models", default="mock:mock-vl", help="逗号分隔的 提供商:模型 列表")
+    parser.add_argument("--variants", default="default", help="逗号分隔的变体列表，见模块说明")
+    parser.add_argument("--concurrency", type=int, default=4, help="同时进行的模型调用数")
+    parser.add_argument("--cassette", help="录制文件路径 (.jsonl)")
+    parser.add_argument("--cassette-mode", choices=CASSETTE_MODES, default="auto", help="录制文件模式")
+    parser.add_argument("--limit", type=int, help="只评测前N张图片")
+    parser.add_argument("--output", help="把汇总和逐题结果写入JSON文件")
+    parser.add_argument("--verbose", action="store_true", help="输出分析过程的日志")
+    args = parser.parse_args()
+
+    catalog = WebConfig.get_available_models()
+    models = []
+    for spec in filter(None, (s.strip() for s in args.models.split(","))):
+        provider, _, model = spec.partition(":")
+        if provider not in catalog or model not in catalog[provider]["models"]:
+            parser.error(f"未知的模型: {spec}")
+        models.append((provider, model))
+    variants = [Variant(spec.strip()) for spec in args.variants.split(",") if spec.strip()]
+    if args.cassette_mode == REPLAY and not args.cassette:
+        parser.error("--cassette-mode replay 需要 --cassette")
+
+    corpus = load_corpus(args.corpus)[:args.limit]
+    images = {}
+    for item in corpus:
+        with open(item["path"], "rb") as f:
+            images[item["id"]] = f.read()
+    cassette = None
+    if args.cassette:
+        if args.cassette_mode == RECORD and os.path.exists(args.cassette):
+            # 重新录制时清空旧文件，避免同一请求的新旧记录并存
+            open(args.cassette, "w", encoding="utf-8").close()
+        cassette = ProviderCassette(args.cassette, args.cassette_mode)
+
+    # 每个 模型×变体 使用独立的分析器（各自的结果缓存，不使用本地题库）
+    runs = {}
+    for provider, model in models:
+        for variant in variants:
+            service = EvalAIService(provider, model, cassette, prompt=variant.prompt)
+            analyzer = QuestionAnalyzer(service, structured_output=variant.structured, ocr_text_first=variant.ocr)
+            runs[f"{provider}:{model}|{variant.name}"] = (analyzer, variant, [])
+
+    start = time.perf_counter()
+    total = len(runs) * len(corpus)
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with quiet, ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+        futures = {
+            pool.submit(evaluate_item, analyzer, item, images[item["id"]], variant): key
+            for key, (analyzer, variant, _) in runs.items()
+            for item in corpus
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            runs[futures[future]][2].append(future.result())
+            print(f"\r进度 {done}/{total}", end="", file=sys.stderr)
+    print(file=sys.stderr)
+
+    summary = {key: summarize(items) for key, (_, _, items) in runs.items()}
+    print(f"{'模型|变体':<40}{'准确率':>8}{'题型':>8}{'错误':>6}{'p50(ms)':>10}{'p95(ms)':>10}"
+          f"{'输入tok':>10}{'输出tok':>10}{'费用/100题':>14}")
+    for key, s in summary.items():
+        type_accuracy = f"{s['type_accuracy']:.1%}" if s["type_accuracy"] is not None else "-"
+        print(
+            f"{key:<40}{s['accuracy']:>8.1%}{type_accuracy:>8}{s['errors']:>6}{s['latency_p50_ms']:>10.1f}"
+            f"{s['latency_p95_ms']:>10.1f}{s['prompt_tokens']:>10}{s['completion_tokens']:>10}"
+            f"{s['cost_per_100']:>10.4f} {s['currency']}"
+        )
+    print(f"共 {total} 次评测，耗时 {time.perf_counter() - start:.1f}秒，"
+          f"回放 {sum(s['replayed'] for s in summary.values())} 次")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "summary": summary,
+                "items": {key: sorted(items, key=lambda item: item["id"]) for key, (_, _, items) in runs.items()}
+            }, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()